@@ -0,0 +1,224 @@
+"""
+autosave_writer.py
+自动保存线程
+串口线程把收发的原始数据放入队列，本线程按方向分行、格式化后追加写入日志文件
+每行的时间戳为该行第一个字节的读取时间；没有换行符的数据在空闲一段时间后或停止时单独成行
+数据先缓存在内存中，达到时间间隔或缓存大小后再写入磁盘，写入开销只与新数据量有关
+文件超过分割策略的限制后新建文件，旧文件交给LogCompressor压缩和清理
+"""
+import codecs
+import os
+import queue
+import time
+from datetime import datetime
+
+from PyQt5.QtCore import *
+
+from capture_file import DIRECTION_RECV
+from frame_decoder import LineFramer
+from hex_format import to_hex
+from log_rotation import RotationPolicy, LogCompressor, AUTOSAVE_SUFFIX, segment_exists
+
+# 默认写入间隔(s)
+AUTOSAVE_FLUSH_INTERVAL = 5
+# 缓存超过该大小(字符)后立即写入
+AUTOSAVE_FLUSH_SIZE = 64 * 1024
+# 不完整的行在该时间(s)内没有新数据时单独成行
+AUTOSAVE_LINE_IDLE = 0.5
+
+
+class AutosaveWriter(QThread):
+    """
+    自动保存线程，实现sink接口，可直接加入SerialThread
+    """
+    # 写入失败，自动保存停止
+    autosave_error = pyqtSignal(str)
+    # 压缩/清理失败，不影响继续写入
+    compress_error = pyqtSignal(str)
+
+    def __init__(self, directory, flush_interval=AUTOSAVE_FLUSH_INTERVAL, flush_size=AUTOSAVE_FLUSH_SIZE,
+                 data_format='ascii', encoding='utf-8', policy=None):
+        """
+        初始化
+        :param directory:       保存目录
+        :param flush_interval:  写入间隔(s)
+        :param flush_size:      缓存大小(字符)
+        :param data_format:     保存格式 hex/ascii
+        :param encoding:        ascii格式的编码
+        :param policy:          日志分割策略（RotationPolicy），默认不分割
+        """
+        super().__init__()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.data_format = data_format
+        self.encoding = encoding
+        self.file_path = None
+        self.policy = policy or RotationPolicy()
+        self.__file = None
+        self.__opened_at = 0.0
+        # 压缩及清理线程
+        self.__compressor = LogCompressor(self.policy)
+        self.__compressor.compress_error.connect(self.compress_error)
+        self.__queue = queue.SimpleQueue()
+        self.__running = False
+        self.__stopped = False
+        # monotonic时间转换为系统时间
+        self.__wall_offset_ns = time.time_ns() - time.monotonic_ns()
+        # 每个方向一个增量解码器，多字节字符跨块时不会出错
+        self.__decoders = {}
+        # 每个方向一个分行器及[不完整行第一个字节的时间ns, 最后收到数据的时间ns]
+        self.__framers = {}
+        self.__partial = {}
+
+    def write(self, direction, payload, timestamp_ns=None):
+        """
+        sink接口，在串口线程中调用，只做入队
+        :param direction:
+        :param payload:
+        :param timestamp_ns:
+        :return:
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        self.__queue.put((timestamp_ns, direction, bytes(payload)))
+
+    def run(self):
+        if self.__running:
+            return
+        self.__running = True
+        self.__compressor.start()
+        try:
+            self.__open_segment__()
+            self.__write_loop__()
+        except Exception as e:
+            self.autosave_error.emit(str(e))
+        finally:
+            if self.__file:
+                self.__file.close()
+                self.__file = None
+            self.__compressor.stop()
+
+    def __open_segment__(self):
+        """
+        新建日志文件
+        :return:
+        """
+        date = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
+        file_path = os.path.join(self.directory, date + AUTOSAVE_SUFFIX)
+        index = 1
+        # 同一秒内分割多次时加序号
+        while segment_exists(file_path):
+            file_path = os.path.join(self.directory, f'{date}_{index}' + AUTOSAVE_SUFFIX)
+            index += 1
+        self.file_path = file_path
+        self.__file = open(file_path, 'a', encoding='utf-8')
+        self.__opened_at = time.monotonic()
+
+    def __rotate__(self):
+        """
+        关闭当前文件并新建文件，旧文件在压缩线程中处理
+        :return:
+        """
+        old_path = self.file_path
+        self.__file.close()
+        self.__file = None
+        self.__open_segment__()
+        self.__compressor.submit(old_path)
+
+    def __write_loop__(self):
+        buffer = []
+        size = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            if self.__partial:
+                timeout = min(timeout, AUTOSAVE_LINE_IDLE)
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                lines = self.__split_lines__(*item)
+            else:
+                lines = []
+            stopping = self.__stopped and self.__queue.empty()
+            lines += self.__flush_partial__(stopping)
+            for line in lines:
+                buffer.append(line)
+                size += len(line)
+            if buffer and (size >= self.flush_size or time.monotonic() >= deadline or stopping):
+                self.__file.write(''.join(buffer))
+                self.__file.flush()
+                buffer = []
+                size = 0
+                if not stopping and self.policy.should_rotate(self.__file.tell(), self.__opened_at):
+                    self.__rotate__()
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+            if stopping:
+                return
+
+    def __split_lines__(self, timestamp_ns, direction, payload):
+        """
+        按换行符分行，一次读取中的多行分别成行，跨多次读取的一行合并
+        :return: 格式化后的完整行
+        """
+        framer = self.__framers.get(direction)
+        if framer is None:
+            framer = self.__framers[direction] = LineFramer()
+        partial = self.__partial.get(direction)
+        # 第一行从不完整行开始的时间算起，其余各行都在本次读取中
+        line_start = partial[0] if partial else timestamp_ns
+        lines = []
+        for frame in framer.feed(payload):
+            lines.append(self.__format_line__(line_start, direction, frame))
+            line_start = timestamp_ns
+        if framer.pending:
+            self.__partial[direction] = [line_start, timestamp_ns]
+        else:
+            self.__partial.pop(direction, None)
+        return lines
+
+    def __flush_partial__(self, force):
+        """
+        空闲超时或停止时输出不完整的行
+        :param force: 全部输出
+        :return: 格式化后的行
+        """
+        lines = []
+        now_ns = time.monotonic_ns()
+        for direction, (line_start, last_ns) in list(self.__partial.items()):
+            if force or now_ns - last_ns >= AUTOSAVE_LINE_IDLE * 1e9:
+                del self.__partial[direction]
+                lines.append(self.__format_line__(line_start, direction, self.__framers[direction].flush()))
+        return lines
+
+    def __format_line__(self, timestamp_ns, direction, payload):
+        """
+        格式化一行数据
+        :return:
+        """
+        wall = (timestamp_ns + self.__wall_offset_ns) / 1e9
+        current_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall))
+        data_from = 'recv' if direction == DIRECTION_RECV else 'send'
+        if self.data_format == 'hex':
+            data = to_hex(payload)
+        else:
+            decoder = self.__decoders.get(direction)
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+                self.__decoders[direction] = decoder
+            data = decoder.decode(payload)
+        data = data.rstrip('\r\n')
+        return f'[{data_from}][{current_time}.{int(wall * 1000) % 1000:03d}]{data}\n'
+
+    def stop(self):
+        """
+        停止线程，队列中剩余的数据全部写入后返回
+        :return:
+        """
+        self.__stopped = True
+        self.__queue.put(None)
+        self.wait()
+        self.__running = False
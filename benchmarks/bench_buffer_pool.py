@@ -0,0 +1,58 @@
+"""
+bench_buffer_pool.py
+串口读取方式对比：每次os.read分配新的bytes vs os.readv读入池中取出的缓冲区
+用管道代替串口（pyserial在POSIX下同样通过os.read读取文件描述符）
+运行：python benchmarks/bench_buffer_pool.py
+"""
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buffer_pool import BufferPool, ReadStats, read_into
+
+
+class PipePort:
+    """
+    只提供fd的串口替身
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+
+
+def main():
+    rounds = 100000
+    for size in [64, 1024, 4096]:
+        read_fd, write_fd = os.pipe()
+        payload = os.urandom(size)
+        port = PipePort(read_fd)
+        pool = BufferPool(size)
+        stats = ReadStats(pool)
+        buffer = pool.acquire()
+        view = memoryview(buffer)
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            os.write(write_fd, payload)
+            os.read(read_fd, size)
+        alloc_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(rounds):
+            os.write(write_fd, payload)
+            count, direct = read_into(port, view)
+            stats.reads += 1
+            stats.bytes += count
+            stats.direct_reads += direct
+        pooled_time = time.perf_counter() - start
+        pool.release(buffer)
+        os.close(read_fd)
+        os.close(write_fd)
+        print(f'{size:>5} B  os.read {alloc_time / rounds * 1e6:5.2f} us/read ({rounds} bytes objects)  '
+              f'readv {pooled_time / rounds * 1e6:5.2f} us/read  {stats}')
+
+
+if __name__ == '__main__':
+    main()
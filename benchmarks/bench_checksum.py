@@ -0,0 +1,32 @@
+"""
+bench_checksum.py
+各校验算法的吞吐量，与1.5Mbaud（8N1约150KB/s）所需的速度对比
+运行：python benchmarks/bench_checksum.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checksum import CHECKSUMS, ChecksumStage, append_checksum, checksum_bytes
+
+# 1.5Mbaud 8N1每秒字节数
+LINE_RATE = 1500000 / 10
+
+
+def main():
+    data = os.urandom(1024 * 1024)
+    for name in CHECKSUMS:
+        elapsed = min(timeit.repeat(lambda: checksum_bytes(name, data), number=1, repeat=3))
+        # 64字节的帧逐帧校验，包含切片和比较的开销
+        frames = [append_checksum(name, data[i:i + 64]) for i in range(0, len(data), 64)]
+        stage = ChecksumStage(name)
+        frame_elapsed = min(timeit.repeat(lambda: stage.process(frames), number=1, repeat=3))
+        rate = len(data) / elapsed
+        print(f'{name:<12} {rate / 1e6:8.1f} MB/s ({rate / LINE_RATE:7.0f}x 1.5Mbaud)  '
+              f'64 B frames {len(frames) / frame_elapsed / 1e3:7.1f} kframes/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+bench_frame_decoder.py
+各分帧器的吞吐量：4MB数据流按4KB一块输入
+运行：python benchmarks/bench_frame_decoder.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_decoder import (LineFramer, FixedLengthFramer, LengthPrefixFramer, COBSFramer, SLIPFramer,
+                           cobs_encode, slip_encode)
+
+STREAM_SIZE = 4 * 1024 * 1024
+CHUNK_SIZE = 4096
+
+
+def random_bytes(rng, size):
+    # random.randbytes需要Python 3.9
+    return rng.getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def make_stream(encode, frame_size):
+    """
+    生成由随机帧组成的数据流
+    :param encode:      单帧编码函数
+    :param frame_size:  帧的平均长度
+    :return: (数据流, 帧数)
+    """
+    rng = random.Random(0)
+    parts = []
+    size = 0
+    while size < STREAM_SIZE:
+        part = encode(random_bytes(rng, rng.randint(frame_size // 2, frame_size * 3 // 2)))
+        parts.append(part)
+        size += len(part)
+    return b''.join(parts), len(parts)
+
+
+def run(framer, stream):
+    start = time.perf_counter()
+    frames = 0
+    for offset in range(0, len(stream), CHUNK_SIZE):
+        frames += len(framer.feed(stream[offset:offset + CHUNK_SIZE]))
+    return time.perf_counter() - start, frames
+
+
+def main():
+    for frame_size in [16, 64, 256]:
+        cases = [
+            ('delimiter', LineFramer(), lambda data: data.replace(b'\n', b'') + b'\n'),
+            ('fixed', FixedLengthFramer(frame_size), None),
+            ('length_prefix', LengthPrefixFramer(0, 2, 'big'), lambda data: len(data).to_bytes(2, 'big') + data),
+            ('cobs', COBSFramer(), lambda data: cobs_encode(data) + b'\x00'),
+            ('slip', SLIPFramer(), slip_encode),
+        ]
+        for name, framer, encode in cases:
+            if encode is None:
+                stream = random_bytes(random.Random(0), STREAM_SIZE)
+                expected = STREAM_SIZE // frame_size
+            else:
+                stream, expected = make_stream(encode, frame_size)
+            elapsed, frames = run(framer, stream)
+            assert frames == expected, (name, frames, expected)
+            print(f'frame ~{frame_size:>3} B  {name:<14} {len(stream) / elapsed / 1e6:7.1f} MB/s  '
+                  f'{frames / elapsed / 1e3:8.1f} kframes/s')
+
+
+if __name__ == '__main__':
+    main()
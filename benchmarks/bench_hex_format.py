@@ -0,0 +1,32 @@
+"""
+bench_hex_format.py
+十六进制格式化性能对比：原逐字节生成器 vs hex_format.to_hex / hex_dump
+运行：python benchmarks/bench_hex_format.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hex_format import to_hex, hex_dump
+
+
+def generator_hex(byte_array):
+    return ' '.join(format(x, '02x') for x in byte_array)
+
+
+def main():
+    for size in [64, 1024, 16 * 1024, 1024 * 1024]:
+        data = os.urandom(size)
+        assert generator_hex(data) == to_hex(data)
+        number = max(1, (4 * 1024 * 1024) // size)
+        old = timeit.timeit(lambda: generator_hex(data), number=number) / number
+        new = timeit.timeit(lambda: to_hex(data), number=number) / number
+        dump = timeit.timeit(lambda: hex_dump(data), number=number) / number
+        print(f'{size:>8} B  generator {old * 1e6:10.1f} us  to_hex {new * 1e6:9.1f} us  '
+              f'({old / new:5.1f}x)  hex_dump {dump * 1e6:9.1f} us')
+
+
+if __name__ == '__main__':
+    main()
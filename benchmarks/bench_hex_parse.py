@@ -0,0 +1,50 @@
+"""
+bench_hex_parse.py
+十六进制发送数据解析性能对比：原逐段切片循环 vs hex_format.parse_hex
+运行：python benchmarks/bench_hex_parse.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hex_format import to_hex, parse_hex
+
+# 原实现每次切片/strip都复制剩余字符串，超过该大小后耗时过长，不再测试
+SLICE_MAX_SIZE = 64 * 1024
+
+
+def slice_parse(data_str):
+    data_str = data_str.strip()
+    send_list = []
+    while data_str != '':
+        send_list.append(int(data_str[0:2], 16))
+        data_str = data_str[2:].strip()
+    return bytes(send_list)
+
+
+def main():
+    for size in [64, 1024, 16 * 1024, 64 * 1024, 1024 * 1024]:
+        data = os.urandom(size)
+        samples = {
+            'spaced': to_hex(data),
+            'packed': to_hex(data, ''),
+            '0x,': ', '.join('0x' + item for item in to_hex(data).split()),
+            'single': ' '.join(format(b & 0x0f, 'x') for b in data),
+        }
+        number = max(1, (1024 * 1024) // size)
+        for name, text in samples.items():
+            expected = bytes(b & 0x0f for b in data) if name == 'single' else data
+            assert parse_hex(text) == expected
+            new = timeit.timeit(lambda: parse_hex(text), number=number) / number
+            line = f'{size:>8} B  {name:<7} parse_hex {new * 1e3:9.3f} ms'
+            if name == 'spaced' and size <= SLICE_MAX_SIZE:
+                assert slice_parse(text) == data
+                old = timeit.timeit(lambda: slice_parse(text), number=max(1, number // 16)) / max(1, number // 16)
+                line += f'  slice loop {old * 1e3:10.3f} ms ({old / new:7.1f}x)'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
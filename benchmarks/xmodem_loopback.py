@@ -0,0 +1,212 @@
+"""
+xmodem_loopback.py
+XMODEM/XMODEM-1K/YMODEM发送端回环检查
+发送端（xmodem.ModemSender）和一个最小的接收端分别使用pty的两端，检查文件内容、NAK重发和CAN取消，以及发送CAN失败、文件名过长时的错误
+只支持POSIX
+运行：python benchmarks/xmodem_loopback.py
+"""
+import io
+import os
+import random
+import select
+import sys
+import threading
+import tty
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xmodem import (ModemError, ModemSender, XMODEM, XMODEM_1K, YMODEM, SOH, STX, EOT, ACK, NAK, CAN, CRC_START,
+                    CPMEOF, crc16)
+
+# 接收端单次读取的超时(s)
+RECV_TIMEOUT = 5
+
+
+class Port:
+    """
+    pty一端的读写
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def write(self, data):
+        view = memoryview(bytes(data))
+        while view:
+            view = view[os.write(self.fd, view):]
+
+    def read_byte(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        return os.read(self.fd, 1)[0]
+
+    def read_exact(self, size, timeout=RECV_TIMEOUT):
+        data = bytearray()
+        while len(data) < size:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+            if not readable:
+                raise TimeoutError('receiver timed out')
+            data += os.read(self.fd, size - len(data))
+        return bytes(data)
+
+
+def receive(port, protocol, crc=True, nak_blocks=(), cancel_block=None):
+    """
+    最小接收端
+    :param port:            Port
+    :param protocol:        xmodem/xmodem-1k/ymodem
+    :param crc:             True以'C'启动使用CRC16，False以NAK启动使用累加和
+    :param nak_blocks:      第一次收到这些序号的数据块时回复NAK
+    :param cancel_block:    收到该序号的数据块时发送CAN CAN取消
+    :return: (文件名, 文件内容)
+    """
+    naked = set()
+    name, size = '', None
+    data = bytearray()
+    expected = 0 if protocol == YMODEM else 1
+    port.write(bytes([CRC_START if crc else NAK]))
+    while True:
+        header = port.read_exact(1)[0]
+        if header == EOT:
+            port.write(bytes([ACK]))
+            break
+        if header not in (SOH, STX):
+            raise AssertionError('unexpected header 0x{:02x}'.format(header))
+        block_size = 128 if header == SOH else 1024
+        seq, seq_inv = port.read_exact(2)
+        payload = port.read_exact(block_size)
+        check = port.read_exact(2 if crc else 1)
+        assert seq ^ seq_inv == 0xff, 'bad sequence complement'
+        if crc:
+            assert int.from_bytes(check, 'big') == crc16(payload), 'bad crc'
+        else:
+            assert check[0] == sum(payload) & 0xff, 'bad checksum'
+        if seq == cancel_block:
+            port.write(bytes([CAN, CAN]))
+            return name, bytes(data)
+        if seq in nak_blocks and seq not in naked:
+            naked.add(seq)
+            port.write(bytes([NAK]))
+            continue
+        if seq == (expected - 1) & 0xff:
+            # 重复的数据块（ACK丢失），只回复ACK
+            port.write(bytes([ACK]))
+            continue
+        assert seq == expected & 0xff, 'expected block {} got {}'.format(expected & 0xff, seq)
+        expected += 1
+        port.write(bytes([ACK]))
+        if protocol == YMODEM and expected == 1:
+            # 块0：文件名\0大小\0
+            fields = payload.split(b'\x00')
+            name, size = fields[0].decode('utf-8'), int(fields[1])
+            port.write(bytes([CRC_START]))
+            continue
+        data += payload
+    if protocol == YMODEM:
+        # 以空文件名的块0结束批量传输
+        port.write(bytes([CRC_START]))
+        header = port.read_exact(1)[0]
+        port.read_exact(2 + (128 if header == SOH else 1024) + 2)
+        port.write(bytes([ACK]))
+        return name, bytes(data[:size])
+    return name, bytes(data).rstrip(bytes([CPMEOF]))
+
+
+def run_case(protocol, payload, crc=True, nak_blocks=(), cancel_block=None):
+    """
+    在pty上运行一次传输
+    :return: (接收端结果, 发送端异常, 重发次数)
+    """
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    sender_port, receiver_port = Port(master), Port(slave)
+    sender = ModemSender(sender_port.write, sender_port.read_byte, protocol, timeout=2)
+    outcome = {}
+
+    def send():
+        try:
+            outcome['sent'] = sender.send(io.BytesIO(payload), 'test.bin', len(payload))
+        except ModemError as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=send, daemon=True)
+    thread.start()
+    try:
+        result = receive(receiver_port, protocol, crc, nak_blocks, cancel_block)
+    finally:
+        thread.join(RECV_TIMEOUT * 2)
+        os.close(master)
+        os.close(slave)
+    return result, outcome.get('error'), sender.retransmits
+
+
+def run_error_cases():
+    """
+    不需要接收端的错误处理：发送CAN失败时保留原来的错误，YMODEM文件名过长时不开始传输
+    :return: 失败的检查数
+    """
+    failures = 0
+
+    def broken_write(data):
+        raise OSError('port closed')
+
+    sender = ModemSender(broken_write, lambda timeout: None, XMODEM_1K, cancelled=lambda: True)
+    try:
+        sender.send(io.BytesIO(b'data'))
+        error = None
+    except Exception as e:
+        error = e
+    ok = isinstance(error, ModemError)
+    failures += not ok
+    print('{:<28} {}  error={!r}'.format('cancel with broken port', 'ok' if ok else 'FAIL', error))
+
+    written = []
+    sender = ModemSender(written.append, lambda timeout: None, YMODEM)
+    try:
+        sender.send(io.BytesIO(b'data'), 'x' * 1100, 4)
+        error = None
+    except ModemError as e:
+        error = e
+    ok = error is not None and not written
+    failures += not ok
+    print('{:<28} {}  error={}'.format('ymodem long file name', 'ok' if ok else 'FAIL', error))
+    return failures
+
+
+def main():
+    rng = random.Random(1)
+    # 末尾不是填充字节，XMODEM接收端可以去掉填充
+    payload = bytes(rng.getrandbits(8) for _ in range(5000)) + b'end'
+    failures = 0
+    cases = [
+        ('xmodem crc', XMODEM, {}),
+        ('xmodem checksum', XMODEM, {'crc': False}),
+        ('xmodem nak retransmit', XMODEM, {'nak_blocks': (2,)}),
+        ('xmodem-1k', XMODEM_1K, {}),
+        ('xmodem-1k nak retransmit', XMODEM_1K, {'nak_blocks': (1, 3)}),
+        ('ymodem', YMODEM, {}),
+        ('ymodem nak retransmit', YMODEM, {'nak_blocks': (2,)}),
+    ]
+    for title, protocol, options in cases:
+        (name, data), error, retransmits = run_case(protocol, payload, **options)
+        expected_retransmits = len(options.get('nak_blocks', ()))
+        ok = error is None and data == payload and retransmits == expected_retransmits
+        if protocol == YMODEM:
+            ok = ok and name == 'test.bin'
+        failures += not ok
+        print('{:<28} {}  retransmits={} error={}'.format(title, 'ok' if ok else 'FAIL', retransmits, error))
+    for protocol in [XMODEM, XMODEM_1K, YMODEM]:
+        _, error, _ = run_case(protocol, payload, cancel_block=2)
+        ok = isinstance(error, ModemError)
+        failures += not ok
+        print('{:<28} {}  error={}'.format(protocol + ' cancel', 'ok' if ok else 'FAIL', error))
+    failures += run_error_cases()
+    if failures:
+        print('{} case(s) failed'.format(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
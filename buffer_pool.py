@@ -0,0 +1,97 @@
+"""
+buffer_pool.py
+接收缓冲区池
+串口线程把数据直接读入预先分配的bytearray，以memoryview切片交给分帧器、ByteStore和sink，读取本身不再分配新的bytes
+缓冲区用完后放回池中复用，计数器用于确认稳定运行时没有新的分配
+"""
+import collections
+import os
+import threading
+
+# 缓冲区大小，与单次读取的最大字节数一致
+POOL_BUFFER_SIZE = 4096
+# 池中最多保留的空闲缓冲区数
+POOL_MAX_FREE = 8
+
+
+class BufferPool:
+    """
+    固定大小的bytearray缓冲区池，可在多个线程中使用
+    """
+
+    def __init__(self, buffer_size=POOL_BUFFER_SIZE, max_free=POOL_MAX_FREE):
+        """
+        初始化
+        :param buffer_size: 缓冲区大小
+        :param max_free:    最多保留的空闲缓冲区数，超过的缓冲区交给垃圾回收
+        """
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+        # 新分配的缓冲区数、取出次数
+        self.allocations = 0
+        self.acquires = 0
+        self.__free = collections.deque()
+        self.__lock = threading.Lock()
+
+    @property
+    def free(self):
+        return len(self.__free)
+
+    def acquire(self):
+        """
+        取出一个缓冲区，池为空时新分配
+        :return: bytearray
+        """
+        with self.__lock:
+            self.acquires += 1
+            if self.__free:
+                return self.__free.pop()
+            self.allocations += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer):
+        """
+        放回缓冲区，调用方不能再持有它的memoryview
+        :param buffer:
+        :return:
+        """
+        if len(buffer) != self.buffer_size:
+            return
+        with self.__lock:
+            if len(self.__free) < self.max_free:
+                self.__free.append(buffer)
+
+
+class ReadStats:
+    """
+    串口读取统计
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.reads = 0
+        # 直接读入缓冲区的次数，需要复制的次数
+        self.direct_reads = 0
+        self.copied_reads = 0
+        self.bytes = 0
+
+    def __str__(self):
+        return '读取{}次{}字节, 直接读入{}次, 复制{}次, 缓冲区分配{}次'.format(
+            self.reads, self.bytes, self.direct_reads, self.copied_reads, self.pool.allocations)
+
+
+def read_into(port, view):
+    """
+    把串口中已到达的数据读入view，不分配新的bytes
+    POSIX下pyserial提供文件描述符，使用os.readv直接读入；其他平台使用pyserial的readinto（内部仍会复制）
+    :param port:    已打开的serial.Serial
+    :param view:    可写的memoryview
+    :return: (读取的字节数, 是否直接读入)
+    """
+    fd = getattr(port, 'fd', None)
+    if fd is not None and hasattr(os, 'readv'):
+        try:
+            return os.readv(fd, [view]), True
+        except BlockingIOError:
+            return 0, True
+    return port.readinto(view), False
@@ -0,0 +1,90 @@
+"""
+byte_store.py
+原始字节存储
+串口线程写入，界面线程按偏移读取；超过容量后按块淘汰最旧的数据，偏移始终按接收总字节数计算
+"""
+import threading
+
+# 默认最大容量
+BYTE_STORE_MAX_BYTES = 128 * 1024 * 1024
+# 每次淘汰的字节数，为16的整数倍，保证十六进制转储的行边界不变
+BYTE_STORE_EVICT_BYTES = 1024 * 1024
+
+
+class ByteStore:
+    """
+    线程安全的追加式字节存储
+    """
+
+    def __init__(self, max_bytes=BYTE_STORE_MAX_BYTES, evict_bytes=BYTE_STORE_EVICT_BYTES):
+        """
+        初始化
+        :param max_bytes:   最大容量
+        :param evict_bytes: 每次淘汰的字节数
+        """
+        self.max_bytes = max_bytes
+        self.evict_bytes = evict_bytes
+        self.__buffer = bytearray()
+        # 缓冲区第一个字节的偏移
+        self.__base = 0
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__buffer)
+
+    @property
+    def base_offset(self):
+        """
+        仍保存的最早数据的偏移
+        :return:
+        """
+        return self.__base
+
+    @property
+    def end_offset(self):
+        """
+        已写入数据的总字节数
+        :return:
+        """
+        return self.__base + len(self.__buffer)
+
+    def append(self, data):
+        """
+        追加数据
+        :param data:
+        :return: data第一个字节的偏移
+        """
+        with self.__lock:
+            offset = self.__base + len(self.__buffer)
+            self.__buffer += data
+            overflow = len(self.__buffer) - self.max_bytes
+            if overflow > 0:
+                # 按块淘汰，避免每次追加都移动整个缓冲区
+                evict = -(-overflow // self.evict_bytes) * self.evict_bytes
+                evict = min(evict, len(self.__buffer))
+                del self.__buffer[:evict]
+                self.__base += evict
+            return offset
+
+    def read(self, offset, length):
+        """
+        读取数据，超出已保存范围的部分被截去
+        :param offset: 起始偏移
+        :param length: 长度
+        :return: bytes
+        """
+        with self.__lock:
+            start = max(offset, self.__base) - self.__base
+            end = min(offset + length, self.__base + len(self.__buffer)) - self.__base
+            if end <= start:
+                return b''
+            return bytes(self.__buffer[start:end])
+
+    def clear(self):
+        """
+        清空数据，偏移从0开始
+        :return:
+        """
+        with self.__lock:
+            self.__buffer = bytearray()
+            self.__base = 0
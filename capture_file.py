@@ -0,0 +1,194 @@
+"""
+capture_file.py
+二进制捕获文件
+文件头：魔数(6) 版本(u16) 开始时的系统时间ns(i64) 开始时的monotonic时间ns(i64)
+数据块：monotonic时间ns(i64) 方向(u8) 通道(u8) 长度(u32) 数据
+所有数据只追加写入，读取时使用mmap映射文件，建立数据块索引后可随机访问
+"""
+import mmap
+import struct
+import threading
+import time
+from array import array
+
+CAPTURE_MAGIC = b'UACAP\x00'
+CAPTURE_VERSION = 1
+CAPTURE_SUFFIX = '.uacap'
+# 数据方向
+DIRECTION_RECV = 0
+DIRECTION_SEND = 1
+
+_FILE_HEADER = struct.Struct('<6sHqq')
+_CHUNK_HEADER = struct.Struct('<qBBI')
+# 写入缓冲区大小
+CAPTURE_BUFFER_SIZE = 64 * 1024
+
+
+class CaptureFormatError(ValueError):
+    """
+    捕获文件格式错误
+    """
+
+
+class CaptureWriter:
+    """
+    捕获文件写入，可在多个线程中调用write
+    """
+
+    def __init__(self, path):
+        """
+        创建捕获文件
+        :param path: 文件路径
+        """
+        self.path = path
+        self.__wall_ns = time.time_ns()
+        self.__mono_ns = time.monotonic_ns()
+        self.__lock = threading.Lock()
+        self.__file = open(path, 'wb', buffering=CAPTURE_BUFFER_SIZE)
+        self.__file.write(_FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, self.__wall_ns, self.__mono_ns))
+        self.chunks = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def closed(self):
+        return self.__file.closed
+
+    def write(self, direction, payload, timestamp_ns=None, channel=0):
+        """
+        追加一个数据块
+        :param direction:    DIRECTION_RECV/DIRECTION_SEND
+        :param payload:      数据
+        :param timestamp_ns: time.monotonic_ns()时间，默认为当前时间
+        :param channel:      通道号（多串口时区分串口）
+        :return:
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.__file.write(_CHUNK_HEADER.pack(timestamp_ns, direction, channel, len(payload)))
+            self.__file.write(payload)
+            self.chunks += 1
+            self.bytes += len(payload)
+
+    def flush(self):
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.flush()
+
+    def close(self):
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.close()
+
+
+class CaptureReader:
+    """
+    捕获文件读取，通过mmap访问文件内容，读取数据不复制
+    """
+
+    def __init__(self, path):
+        """
+        打开捕获文件并建立数据块索引
+        :param path: 文件路径
+        """
+        self.path = path
+        self.__file = open(path, 'rb')
+        try:
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.__file.close()
+            raise CaptureFormatError('empty capture file')
+        if len(self.__map) < _FILE_HEADER.size:
+            self.close()
+            raise CaptureFormatError('capture file too short')
+        magic, version, self.wall_ns, self.mono_ns = _FILE_HEADER.unpack_from(self.__map, 0)
+        if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+            self.close()
+            raise CaptureFormatError('not a capture file')
+        # 每个数据块头的偏移及通道号
+        self.__offsets = array('Q')
+        self.__channels = array('B')
+        self.__build_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __build_index(self):
+        """
+        依次跳过数据块建立索引，末尾写入不完整的数据块被忽略
+        :return:
+        """
+        buffer = self.__map
+        size = len(buffer)
+        offset = _FILE_HEADER.size
+        header_size = _CHUNK_HEADER.size
+        unpack_from = _CHUNK_HEADER.unpack_from
+        offsets = self.__offsets
+        channels = self.__channels
+        while offset + header_size <= size:
+            _, _, channel, length = unpack_from(buffer, offset)
+            if offset + header_size + length > size:
+                break
+            offsets.append(offset)
+            channels.append(channel)
+            offset += header_size + length
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def __getitem__(self, index):
+        """
+        读取一个数据块
+        :param index:
+        :return: (monotonic时间ns, 方向, 通道, 数据memoryview)
+        """
+        offset = self.__offsets[index]
+        timestamp_ns, direction, channel, length = _CHUNK_HEADER.unpack_from(self.__map, offset)
+        start = offset + _CHUNK_HEADER.size
+        return timestamp_ns, direction, channel, memoryview(self.__map)[start:start + length]
+
+    def __iter__(self):
+        for i in range(len(self.__offsets)):
+            yield self[i]
+
+    @property
+    def channels(self):
+        """
+        :return: 文件中出现的通道号，从小到大
+        """
+        return sorted(set(self.__channels))
+
+    def channel_indices(self, channel):
+        """
+        某个通道的数据块序号，只读取索引，不访问数据
+        :param channel: 通道号
+        :return: array('Q')
+        """
+        return array('Q', (i for i, c in enumerate(self.__channels) if c == channel))
+
+    def wall_time(self, timestamp_ns):
+        """
+        将数据块的monotonic时间转换为系统时间
+        :param timestamp_ns:
+        :return: 秒
+        """
+        return (self.wall_ns + timestamp_ns - self.mono_ns) / 1e9
+
+    def close(self):
+        # 仍有memoryview引用时mmap无法关闭，由垃圾回收释放
+        try:
+            self.__map.close()
+        except (BufferError, AttributeError):
+            pass
+        self.__file.close()
@@ -0,0 +1,162 @@
+"""
+capture_replay_view.py
+捕获文件回放窗口
+数据块直接从CaptureReader（mmap）按序号读取，只为可见的行生成显示文本，打开文件只需建立索引，与文件大小无关
+回放的数据不进入实时接收区和十六进制转储，多串口捕获的文件可按通道号筛选
+"""
+import time
+from array import array
+
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+
+from capture_file import CaptureReader, DIRECTION_RECV
+from hex_format import to_hex
+from recv_log_view import RecvLogView
+from stream_decoder import decode
+
+
+class CaptureReplayModel(QAbstractListModel):
+    """
+    捕获文件模型，每行对应一个数据块，行数据在视图请求时读取
+    """
+
+    def __init__(self, reader, parent=None, encoding='utf-8', errors='replace'):
+        """
+        初始化
+        :param reader:      CaptureReader
+        :param parent:
+        :param encoding:    ascii显示的编码
+        :param errors:      解码错误处理方式
+        """
+        super().__init__(parent)
+        self.__reader = reader
+        # 筛选后各行对应的数据块序号，None表示显示全部通道
+        self.__rows = None
+        self.__channel = None
+        self.__data_format = 'hex'
+        self.__encoding = encoding
+        self.__errors = errors
+
+    @property
+    def reader(self):
+        return self.__reader
+
+    @property
+    def channel(self):
+        return self.__channel
+
+    def set_channel(self, channel):
+        """
+        只显示一个通道的数据
+        :param channel: 通道号，None显示全部
+        :return:
+        """
+        if channel == self.__channel:
+            return
+        self.beginResetModel()
+        self.__channel = channel
+        self.__rows = None if channel is None else self.__reader.channel_indices(channel)
+        self.endResetModel()
+
+    @property
+    def data_format(self):
+        return self.__data_format
+
+    @data_format.setter
+    def data_format(self, value):
+        if value not in ['hex', 'ascii']:
+            raise ValueError('data_format must be either hex or ascii')
+        if value == self.__data_format:
+            return
+        self.__data_format = value
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0), self.index(self.rowCount() - 1), [Qt.DisplayRole])
+
+    def close(self):
+        """
+        清空显示并释放文件映射
+        :return:
+        """
+        self.beginResetModel()
+        self.__rows = array('Q')
+        self.endResetModel()
+        self.__reader.close()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.__reader) if self.__rows is None else len(self.__rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row = index.row()
+        timestamp_ns, direction, channel, payload = self.__reader[row if self.__rows is None else self.__rows[row]]
+        wall_time = self.__reader.wall_time(timestamp_ns)
+        if self.__data_format == 'hex':
+            text = to_hex(payload)
+        else:
+            text = decode(payload, self.__encoding, self.__errors).rstrip('\r\n')
+        return "[{}.{:03d}][ch{}][{}]{}".format(
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(wall_time)), int(wall_time * 1000) % 1000,
+            channel, 'recv' if direction == DIRECTION_RECV else 'send', text)
+
+
+class CaptureReplayWindow(QMainWindow):
+    """
+    捕获文件回放窗口，关闭时释放文件映射
+    """
+
+    def __init__(self, path, parent=None, encoding='utf-8', errors='replace'):
+        """
+        打开捕获文件
+        :param path:        文件路径
+        :param parent:
+        :param encoding:    ascii显示的编码
+        :param errors:      解码错误处理方式
+        :raise OSError, CaptureFormatError: 文件无法打开
+        """
+        reader = CaptureReader(path)
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.model = CaptureReplayModel(reader, self, encoding, errors)
+        self.setWindowTitle("回放 - {}".format(path))
+        self.resize(900, 600)
+
+        self.channel_combo = QComboBox(self)
+        self.channel_combo.addItem("全部通道", None)
+        for channel in reader.channels:
+            self.channel_combo.addItem("通道{}".format(channel), channel)
+        self.hex_check = QCheckBox("HEX显示", self)
+        self.hex_check.setChecked(True)
+        info_label = QLabel("{}个数据块，开始于{}".format(
+            len(reader), time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(reader.wall_ns / 1e9))), self)
+        top = QHBoxLayout()
+        top.addWidget(self.channel_combo)
+        top.addWidget(self.hex_check)
+        top.addStretch(1)
+        top.addWidget(info_label)
+
+        self.view = RecvLogView(self)
+        self.view.follow_tail = False
+        self.view.setModel(self.model)
+
+        central = QWidget(self)
+        layout = QVBoxLayout(central)
+        layout.addLayout(top)
+        layout.addWidget(self.view, 1)
+        self.setCentralWidget(central)
+
+        self.channel_combo.currentIndexChanged.connect(self.handler_channel)
+        self.hex_check.toggled.connect(self.handler_format)
+
+    def handler_channel(self, index):
+        self.model.set_channel(self.channel_combo.itemData(index))
+
+    def handler_format(self, checked):
+        self.model.data_format = 'hex' if checked else 'ascii'
+
+    def closeEvent(self, event):
+        self.model.close()
+        event.accept()
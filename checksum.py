@@ -0,0 +1,176 @@
+"""
+checksum.py
+帧校验
+CRC16-CCITT和CRC32使用binascii/zlib的C实现，CRC8和Modbus CRC使用256项查表，每字节一次查表
+校验值附加在帧末尾：接收时校验整帧并统计错误帧，发送时自动附加到十六进制数据末尾
+"""
+import binascii
+import zlib
+
+# 校验方式
+CRC8 = 'crc8'
+CRC16_CCITT = 'crc16_ccitt'
+CRC32 = 'crc32'
+MODBUS = 'modbus'
+CHECKSUMS = [CRC8, CRC16_CCITT, CRC32, MODBUS]
+
+
+def _make_table(poly, width, reflected):
+    """
+    生成CRC查找表
+    :param poly:        多项式（reflected时为反转后的多项式）
+    :param width:       位宽
+    :param reflected:   是否低位先行
+    :return:
+    """
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        if reflected:
+            crc = byte
+            for _ in range(8):
+                crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+        else:
+            crc = byte << (width - 8)
+            for _ in range(8):
+                crc = ((crc << 1) ^ poly if crc & top else crc << 1) & mask
+        table.append(crc)
+    return table
+
+
+_CRC8_TABLE = bytes(_make_table(0x07, 8, False))
+_MODBUS_TABLE = _make_table(0xa001, 16, True)
+
+
+def crc8(data, crc=0):
+    """
+    CRC-8（多项式0x07，初值0）
+    :param data:
+    :param crc: 初值，可用于分段计算
+    :return:
+    """
+    table = _CRC8_TABLE
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
+
+def crc16_ccitt(data, crc=0xffff):
+    """
+    CRC-16/CCITT-FALSE（多项式0x1021，初值0xFFFF）
+    :param data:
+    :param crc:
+    :return:
+    """
+    return binascii.crc_hqx(data, crc)
+
+
+def crc32(data, crc=0):
+    """
+    CRC-32（与zlib/以太网相同）
+    :param data:
+    :param crc:
+    :return:
+    """
+    return zlib.crc32(data, crc)
+
+
+def crc16_modbus(data, crc=0xffff):
+    """
+    CRC-16/MODBUS（反转多项式0xA001，初值0xFFFF）
+    :param data:
+    :param crc:
+    :return:
+    """
+    table = _MODBUS_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xff]
+    return crc
+
+
+# 名称 -> (计算函数, 校验值字节数, 字节序)
+_ALGORITHMS = {
+    CRC8: (crc8, 1, 'big'),
+    CRC16_CCITT: (crc16_ccitt, 2, 'big'),
+    CRC32: (crc32, 4, 'little'),
+    MODBUS: (crc16_modbus, 2, 'little'),
+}
+
+
+def checksum_size(name):
+    return _ALGORITHMS[name][1]
+
+
+def checksum_bytes(name, data):
+    """
+    计算校验值
+    :param name: CHECKSUMS之一
+    :param data:
+    :return: 按帧中的字节序排列的校验值
+    """
+    func, size, byteorder = _ALGORITHMS[name]
+    return func(data).to_bytes(size, byteorder)
+
+
+def append_checksum(name, data):
+    """
+    在数据末尾附加校验值
+    :param name:
+    :param data:
+    :return:
+    """
+    return bytes(data) + checksum_bytes(name, data)
+
+
+def verify_checksum(name, frame):
+    """
+    校验末尾带校验值的帧
+    :param name:
+    :param frame:
+    :return:
+    """
+    size = _ALGORITHMS[name][1]
+    if len(frame) <= size:
+        return False
+    with memoryview(frame) as view:
+        return checksum_bytes(name, view[:-size]) == view[-size:]
+
+
+class ChecksumStage:
+    """
+    接收帧校验，统计正确和错误的帧数
+    """
+
+    def __init__(self, name, drop_bad=True):
+        """
+        初始化
+        :param name:        校验方式，CHECKSUMS之一
+        :param drop_bad:    是否丢弃校验错误的帧
+        """
+        if name not in CHECKSUMS:
+            raise ValueError('checksum must be one of {}'.format(CHECKSUMS))
+        self.name = name
+        self.drop_bad = drop_bad
+        self.good = 0
+        self.bad = 0
+
+    def process(self, frames):
+        """
+        校验一组帧
+        :param frames:
+        :return: 通过校验的帧（drop_bad为False时返回全部帧）
+        """
+        result = []
+        for frame in frames:
+            if verify_checksum(self.name, frame):
+                self.good += 1
+                result.append(frame)
+            else:
+                self.bad += 1
+                if not self.drop_bad:
+                    result.append(frame)
+        return result
+
+    def __str__(self):
+        return '校验正确{}帧, 错误{}帧'.format(self.good, self.bad)
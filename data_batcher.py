@@ -0,0 +1,70 @@
+"""
+data_batcher.py
+接收数据合并，将一段时间窗口内收到的数据合并为一批，一次性交给界面处理
+界面的刷新次数由时间窗口决定，与数据的行数无关
+"""
+import threading
+import time
+
+# 默认合并时间窗口(ms)
+BATCH_INTERVAL_MS = 20
+# 默认单批最大字节数，超过后立即输出
+BATCH_MAX_BYTES = 64 * 1024
+
+
+class DataBatcher:
+    """
+    数据合并器，可在多个线程中调用add
+    """
+
+    def __init__(self, interval_ms=BATCH_INTERVAL_MS, max_bytes=BATCH_MAX_BYTES):
+        """
+        初始化
+        :param interval_ms: 合并时间窗口(ms)，从本批第一条数据到达时开始计时
+        :param max_bytes:   单批最大字节数
+        """
+        self.interval_ms = interval_ms
+        self.max_bytes = max_bytes
+        self.__items = []
+        self.__size = 0
+        self.__start = 0.0
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__items)
+
+    def add(self, items):
+        """
+        加入数据
+        :param items: 数据列表，每项需支持len()
+        :return:
+        """
+        if not items:
+            return
+        with self.__lock:
+            if not self.__items:
+                self.__start = time.monotonic()
+            self.__items.extend(items)
+            self.__size += sum(len(item) for item in items)
+
+    def due(self):
+        """
+        本批数据是否应该输出
+        :return:
+        """
+        if not self.__items:
+            return False
+        if self.__size >= self.max_bytes:
+            return True
+        return time.monotonic() - self.__start >= self.interval_ms * 0.001
+
+    def take(self):
+        """
+        取出当前的全部数据
+        :return: 数据列表
+        """
+        with self.__lock:
+            items = self.__items
+            self.__items = []
+            self.__size = 0
+        return items
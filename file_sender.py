@@ -0,0 +1,367 @@
+"""
+file_sender.py
+文件发送线程
+按块读取文件放入发送队列，不把整个文件读入内存或控件，可发送任意二进制文件
+发送速度按波特率（或固定的块间隔）控制，同时在途的块数有限，不会挤占发送队列
+进度按实际写入串口的字节数计算
+ModemFileSender通过XMODEM/YMODEM协议发送文件，接收端的应答通过sink接口取得
+"""
+import os
+import threading
+import time
+
+from PyQt5.QtCore import *
+import serial
+
+from capture_file import DIRECTION_RECV
+from serialThread import RECONNECTING
+from xmodem import ModemSender, ModemError, XMODEM_1K
+
+# 默认块大小(字节)
+FILE_CHUNK_SIZE = 1024
+# 同时在发送队列中的块数
+FILE_SEND_WINDOW = 4
+# 进度信号的最小间隔(s)
+PROGRESS_INTERVAL = 0.1
+# 单次sleep的最长时间(s)，保证cancel()能及时生效
+MAX_SLEEP = 0.1
+# 保留的未匹配写入完成通知数
+UNMATCHED_MAX = 64
+# 未匹配的通知中表示该块未写入
+DROPPED = -1
+# 文件预览的字节数
+FILE_PREVIEW_BYTES = 4096
+
+
+def line_rate(baud_rate, data_bits=serial.EIGHTBITS, parity=serial.PARITY_NONE, stop_bits=serial.STOPBITS_ONE):
+    """
+    串口线路的最大传输速率
+    每个字符包含1个起始位、数据位、校验位（可选）和停止位
+    :return: 字节/秒
+    """
+    bits = 1 + data_bits + (0 if parity == serial.PARITY_NONE else 1) + stop_bits
+    return baud_rate / bits
+
+
+def read_preview(path, size=FILE_PREVIEW_BYTES):
+    """
+    读取文件开头的一部分用于预览
+    :param path:
+    :param size:
+    :return: (文件大小, 开头的数据)
+    """
+    with open(path, 'rb') as file:
+        return os.fstat(file.fileno()).st_size, file.read(size)
+
+
+class FileSender(QThread):
+    """
+    文件发送线程
+    """
+    # 已写入字节数, 文件大小, 速率(字节/秒), 预计剩余时间(s)
+    progress = pyqtSignal(int, int, float, float)
+    # 发送结束：是否发送完整, 已写入字节数, 耗时(s)
+    send_done = pyqtSignal(bool, int, float)
+    send_error = pyqtSignal(str)
+
+    def __init__(self, path, serial_thread, chunk_size=FILE_CHUNK_SIZE, bytes_per_sec=0.0, chunk_delay=0.0,
+                 window=FILE_SEND_WINDOW):
+        """
+        初始化
+        :param path:            文件路径
+        :param serial_thread:   已打开的SerialThread
+        :param chunk_size:      块大小(字节)
+        :param bytes_per_sec:   发送速率(字节/秒)，0表示不限制
+        :param chunk_delay:     每块之间的间隔(s)，0表示不等待
+        :param window:          同时在发送队列中的块数
+        """
+        super().__init__()
+        if chunk_size <= 0:
+            raise ValueError('chunk_size must be positive')
+        self.path = path
+        self.chunk_size = chunk_size
+        self.bytes_per_sec = bytes_per_sec
+        self.chunk_delay = chunk_delay
+        self.total = 0
+        self.written = 0
+        self.__serial_thread = serial_thread
+        self.__slots = threading.Semaphore(window)
+        self.__pending = set()
+        self.__unmatched = {}
+        self.__lock = threading.Lock()
+        self.__cancelled = False
+        # 中止原因（块未写入、串口断开），非空时停止发送并发出send_error
+        self.__abort_reason = ''
+
+    def cancel(self):
+        """
+        取消发送，已放入发送队列的块仍会写入
+        :return:
+        """
+        self.__cancelled = True
+
+    @property
+    def cancelled(self):
+        return self.__cancelled
+
+    def __on_dropped__(self, seq):
+        """
+        一条数据未写入，在发送线程或提交数据的线程中直接调用
+        文件中间缺了一块时接收端无法察觉，只能中止发送
+        :param seq:
+        :return:
+        """
+        with self.__lock:
+            if seq not in self.__pending:
+                self.__unmatched[seq] = DROPPED
+                if len(self.__unmatched) > UNMATCHED_MAX:
+                    del self.__unmatched[next(iter(self.__unmatched))]
+                return
+            self.__pending.discard(seq)
+            if not self.__abort_reason:
+                self.__abort_reason = '数据块未写入串口，文件发送中止'
+        self.__slots.release()
+
+    def __on_connection_state__(self, state, detail):
+        """
+        串口断开重连时在途的块被丢弃，在串口线程中直接调用
+        关闭串口时先通知丢弃的块，这里用断开原因替换
+        :param state:
+        :param detail:
+        :return:
+        """
+        if state == RECONNECTING:
+            self.__abort_reason = '串口断开，文件发送中止：' + detail
+
+    def __on_written__(self, seq, size):
+        """
+        发送线程写入完成，在发送线程中直接调用
+        :param seq:
+        :param size:
+        :return:
+        """
+        with self.__lock:
+            if seq not in self.__pending:
+                # 可能是其他数据，也可能是send_bytes返回之前就已写入的块
+                self.__unmatched[seq] = size
+                if len(self.__unmatched) > UNMATCHED_MAX:
+                    del self.__unmatched[next(iter(self.__unmatched))]
+                return
+            self.__pending.discard(seq)
+            self.written += size
+        self.__slots.release()
+
+    def __track__(self, seq):
+        """
+        记录已放入发送队列的块
+        :param seq: send_bytes返回的序号
+        :return:
+        """
+        with self.__lock:
+            size = self.__unmatched.pop(seq, None)
+            if size is None:
+                self.__pending.add(seq)
+                return
+            if size == DROPPED:
+                if not self.__abort_reason:
+                    self.__abort_reason = '数据块未写入串口，文件发送中止'
+            else:
+                self.written += size
+        self.__slots.release()
+
+    def __running__(self):
+        return not self.__cancelled and not self.__abort_reason and self.__serial_thread.isRunning()
+
+    def __sleep_until__(self, deadline):
+        """
+        等待到deadline(time.monotonic())，被取消时提前返回
+        :param deadline:
+        :return: 是否继续发送
+        """
+        while self.__running__():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, MAX_SLEEP))
+        return False
+
+    def run(self):
+        writer = self.__serial_thread.writer
+        writer.write_done.connect(self.__on_written__, Qt.DirectConnection)
+        writer.write_dropped.connect(self.__on_dropped__, Qt.DirectConnection)
+        self.__serial_thread.connection_state.connect(self.__on_connection_state__, Qt.DirectConnection)
+        start = time.monotonic()
+        try:
+            self.__send_file__(start)
+            if self.__abort_reason:
+                self.send_error.emit(self.__abort_reason)
+        except Exception as e:
+            self.send_error.emit(str(e))
+        finally:
+            writer.write_done.disconnect(self.__on_written__)
+            writer.write_dropped.disconnect(self.__on_dropped__)
+            self.__serial_thread.connection_state.disconnect(self.__on_connection_state__)
+        complete = self.written >= self.total and not self.__cancelled and not self.__abort_reason
+        self.send_done.emit(complete, self.written, time.monotonic() - start)
+
+    def __send_file__(self, start):
+        last_progress = 0.0
+        queued = 0
+        deadline = start
+        with open(self.path, 'rb') as file:
+            self.total = os.fstat(file.fileno()).st_size
+            while self.__running__():
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                # 在途的块数达到上限时等待写入完成
+                while not self.__slots.acquire(timeout=MAX_SLEEP):
+                    if not self.__running__():
+                        return
+                while True:
+                    # BLOCK方式下send_bytes可能等待发送线程，不能持有锁
+                    seq = self.__serial_thread.send_bytes(chunk)
+                    if seq:
+                        self.__track__(seq)
+                        break
+                    # 发送队列被其他数据占满，稍后重试
+                    if not self.__sleep_until__(time.monotonic() + MAX_SLEEP):
+                        return
+                queued += len(chunk)
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = now
+                    self.__emit_progress__(now - start)
+                # 按速率计算下一块的发送时间，不累积误差
+                if self.bytes_per_sec:
+                    deadline = max(deadline, start + queued / self.bytes_per_sec)
+                if self.chunk_delay:
+                    deadline = max(deadline, now) + self.chunk_delay
+                if not self.__sleep_until__(deadline):
+                    return
+            # 等待最后几块写入完成
+            while self.__pending and self.__running__():
+                time.sleep(PROGRESS_INTERVAL / 10)
+            self.__emit_progress__(time.monotonic() - start)
+
+    def __emit_progress__(self, elapsed):
+        rate = self.written / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.written) / rate if rate > 0 else -1.0
+        self.progress.emit(self.written, self.total, rate, eta)
+
+
+class ModemFileSender(QThread):
+    """
+    XMODEM/YMODEM文件发送线程，信号与FileSender相同
+    """
+    progress = pyqtSignal(int, int, float, float)
+    send_done = pyqtSignal(bool, int, float)
+    send_error = pyqtSignal(str)
+
+    def __init__(self, path, serial_thread, protocol=XMODEM_1K):
+        """
+        初始化
+        :param path:            文件路径
+        :param serial_thread:   已打开的SerialThread
+        :param protocol:        xmodem/xmodem-1k/ymodem
+        """
+        super().__init__()
+        self.path = path
+        self.protocol = protocol
+        self.total = 0
+        self.written = 0
+        self.retransmits = 0
+        self.__serial_thread = serial_thread
+        self.__received = bytearray()
+        self.__cond = threading.Condition()
+        self.__cancelled = False
+        self.__disconnected = ''
+        self.__start = 0.0
+        self.__last_progress = 0.0
+
+    def cancel(self):
+        self.__cancelled = True
+
+    @property
+    def cancelled(self):
+        return self.__cancelled
+
+    def write(self, direction, payload, timestamp_ns=None):
+        """
+        sink接口，在串口线程中调用，只保留接收到的数据
+        :param direction:
+        :param payload:
+        :param timestamp_ns:
+        :return:
+        """
+        if direction != DIRECTION_RECV:
+            return
+        with self.__cond:
+            self.__received += payload
+            self.__cond.notify()
+
+    def __read__(self, timeout):
+        """
+        读取接收端的一个字节
+        :param timeout:
+        :return: 超时返回None
+        """
+        with self.__cond:
+            if not self.__cond.wait_for(lambda: self.__received, timeout):
+                return None
+            byte = self.__received[0]
+            del self.__received[0]
+            return byte
+
+    def __write__(self, data):
+        if not self.__serial_thread.send_bytes(data):
+            raise ModemError('发送队列已满')
+
+    def __on_connection_state__(self, state, detail):
+        """
+        串口断开重连时中止传输，在串口线程中直接调用
+        :param state:
+        :param detail:
+        :return:
+        """
+        if state == RECONNECTING:
+            self.__disconnected = detail
+
+    def __on_progress__(self, sent):
+        self.written = sent
+        now = time.monotonic()
+        if now - self.__last_progress >= PROGRESS_INTERVAL or sent >= self.total:
+            self.__last_progress = now
+            elapsed = now - self.__start
+            rate = sent / elapsed if elapsed > 0 else 0.0
+            eta = (self.total - sent) / rate if rate > 0 else -1.0
+            self.progress.emit(sent, self.total, rate, eta)
+
+    def run(self):
+        self.__start = time.monotonic()
+        complete = False
+        self.__serial_thread.add_sink(self)
+        self.__serial_thread.connection_state.connect(self.__on_connection_state__, Qt.DirectConnection)
+        try:
+            with open(self.path, 'rb') as file:
+                self.total = os.fstat(file.fileno()).st_size
+                sender = ModemSender(
+                    self.__write__, self.__read__, self.protocol,
+                    cancelled=lambda: (self.__cancelled or bool(self.__disconnected)
+                                       or not self.__serial_thread.isRunning()),
+                    progress=self.__on_progress__
+                )
+                try:
+                    sender.send(file, os.path.basename(self.path), self.total)
+                    complete = True
+                finally:
+                    self.retransmits = sender.retransmits
+        except Exception as e:
+            if self.__disconnected:
+                self.send_error.emit('串口断开，文件发送中止：' + self.__disconnected)
+            elif not self.__cancelled:
+                self.send_error.emit(str(e))
+        finally:
+            self.__serial_thread.remove_sink(self)
+            self.__serial_thread.connection_state.disconnect(self.__on_connection_state__)
+        self.send_done.emit(complete, self.written, time.monotonic() - self.__start)
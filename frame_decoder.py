@@ -0,0 +1,350 @@
+"""
+frame_decoder.py
+帧解析，将串口读取到的原始字节流按规则切分成帧
+分帧器只保存未成帧的数据，每次输入的数据只扫描一次
+所有分帧器提供相同的接口：feed(data)->帧列表、flush()、reset()、pending
+"""
+from hex_format import parse_hex
+
+# 分帧方式
+DELIMITER = 'delimiter'
+FIXED = 'fixed'
+LENGTH_PREFIX = 'length_prefix'
+COBS = 'cobs'
+SLIP = 'slip'
+FRAMERS = [DELIMITER, FIXED, LENGTH_PREFIX, COBS, SLIP]
+# 默认最大帧长度
+MAX_FRAME = 4096
+
+SLIP_END = 0xc0
+SLIP_ESC = 0xdb
+_SLIP_ESC_END = b'\xdb\xdc'
+_SLIP_ESC_ESC = b'\xdb\xdd'
+
+
+class LineFramer:
+    """
+    按行分帧，以分隔符（默认b'\\n'）结尾的数据为一帧
+    """
+    # 帧为文本：可按字符边界对齐，串口空闲时输出不完整的帧
+    text_stream = True
+
+    def __init__(self, delimiter=b'\n', max_frame=MAX_FRAME):
+        """
+        初始化
+        :param delimiter:   帧分隔符，包含在帧尾
+        :param max_frame:   最大帧长度，超过该长度仍未遇到分隔符时强制成帧
+        """
+        if not delimiter:
+            raise ValueError('delimiter must not be empty')
+        self.delimiter = bytes(delimiter)
+        self.max_frame = max_frame
+        self.__buffer = bytearray()
+        # 已扫描过的位置，下次从这里继续查找分隔符
+        self.__scanned = 0
+
+    @property
+    def pending(self):
+        """
+        缓冲区中尚未成帧的字节数
+        :return:
+        """
+        return len(self.__buffer)
+
+    def feed(self, data) -> list:
+        """
+        输入一段数据，返回其中所有完整的帧
+        :param data: bytes/bytearray/memoryview
+        :return: 帧列表（bytes）
+        """
+        buffer = self.__buffer
+        buffer += data
+        frames = []
+        start = 0
+        search = self.__scanned
+        delimiter_len = len(self.delimiter)
+        while True:
+            index = buffer.find(self.delimiter, search)
+            if index < 0:
+                break
+            end = index + delimiter_len
+            frames.append(bytes(buffer[start:end]))
+            start = search = end
+        if start:
+            del buffer[:start]
+        # 超长数据强制成帧，避免无分隔符的数据流无限累积
+        while len(buffer) >= self.max_frame:
+            frames.append(bytes(buffer[:self.max_frame]))
+            del buffer[:self.max_frame]
+        # 分隔符可能跨两次输入，保留最后delimiter_len - 1个字节重新扫描
+        self.__scanned = max(0, len(buffer) - delimiter_len + 1)
+        return frames
+
+    def flush(self) -> bytes:
+        """
+        取出缓冲区中不完整的数据
+        :return:
+        """
+        data = bytes(self.__buffer)
+        self.__buffer.clear()
+        self.__scanned = 0
+        return data
+
+    def reset(self):
+        """
+        清空缓冲区
+        :return:
+        """
+        self.__buffer.clear()
+        self.__scanned = 0
+
+
+class _BinaryFramer:
+    """
+    二进制分帧器的公共部分：缓冲区及统计
+    """
+    text_stream = False
+
+    def __init__(self, max_frame=MAX_FRAME):
+        """
+        初始化
+        :param max_frame: 最大帧长度
+        """
+        self.max_frame = max_frame
+        # 格式错误被丢弃的帧（或字节）数
+        self.errors = 0
+        self._buffer = bytearray()
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    def flush(self) -> bytes:
+        """
+        二进制帧不完整时没有意义，直接丢弃
+        :return:
+        """
+        self.reset()
+        return b''
+
+    def reset(self):
+        self._buffer.clear()
+
+
+class FixedLengthFramer(_BinaryFramer):
+    """
+    定长分帧，每length个字节为一帧
+    """
+
+    def __init__(self, length, max_frame=MAX_FRAME):
+        super().__init__(max_frame)
+        if length <= 0:
+            raise ValueError('length must be positive')
+        self.length = length
+
+    def feed(self, data) -> list:
+        buffer = self._buffer
+        buffer += data
+        length = self.length
+        end = len(buffer) - len(buffer) % length
+        frames = [bytes(buffer[start:start + length]) for start in range(0, end, length)]
+        if end:
+            del buffer[:end]
+        return frames
+
+
+class LengthPrefixFramer(_BinaryFramer):
+    """
+    长度前缀分帧：帧头中length_offset处的length_size字节为长度字段
+    帧总长度 = length_offset + length_size + 长度字段的值 + length_adjust，输出的帧包含帧头
+    """
+
+    def __init__(self, length_offset=0, length_size=1, byteorder='big', length_adjust=0, max_frame=MAX_FRAME):
+        """
+        初始化
+        :param length_offset:   长度字段在帧头中的偏移
+        :param length_size:     长度字段的字节数 1/2/4
+        :param byteorder:       长度字段的字节序 big/little
+        :param length_adjust:   长度修正，如长度字段不包含末尾校验时为校验的字节数，包含帧头时为负数
+        :param max_frame:       最大帧长度，超过时认为失去同步
+        """
+        super().__init__(max_frame)
+        if length_size not in [1, 2, 4]:
+            raise ValueError('length_size must be 1, 2 or 4')
+        if byteorder not in ['big', 'little']:
+            raise ValueError('byteorder must be either big or little')
+        self.length_offset = length_offset
+        self.length_size = length_size
+        self.byteorder = byteorder
+        self.length_adjust = length_adjust
+
+    def feed(self, data) -> list:
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        header = self.length_offset + self.length_size
+        start = 0
+        size = len(buffer)
+        while size - start >= header:
+            field = start + self.length_offset
+            total = header + int.from_bytes(buffer[field:field + self.length_size], self.byteorder) + self.length_adjust
+            if total < header or total > self.max_frame:
+                # 长度不合理，失去同步，跳过一个字节重新查找帧头
+                self.errors += 1
+                start += 1
+                continue
+            if size - start < total:
+                break
+            frames.append(bytes(buffer[start:start + total]))
+            start += total
+        if start:
+            del buffer[:start]
+        return frames
+
+
+class _DelimitedFramer(_BinaryFramer):
+    """
+    以单字节分隔的编码帧（COBS/SLIP），分隔符之间的数据解码后为一帧
+    """
+    delimiter = b'\x00'
+
+    def decode(self, data) -> bytes:
+        raise NotImplementedError
+
+    def feed(self, data) -> list:
+        buffer = self._buffer
+        search = len(buffer)
+        buffer += data
+        frames = []
+        start = 0
+        while True:
+            index = buffer.find(self.delimiter, search)
+            if index < 0:
+                break
+            # 连续的分隔符之间为空帧，直接跳过
+            if index > start:
+                try:
+                    frames.append(self.decode(buffer[start:index]))
+                except ValueError:
+                    self.errors += 1
+            start = search = index + 1
+        if start:
+            del buffer[:start]
+        if len(buffer) > self.max_frame:
+            self.errors += 1
+            buffer.clear()
+        return frames
+
+
+def cobs_encode(data) -> bytes:
+    """
+    COBS编码，结果中不含0x00（不含末尾的分隔符）
+    :param data:
+    :return:
+    """
+    data = bytes(data)
+    out = bytearray()
+    start = 0
+    size = len(data)
+    while True:
+        index = data.find(b'\x00', start, start + 254)
+        if index >= 0:
+            out.append(index - start + 1)
+            out += data[start:index]
+            start = index + 1
+            continue
+        # 254字节内没有0x00，或已到末尾
+        end = min(start + 254, size)
+        out.append(end - start + 1)
+        out += data[start:end]
+        start = end
+        if start >= size:
+            return bytes(out)
+
+
+def cobs_decode(data) -> bytes:
+    """
+    COBS解码
+    :param data: 不含分隔符的编码数据
+    :return:
+    :raises ValueError: 编码错误
+    """
+    out = bytearray()
+    index = 0
+    size = len(data)
+    while index < size:
+        code = data[index]
+        end = index + code
+        if code == 0 or end > size:
+            raise ValueError('invalid COBS data')
+        out += data[index + 1:end]
+        index = end
+        if code < 0xff and index < size:
+            out.append(0)
+    return bytes(out)
+
+
+class COBSFramer(_DelimitedFramer):
+    """
+    COBS分帧，以0x00分隔，输出解码后的数据
+    """
+    delimiter = b'\x00'
+
+    def decode(self, data) -> bytes:
+        return cobs_decode(data)
+
+
+def slip_encode(data) -> bytes:
+    """
+    SLIP编码，前后加END
+    :param data:
+    :return:
+    """
+    data = bytes(data).replace(b'\xdb', _SLIP_ESC_ESC).replace(b'\xc0', _SLIP_ESC_END)
+    return b'\xc0' + data + b'\xc0'
+
+
+class SLIPFramer(_DelimitedFramer):
+    """
+    SLIP分帧（RFC 1055），以0xC0分隔，输出去转义后的数据
+    """
+    delimiter = bytes([SLIP_END])
+
+    def decode(self, data) -> bytes:
+        data = bytes(data)
+        escapes = data.count(b'\xdb')
+        if escapes:
+            if escapes != data.count(_SLIP_ESC_END) + data.count(_SLIP_ESC_ESC):
+                raise ValueError('invalid SLIP escape')
+            data = data.replace(_SLIP_ESC_END, b'\xc0').replace(_SLIP_ESC_ESC, b'\xdb')
+        return data
+
+
+def make_framer(name=DELIMITER, options='', max_frame=MAX_FRAME):
+    """
+    按设置创建分帧器
+    :param name:        分帧方式，FRAMERS之一
+    :param options:     参数字符串，为空时使用默认值
+                        delimiter：十六进制分隔符，默认'0a'
+                        fixed：帧长度
+                        length_prefix：'长度字段偏移,字节数,字节序,长度修正'，如'0,2,big,0'，后面的项可省略
+    :param max_frame:   最大帧长度
+    :return:
+    :raises ValueError: 参数错误
+    """
+    options = options.strip()
+    if name == DELIMITER:
+        return LineFramer(parse_hex(options) if options else b'\n', max_frame)
+    if name == FIXED:
+        return FixedLengthFramer(int(options), max_frame)
+    if name == LENGTH_PREFIX:
+        fields = [field.strip() for field in options.split(',')] if options else []
+        kwargs = {}
+        for key, field in zip(['length_offset', 'length_size', 'byteorder', 'length_adjust'], fields):
+            kwargs[key] = field if key == 'byteorder' else int(field)
+        return LengthPrefixFramer(max_frame=max_frame, **kwargs)
+    if name == COBS:
+        return COBSFramer(max_frame)
+    if name == SLIP:
+        return SLIPFramer(max_frame)
+    raise ValueError('framer must be one of {}'.format(FRAMERS))
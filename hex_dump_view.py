@@ -0,0 +1,73 @@
+"""
+hex_dump_view.py
+十六进制转储显示（偏移 | 16字节十六进制 | ASCII）
+每行直接从ByteStore读取对应的16个字节生成，只处理可见的行
+"""
+from PyQt5.QtCore import *
+
+from hex_format import HEX_DUMP_WIDTH, hex_dump_line
+
+
+class HexDumpModel(QAbstractListModel):
+    """
+    十六进制转储模型，行数由ByteStore中的数据量决定
+    ByteStore可能在其他线程写入，模型只在refresh()时同步数据范围
+    """
+
+    def __init__(self, store, parent=None, width=HEX_DUMP_WIDTH):
+        super().__init__(parent)
+        self.__store = store
+        self.width = width
+        # 模型当前可见的数据范围[base, end)
+        self.__base = 0
+        self.__end = 0
+
+    def __first_row(self):
+        return self.__base // self.width
+
+    def __row_count(self, base, end):
+        return -(-end // self.width) - base // self.width
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.__row_count(self.__base, self.__end)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        offset = (self.__first_row() + index.row()) * self.width
+        end = min(offset + self.width, self.__end)
+        return hex_dump_line(self.__store.read(offset, end - offset), offset, self.width)
+
+    def refresh(self):
+        """
+        同步ByteStore中新增/淘汰的数据
+        :return:
+        """
+        base, end = self.__store.base_offset, self.__store.end_offset
+        if end < self.__end:
+            # ByteStore被清空
+            self.beginResetModel()
+            self.__base, self.__end = base, end
+            self.endResetModel()
+            return
+        evict_rows = base // self.width - self.__first_row()
+        if evict_rows > 0:
+            evict_rows = min(evict_rows, self.rowCount())
+            self.beginRemoveRows(QModelIndex(), 0, evict_rows - 1)
+            self.__base = base
+            self.__end = max(self.__end, base)
+            self.endRemoveRows()
+        old_rows = self.rowCount()
+        old_end = self.__end
+        new_rows = self.__row_count(self.__base, end)
+        if new_rows > old_rows:
+            self.beginInsertRows(QModelIndex(), old_rows, new_rows - 1)
+            self.__end = end
+            self.endInsertRows()
+        else:
+            self.__end = end
+        # 原来最后一行未满时，其内容发生变化
+        if old_end % self.width and old_rows > 0 and end > old_end:
+            self.dataChanged.emit(self.index(old_rows - 1), self.index(old_rows - 1), [Qt.DisplayRole])
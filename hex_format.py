@@ -0,0 +1,138 @@
+"""
+hex_format.py
+十六进制显示格式化及发送数据解析
+全部使用bytes.hex/bytes.fromhex/str.translate在C层批量处理，避免逐字节的Python循环
+"""
+import re
+
+# 十六进制转储每行字节数
+HEX_DUMP_WIDTH = 16
+# 不可打印字符在ASCII栏中显示为'.'
+_ASCII_TABLE = bytes(b if 0x20 <= b < 0x7f else ord('.') for b in range(256))
+# 解析时视为分隔符的字符，替换为等长的空格，错误位置不变
+_SEPARATORS = ',;:-'
+_SEPARATOR_TABLE = str.maketrans(_SEPARATORS, ' ' * len(_SEPARATORS))
+# 0x前缀之前可以出现的字符
+_PREFIX_SPACES = ' \t\r\n'
+_TOKEN_RE = re.compile(r'\S+')
+_NON_HEX_RE = re.compile(r'[^0-9A-Fa-f]')
+
+
+class HexParseError(ValueError):
+    """
+    十六进制数据格式错误
+    """
+
+    def __init__(self, text, position):
+        """
+        初始化
+        :param text:        输入字符串
+        :param position:    出错字符的位置（从0开始）
+        """
+        self.text = text
+        self.position = position
+        super().__init__('请输入十六进制数据，第{}个字符{!r}无效!'.format(
+            position + 1, text[position] if position < len(text) else ''))
+
+
+def to_hex(data, sep=' '):
+    """
+    转换为以sep分隔的十六进制字符串 例如：b'ZZ\\x02' -> '5a 5a 02'
+    :param data: bytes/bytearray/memoryview
+    :param sep:  分隔符，为空时不分隔
+    :return:
+    """
+    if not data:
+        return ''
+    if sep:
+        return memoryview(data).hex(sep)
+    return memoryview(data).hex()
+
+
+def to_ascii(data):
+    """
+    转换为可打印ASCII字符串，不可打印字符显示为'.'
+    :param data:
+    :return:
+    """
+    return bytes(data).translate(_ASCII_TABLE).decode('ascii')
+
+
+def hex_dump_line(data, offset=0, width=HEX_DUMP_WIDTH):
+    """
+    生成一行十六进制转储 例如：'00000010  5a 5a 02 ...  |ZZ.|'
+    :param data:    本行数据，不超过width字节
+    :param offset:  本行起始偏移
+    :param width:   每行字节数
+    :return:
+    """
+    return '{:08x}  {:<{}}  |{}|'.format(offset, to_hex(data), width * 3 - 1, to_ascii(data))
+
+
+def hex_dump(data, offset=0, width=HEX_DUMP_WIDTH):
+    """
+    生成十六进制转储（偏移 | 十六进制 | ASCII）
+    整段数据一次性转换后再按行切分
+    :param data:    数据
+    :param offset:  data第一个字节的偏移
+    :param width:   每行字节数
+    :return: 行列表
+    """
+    if not data:
+        return []
+    hex_str = to_hex(data)
+    ascii_str = to_ascii(data)
+    hex_width = width * 3 - 1
+    lines = []
+    for start in range(0, len(data), width):
+        lines.append('{:08x}  {:<{}}  |{}|'.format(
+            offset + start,
+            hex_str[start * 3:start * 3 + hex_width],
+            hex_width,
+            ascii_str[start:start + width]
+        ))
+    return lines
+
+
+def parse_hex(text):
+    """
+    解析十六进制字符串 例如：'5a 5a,0x02 035a' -> b'ZZ\\x02\\x03Z'
+    空白、逗号、分号、冒号、短横线均可作为分隔符，每个数可带0x前缀，单独的一位数表示一个字节
+    :param text: 字符串
+    :return: bytes
+    :raises HexParseError: 含非十六进制字符，或多位数的位数不是偶数
+    """
+    normalized = text
+    # 只在需要时做替换，常见的纯空格分隔输入直接交给bytes.fromhex
+    if any(sep in normalized for sep in _SEPARATORS):
+        normalized = normalized.translate(_SEPARATOR_TABLE)
+    if 'x' in normalized or 'X' in normalized:
+        # 只去掉位于开头或空白之后的0x，'a0x5'中的x仍按错误字符处理
+        normalized = ' ' + normalized
+        for space in _PREFIX_SPACES:
+            normalized = normalized.replace(space + '0x', space + '  ').replace(space + '0X', space + '  ')
+        normalized = normalized[1:]
+    try:
+        # 常见输入一次由bytes.fromhex完成
+        return bytes.fromhex(normalized)
+    except ValueError:
+        pass
+    try:
+        # 单独的一位数补成两位
+        return bytes.fromhex(' '.join(['0' + token if len(token) == 1 else token for token in normalized.split()]))
+    except ValueError:
+        pass
+    # 格式错误，逐个数检查找出出错位置
+    result = bytearray()
+    for match in _TOKEN_RE.finditer(normalized):
+        token = match.group()
+        bad = _NON_HEX_RE.search(token)
+        if bad:
+            raise HexParseError(text, match.start() + bad.start())
+        if len(token) == 1:
+            result.append(int(token, 16))
+        elif len(token) % 2:
+            raise HexParseError(text, match.end() - 1)
+        else:
+            result += bytes.fromhex(token)
+    return bytes(result)
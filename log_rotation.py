@@ -0,0 +1,145 @@
+"""
+log_rotation.py
+自动保存日志分割及压缩
+日志文件超过大小/时间限制后由写入线程关闭并新建文件，旧文件交给压缩线程压缩，并按数量删除本次运行分割出的最早的文件
+压缩只使用标准库（gzip/bz2/lzma），在独立线程中执行，不占用界面线程和串口线程
+"""
+import bz2
+import gzip
+import lzma
+import os
+import queue
+import shutil
+import time
+
+from PyQt5.QtCore import *
+
+# 压缩格式：名称 -> (扩展名, 打开函数)
+COMPRESSORS = {
+    'gzip': ('.gz', gzip.open),
+    'bz2': ('.bz2', bz2.open),
+    'xz': ('.xz', lzma.open),
+}
+COMPRESS_FORMATS = [''] + list(COMPRESSORS)
+# 自动保存文件名后缀
+AUTOSAVE_SUFFIX = '_autosave.txt'
+
+
+def segment_exists(path):
+    """
+    日志文件或其压缩后的文件是否存在
+    :param path:
+    :return:
+    """
+    return any(os.path.exists(path + suffix) for suffix in [''] + [item[0] for item in COMPRESSORS.values()])
+
+
+class RotationPolicy:
+    """
+    日志分割策略，各项为0表示不限制
+    """
+
+    def __init__(self, max_bytes=0, max_age=0, max_files=0, compress=''):
+        """
+        初始化
+        :param max_bytes:   单个文件最大字节数
+        :param max_age:     单个文件最长写入时间(s)
+        :param max_files:   最多保留的已分割文件数
+        :param compress:    已分割文件的压缩格式，''/gzip/bz2/xz
+        """
+        if compress not in COMPRESS_FORMATS:
+            raise ValueError('compress must be one of {}'.format(COMPRESS_FORMATS))
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_files = max_files
+        self.compress = compress
+
+    def should_rotate(self, size, opened_at):
+        """
+        当前文件是否需要分割
+        :param size:        当前文件大小
+        :param opened_at:   文件创建时的time.monotonic()
+        :return:
+        """
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return bool(self.max_age) and time.monotonic() - opened_at >= self.max_age
+
+
+class LogCompressor(QThread):
+    """
+    已分割日志的压缩及清理线程
+    """
+    compress_error = pyqtSignal(str)
+
+    def __init__(self, policy):
+        super().__init__()
+        self.policy = policy
+        self.__queue = queue.SimpleQueue()
+        # 本线程处理过的已分割文件（压缩后为压缩文件的路径），按分割顺序排列
+        # 只清理这些文件，目录中其他会话、之前运行留下的日志不受影响
+        self.__segments = []
+
+    def submit(self, path):
+        """
+        提交一个已关闭的日志文件
+        :param path: 已关闭的文件
+        :return:
+        """
+        self.__queue.put(path)
+
+    def run(self):
+        while True:
+            path = self.__queue.get()
+            if path is None:
+                return
+            if self.policy.compress:
+                try:
+                    path = self.__compress__(path)
+                except FileNotFoundError:
+                    # 已被删除，不再计数
+                    continue
+                except Exception as e:
+                    # 压缩失败时保留原文件，仍按原文件计数
+                    self.compress_error.emit(str(e))
+            self.__segments.append(path)
+            self.__prune__()
+
+    def __compress__(self, path):
+        """
+        压缩文件，完成后删除原文件
+        :param path:
+        :return: 压缩文件的路径
+        """
+        suffix, open_func = COMPRESSORS[self.policy.compress]
+        tmp_path = path + suffix + '.tmp'
+        with open(path, 'rb') as src, open_func(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp_path, path + suffix)
+        os.remove(path)
+        return path + suffix
+
+    def __prune__(self):
+        """
+        删除最早的已分割文件，只保留max_files个
+        文件可能已被用户或其他程序删除，每个文件单独处理，失败不影响后续的压缩和清理
+        :return:
+        """
+        if not self.policy.max_files:
+            return
+        while len(self.__segments) > self.policy.max_files:
+            path = self.__segments.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.compress_error.emit(str(e))
+
+    def stop(self):
+        """
+        处理完已提交的文件后停止
+        :return:
+        """
+        self.__queue.put(None)
+        self.wait()
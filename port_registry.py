@@ -0,0 +1,170 @@
+"""
+port_registry.py
+串口注册表
+缓存枚举结果，以设备路径为键保存VID/PID/序列号/描述等信息，枚举结果变化时只发出增加/移除的串口
+下拉框按增减逐项插入/删除，条目数据为设备路径；同一个USB适配器重新插入后设备名变化（如ttyUSB0->ttyUSB1）时可按序列号找到它
+"""
+import collections
+
+from PyQt5.QtCore import *
+
+_PortInfo = collections.namedtuple(
+    '_PortInfo', ['device', 'name', 'description', 'hwid', 'vid', 'pid', 'serial_number', 'location', 'manufacturer']
+)
+
+
+class PortInfo(_PortInfo):
+    """
+    串口信息，由ListPortInfo生成，不可变
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_list_port(cls, port):
+        """
+        :param port: serial.tools.list_ports_common.ListPortInfo
+        :return:
+        """
+        return cls(port.device, getattr(port, 'name', None) or port.device, port.description, port.hwid,
+                   getattr(port, 'vid', None), getattr(port, 'pid', None), getattr(port, 'serial_number', None),
+                   getattr(port, 'location', None), getattr(port, 'manufacturer', None))
+
+    @property
+    def label(self):
+        """
+        下拉框显示的文字
+        :return:
+        """
+        if self.description and self.description not in ('n/a', self.device, self.name):
+            return '{} - {}'.format(self.device, self.description)
+        return self.device
+
+    @property
+    def tooltip(self):
+        lines = [self.device, self.description or '']
+        if self.vid is not None:
+            lines.append('VID:PID {:04X}:{:04X}'.format(self.vid, self.pid or 0))
+        if self.serial_number:
+            lines.append('序列号 {}'.format(self.serial_number))
+        if self.manufacturer:
+            lines.append('厂商 {}'.format(self.manufacturer))
+        if self.location:
+            lines.append('位置 {}'.format(self.location))
+        return '\n'.join(line for line in lines if line)
+
+    def same_adapter(self, other):
+        """
+        是否为同一个物理设备
+        有序列号时按VID/PID/序列号判断，其次按VID/PID/USB位置，都没有时按设备路径
+        :param other: PortInfo
+        :return:
+        """
+        if self.serial_number or other.serial_number:
+            return (self.vid, self.pid, self.serial_number) == (other.vid, other.pid, other.serial_number)
+        if self.vid is not None and self.location:
+            return (self.vid, self.pid, self.location) == (other.vid, other.pid, other.location)
+        return self.device == other.device
+
+
+class PortRegistry(QObject):
+    """
+    串口注册表，在界面线程中更新
+    update整体替换内部字典，查询方法只读取一次字典引用，可在串口线程中调用（如重连时的resolve）
+    """
+    port_added = pyqtSignal(object)
+    port_removed = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 设备路径 -> PortInfo
+        self.__ports = {}
+
+    def __len__(self):
+        return len(self.__ports)
+
+    def __contains__(self, device):
+        return device in self.__ports
+
+    @property
+    def ports(self):
+        """
+        :return: 按设备路径排序的PortInfo列表
+        """
+        ports = self.__ports
+        return [ports[device] for device in sorted(ports)]
+
+    def get(self, device):
+        return self.__ports.get(device)
+
+    def update(self, ports):
+        """
+        用新的枚举结果更新，先发出移除再发出增加，同一路径的设备信息变化时视为移除后重新增加
+        :param ports: ListPortInfo列表
+        :return: (增加的PortInfo列表, 移除的PortInfo列表)
+        """
+        current = {}
+        for port in ports:
+            info = PortInfo.from_list_port(port)
+            current[info.device] = info
+        removed = [info for device, info in self.__ports.items() if current.get(device) != info]
+        added = [info for device, info in current.items() if self.__ports.get(device) != info]
+        self.__ports = current
+        for info in removed:
+            self.port_removed.emit(info)
+        for info in sorted(added):
+            self.port_added.emit(info)
+        return added, removed
+
+    def find_by_serial(self, serial_number):
+        """
+        按序列号查找
+        :param serial_number:
+        :return: PortInfo，没有时为None
+        """
+        if not serial_number:
+            return None
+        for info in self.ports:
+            if info.serial_number == serial_number:
+                return info
+        return None
+
+    def resolve(self, info):
+        """
+        查找与info为同一物理设备的当前串口，用于设备名变化后重新连接
+        :param info: 之前打开的串口的PortInfo
+        :return: PortInfo，设备不在时为None
+        """
+        ports = self.__ports
+        current = ports.get(info.device)
+        if current is not None and current.same_adapter(info):
+            return current
+        for current in ports.values():
+            if current.same_adapter(info):
+                return current
+        return None
+
+
+def insert_port_item(combo, info):
+    """
+    按设备路径顺序把串口插入下拉框，条目数据为设备路径
+    :param combo:   QComboBox
+    :param info:    PortInfo
+    :return:
+    """
+    index = 0
+    while index < combo.count() and combo.itemData(index) < info.device:
+        index += 1
+    combo.insertItem(index, info.label, info.device)
+    combo.setItemData(index, info.tooltip, Qt.ToolTipRole)
+
+
+def remove_port_item(combo, info):
+    """
+    从下拉框移除串口
+    :param combo:
+    :param info:
+    :return:
+    """
+    index = combo.findData(info.device)
+    if index >= 0:
+        combo.removeItem(index)
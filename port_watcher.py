@@ -0,0 +1,255 @@
+"""
+port_watcher.py
+串口热插拔检测
+在独立线程中等待设备变化事件，只有串口列表确实变化时才发出ports_changed，替代定时枚举
+Linux优先使用内核uevent（netlink），其次使用inotify监视/dev
+都不可用时定时轮询：POSIX下先比较/dev目录的文件列表，变化后才枚举串口；其他平台定时枚举并比较结果
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+from PyQt5.QtCore import *
+import serial.tools.list_ports
+
+# 检测方式
+NETLINK = 'netlink'
+INOTIFY = 'inotify'
+POLL = 'poll'
+# 轮询间隔(s)
+PORT_POLL_INTERVAL = 1.0
+# 收到事件后等待该时间(s)再枚举，合并同一次插拔产生的多个事件
+HOTPLUG_DEBOUNCE = 0.2
+# 设备节点可能在内核事件之后才由udev创建，事件后再补充枚举一次(s)
+HOTPLUG_RESCAN_DELAY = 1.0
+# 串口设备节点名前缀
+PORT_NAME_PREFIXES = (b'tty', b'cu.', b'rfcomm')
+
+NETLINK_KOBJECT_UEVENT = 15
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ATTRIB = 0x004
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def scan_ports():
+    """
+    枚举串口
+    :return: 按设备名排序的ListPortInfo列表
+    """
+    return sorted(serial.tools.list_ports.comports(), key=lambda port: port.device)
+
+
+def port_signature(ports):
+    """
+    串口列表的比较依据，同名设备换成另一个适配器时也视为变化
+    :param ports:
+    :return:
+    """
+    return tuple((port.device, port.hwid) for port in ports)
+
+
+class _NetlinkSource:
+    """
+    内核uevent，只关心tty子系统的add/remove事件
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        try:
+            self.sock.bind((0, 1))
+            self.sock.setblocking(False)
+        except OSError:
+            self.sock.close()
+            raise
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read(self):
+        """
+        读出所有事件
+        :return: 是否有串口相关的事件
+        """
+        relevant = False
+        while True:
+            try:
+                message = self.sock.recv(16384)
+            except BlockingIOError:
+                return relevant
+            fields = message.split(b'\x00')
+            if b'SUBSYSTEM=tty' in fields or b'SUBSYSTEM=usb-serial' in fields:
+                relevant = True
+
+    def close(self):
+        self.sock.close()
+
+
+class _InotifySource:
+    """
+    inotify监视/dev下设备节点的创建和删除
+    """
+
+    def __init__(self, path='/dev'):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, path.encode(), IN_CREATE | IN_DELETE | IN_ATTRIB) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, 'inotify_add_watch failed')
+
+    def fileno(self):
+        return self.fd
+
+    def read(self):
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 16384)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset + _INOTIFY_EVENT.size <= len(data):
+                _, _, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\x00')
+                offset += length
+                if name.startswith(PORT_NAME_PREFIXES):
+                    relevant = True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _dev_signature():
+    """
+    /dev下串口设备节点名，用于轮询时判断是否需要枚举
+    :return:
+    """
+    try:
+        return frozenset(name for name in os.listdir('/dev') if name.encode().startswith(PORT_NAME_PREFIXES))
+    except OSError:
+        return None
+
+
+class PortWatcher(QThread):
+    """
+    串口热插拔检测线程
+    """
+    # 串口列表变化，参数为ListPortInfo列表
+    ports_changed = pyqtSignal(list)
+
+    def __init__(self, poll_interval=PORT_POLL_INTERVAL, mode=None):
+        """
+        初始化
+        :param poll_interval:   轮询方式的间隔(s)
+        :param mode:            指定检测方式，默认按NETLINK/INOTIFY/POLL依次尝试
+        """
+        super().__init__()
+        self.poll_interval = poll_interval
+        self.mode = mode
+        # 实际枚举串口的次数
+        self.scans = 0
+        self.ports = []
+        self.__signature = None
+        self.__stop_event = threading.Event()
+        self.__wake_read = self.__wake_write = None
+
+    def __open_source__(self):
+        """
+        按顺序尝试可用的事件来源
+        :return: 事件来源，轮询时为None
+        """
+        modes = [self.mode] if self.mode else [NETLINK, INOTIFY, POLL]
+        for mode in modes:
+            try:
+                if mode == NETLINK and hasattr(socket, 'AF_NETLINK'):
+                    source = _NetlinkSource()
+                elif mode == INOTIFY and os.path.isdir('/dev') and hasattr(os, 'set_blocking'):
+                    source = _InotifySource()
+                elif mode == POLL:
+                    source = None
+                else:
+                    continue
+            except (OSError, AttributeError):
+                continue
+            self.mode = mode
+            return source
+        self.mode = POLL
+        return None
+
+    def rescan(self):
+        """
+        枚举串口，有变化时发出ports_changed
+        :return:
+        """
+        ports = scan_ports()
+        self.scans += 1
+        signature = port_signature(ports)
+        if signature == self.__signature:
+            return
+        self.__signature = signature
+        self.ports = ports
+        self.ports_changed.emit(ports)
+
+    def stop(self):
+        self.__stop_event.set()
+        if self.__wake_write is not None:
+            try:
+                os.write(self.__wake_write, b'\x00')
+            except OSError:
+                pass
+        self.wait()
+
+    def run(self):
+        self.__stop_event.clear()
+        source = self.__open_source__()
+        try:
+            self.rescan()
+            if source is None:
+                self.__poll_loop__()
+            else:
+                self.__event_loop__(source)
+        finally:
+            if source is not None:
+                source.close()
+
+    def __poll_loop__(self):
+        dev_signature = _dev_signature() if os.name == 'posix' else None
+        while not self.__stop_event.wait(self.poll_interval):
+            if dev_signature is not None:
+                # /dev下的节点没有变化时不枚举
+                signature = _dev_signature()
+                if signature == dev_signature:
+                    continue
+                dev_signature = signature
+            self.rescan()
+
+    def __event_loop__(self, source):
+        self.__wake_read, self.__wake_write = os.pipe()
+        try:
+            # 待执行的枚举时间(time.monotonic)
+            pending = []
+            while not self.__stop_event.is_set():
+                timeout = max(0.0, pending[0] - time.monotonic()) if pending else None
+                readable, _, _ = select.select([source, self.__wake_read], [], [], timeout)
+                if source in readable and source.read():
+                    now = time.monotonic()
+                    pending = [now + HOTPLUG_DEBOUNCE, now + HOTPLUG_RESCAN_DELAY]
+                if pending and time.monotonic() >= pending[0]:
+                    pending.pop(0)
+                    self.rescan()
+        finally:
+            wake_read, wake_write = self.__wake_read, self.__wake_write
+            self.__wake_read = self.__wake_write = None
+            os.close(wake_read)
+            os.close(wake_write)
@@ -0,0 +1,120 @@
+"""
+recv_buffer.py
+接收数据环形缓冲区
+容量（条数/字节数）达到上限后从最旧的数据开始逐条淘汰，不再整体清空，保留最近的历史数据
+"""
+
+# 默认最大条数
+RECV_BUFFER_MAX_LINES = 100000
+# 默认最大字节数
+RECV_BUFFER_MAX_BYTES = 16 * 1024 * 1024
+
+
+class RingBuffer:
+    """
+    定长环形缓冲区，支持O(1)追加、淘汰和按下标访问
+    """
+
+    def __init__(self, max_lines=RECV_BUFFER_MAX_LINES, max_bytes=RECV_BUFFER_MAX_BYTES, size_func=len):
+        """
+        初始化
+        :param max_lines:   最大条数
+        :param max_bytes:   最大字节数，由size_func累加计算
+        :param size_func:   计算单条数据大小的函数
+        """
+        if max_lines <= 0:
+            raise ValueError('max_lines must be positive')
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.size_func = size_func
+        self.__slots = [None] * max_lines
+        self.__head = 0
+        self.__count = 0
+        # 当前数据总大小，追加/淘汰时增量维护
+        self.__bytes = 0
+
+    def __len__(self):
+        return self.__count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.__count
+        if not 0 <= index < self.__count:
+            raise IndexError('RingBuffer index out of range')
+        return self.__slots[(self.__head + index) % self.max_lines]
+
+    def __iter__(self):
+        for i in range(self.__count):
+            yield self.__slots[(self.__head + i) % self.max_lines]
+
+    @property
+    def total_bytes(self):
+        """
+        当前数据总大小
+        :return:
+        """
+        return self.__bytes
+
+    def overflow(self, items):
+        """
+        计算追加items后需要淘汰的旧数据条数（不修改缓冲区）
+        :param items: 待追加的数据列表
+        :return:
+        """
+        count = len(items)
+        if count >= self.max_lines:
+            return self.__count
+        evict = max(0, self.__count + count - self.max_lines)
+        size = self.__bytes + sum(self.size_func(item) for item in items)
+        for i in range(evict):
+            size -= self.size_func(self[i])
+        while size > self.max_bytes and evict < self.__count:
+            size -= self.size_func(self[evict])
+            evict += 1
+        return evict
+
+    def pop_front(self, count):
+        """
+        淘汰最旧的count条数据
+        :param count:
+        :return:
+        """
+        count = min(count, self.__count)
+        for _ in range(count):
+            self.__bytes -= self.size_func(self.__slots[self.__head])
+            self.__slots[self.__head] = None
+            self.__head = (self.__head + 1) % self.max_lines
+        self.__count -= count
+
+    def extend(self, items):
+        """
+        追加数据，超过容量时淘汰最旧的数据
+        :param items: 数据列表
+        :return: 被淘汰的条数
+        """
+        evict = self.overflow(items)
+        self.pop_front(evict)
+        # 单次追加超过容量时只保留最后max_lines条
+        for item in items[-self.max_lines:]:
+            self.__slots[(self.__head + self.__count) % self.max_lines] = item
+            self.__count += 1
+            self.__bytes += self.size_func(item)
+        return evict
+
+    def append(self, item):
+        """
+        追加一条数据
+        :param item:
+        :return: 被淘汰的条数
+        """
+        return self.extend([item])
+
+    def clear(self):
+        """
+        清空缓冲区
+        :return:
+        """
+        self.__slots = [None] * self.max_lines
+        self.__head = 0
+        self.__count = 0
+        self.__bytes = 0
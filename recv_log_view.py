@@ -0,0 +1,248 @@
+"""
+recv_log_view.py
+虚拟化的接收数据显示区
+数据保存在环形缓冲区中，视图只为可见的行生成显示文本，重绘开销与数据总量无关
+"""
+import codecs
+import time
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import QFontDatabase, QKeySequence
+from PyQt5.QtWidgets import *
+
+from hex_format import to_hex
+from recv_buffer import RingBuffer
+from stream_decoder import decode
+
+# 显示区最大行数
+RECV_LOG_MAX_LINES = 2000000
+# 显示区最大字节数
+RECV_LOG_MAX_BYTES = 256 * 1024 * 1024
+
+
+def record_size(record):
+    """
+    单条记录的大小
+    :param record: (时间戳, 数据来源, 数据)
+    :return:
+    """
+    return len(record[2])
+
+
+class RecvLogModel(QAbstractListModel):
+    """
+    接收数据模型，每行对应一条记录(时间戳, 数据来源, 数据)
+    接收的数据为原始bytes，显示文本在视图请求时按当前显示格式生成，切换hex/ascii后历史数据立即按新格式显示
+    发送回显的数据为str，原样显示
+    """
+
+    def __init__(self, parent=None, max_lines=RECV_LOG_MAX_LINES, max_bytes=RECV_LOG_MAX_BYTES):
+        super().__init__(parent)
+        self.__buffer = RingBuffer(max_lines, max_bytes, size_func=record_size)
+        # 显示数据来源
+        self.__show_source = False
+        # 显示时间戳
+        self.__show_time = True
+        # 接收数据显示格式
+        self.__data_format = 'hex'
+        # ascii显示时的编码及解码错误处理方式
+        self.__encoding = 'utf-8'
+        self.__errors = 'replace'
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.__buffer)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return self.format_record(self.__buffer[index.row()]).rstrip('\r\n')
+
+    def format_record(self, record):
+        """
+        生成一条记录的显示文本
+        :param record:
+        :return:
+        """
+        timestamp, data_from, data = record
+        display_str = ""
+        if not isinstance(data, str):
+            data_from += " as " + ('hex' if self.__data_format == 'hex' else 'asc')
+            data = self.format_data(data)
+        if self.__show_source:
+            display_str += f"[{data_from}]"
+        if self.__show_time:
+            display_str += "[{}]".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)))
+        return display_str + data
+
+    def format_data(self, data):
+        """
+        按显示格式转换原始数据
+        :param data: bytes
+        :return:
+        """
+        if self.__data_format == 'hex':
+            # 串口接收到的字符串为b'ZZ\x02\x03Z'，要转换成16进制字符串显示
+            return to_hex(data)
+        # 串口接收到的字符串为b'ABC',要转化成unicode字符串才能输出到窗口中去
+        return decode(data, self.__encoding, self.__errors)
+
+    def set_encoding(self, encoding, errors):
+        """
+        修改ascii显示的编码及解码错误处理方式
+        :param encoding: 编码
+        :param errors:   错误处理方式 replace/backslashreplace/hexescape
+        :return:
+        """
+        encoding = codecs.lookup(encoding).name
+        codecs.lookup_error(errors)
+        if (encoding, errors) == (self.__encoding, self.__errors):
+            return
+        self.__encoding = encoding
+        self.__errors = errors
+        if self.__data_format == 'ascii':
+            self.__rows_changed()
+
+    @property
+    def data_format(self):
+        return self.__data_format
+
+    @data_format.setter
+    def data_format(self, value):
+        if value not in ['hex', 'ascii']:
+            raise ValueError('data_format must be either hex or ascii')
+        if value == self.__data_format:
+            return
+        self.__data_format = value
+        self.__rows_changed()
+
+    def set_display_options(self, show_source, show_time):
+        """
+        修改显示选项，已有数据按新选项重新显示（只重绘可见的行）
+        :param show_source: 显示数据来源
+        :param show_time:   显示时间戳
+        :return:
+        """
+        if (show_source, show_time) == (self.__show_source, self.__show_time):
+            return
+        self.__show_source = show_source
+        self.__show_time = show_time
+        self.__rows_changed()
+
+    def __rows_changed(self):
+        """
+        通知视图全部行的显示文本已改变，视图只重绘可见的行
+        :return:
+        """
+        if len(self.__buffer):
+            self.dataChanged.emit(self.index(0), self.index(len(self.__buffer) - 1), [Qt.DisplayRole])
+
+    def append_records(self, records):
+        """
+        追加记录，超过容量时从最旧的记录开始淘汰
+        :param records: 记录列表
+        :return:
+        """
+        if not records:
+            return
+        records = records[-self.__buffer.max_lines:]
+        evict = self.__buffer.overflow(records)
+        if evict:
+            self.beginRemoveRows(QModelIndex(), 0, evict - 1)
+            self.__buffer.pop_front(evict)
+            self.endRemoveRows()
+        count = len(self.__buffer)
+        self.beginInsertRows(QModelIndex(), count, count + len(records) - 1)
+        self.__buffer.extend(records)
+        self.endInsertRows()
+
+    def clear(self):
+        """
+        清空全部记录
+        :return:
+        """
+        self.beginResetModel()
+        self.__buffer.clear()
+        self.endResetModel()
+
+    def text(self):
+        """
+        全部记录的显示文本，用于保存文件，每条记录一行
+        :return:
+        """
+        return ''.join(self.format_record(record).rstrip('\r\n') + '\n' for record in self.__buffer)
+
+
+class RecvLogView(QListView):
+    """
+    接收数据视图
+    位于底部时自动跟随新数据（follow tail），向上滚动后停止跟随，滚动回底部后恢复
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 所有行高度相同，滚动和重绘只需计算可见的行
+        self.setUniformItemSizes(True)
+        self.setWordWrap(False)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerItem)
+        self.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.__follow_tail = True
+        # 正在因淘汰旧数据调整滚动位置
+        self.__adjusting = False
+        self.verticalScrollBar().valueChanged.connect(self.__on_scrolled)
+
+    @property
+    def follow_tail(self):
+        return self.__follow_tail
+
+    @follow_tail.setter
+    def follow_tail(self, value):
+        if not isinstance(value, bool):
+            raise TypeError('follow_tail must be bool')
+        self.__follow_tail = value
+        if value:
+            self.scrollToBottom()
+
+    def setModel(self, model):
+        super().setModel(model)
+        model.rowsInserted.connect(self.__on_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self.__on_rows_removed)
+
+    def __on_scrolled(self, value):
+        """
+        用户滚动时更新跟随状态
+        :param value:
+        :return:
+        """
+        if self.__adjusting:
+            return
+        self.__follow_tail = value >= self.verticalScrollBar().maximum()
+
+    def __on_rows_inserted(self, parent, first, last):
+        if self.__follow_tail:
+            self.scrollToBottom()
+
+    def __on_rows_removed(self, parent, first, last):
+        """
+        停止跟随时，淘汰旧数据后保持当前看到的行不动
+        :return:
+        """
+        if self.__follow_tail or first != 0:
+            return
+        scroll_bar = self.verticalScrollBar()
+        # 淘汰导致的滚动不当作用户操作
+        self.__adjusting = True
+        scroll_bar.setValue(max(0, scroll_bar.value() - (last - first + 1)))
+        self.__adjusting = False
+
+    def keyPressEvent(self, event):
+        # 复制选中的行
+        if event.matches(QKeySequence.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            model = self.model()
+            QApplication.clipboard().setText('\n'.join(model.index(row).data() for row in rows))
+            return
+        super().keyPressEvent(event)
@@ -0,0 +1,444 @@
+"""
+selector_backend.py
+单线程多串口后端
+所有串口在同一个QThread中用selectors监听非阻塞的文件描述符，读取、分帧、发送都在该线程中完成
+各串口的接收数据按时间窗口合并后，每个时间窗口只向界面线程发出一次信号，再分发给各串口对象
+16个串口只需要1个线程，而SerialThread方式每个串口需要接收、发送共2个线程
+只支持POSIX（pyserial在POSIX下以O_NONBLOCK打开串口并提供fd），其他平台仍使用SerialThread
+"""
+import collections
+import os
+import selectors
+import threading
+import time
+
+from PyQt5.QtCore import *
+import serial
+
+from buffer_pool import BufferPool, ReadStats
+from capture_file import DIRECTION_RECV, DIRECTION_SEND
+from checksum import ChecksumStage
+from data_batcher import DataBatcher, BATCH_INTERVAL_MS, BATCH_MAX_BYTES
+from frame_decoder import LineFramer
+from serialThread import MAX_CHUNK_SIZE, FRAME_IDLE_TIMEOUT, encode_send_data
+from serial_writer import SEND_QUEUE_SIZE, SendQueueStats
+from stream_decoder import StreamDecoder
+
+# 多串口会话的后端：每个串口一个SerialThread / 所有串口共用一个selector线程
+THREAD = 'thread'
+SELECTOR = 'selector'
+BACKENDS = [THREAD, SELECTOR]
+# 关闭串口时等待后端线程处理的最长时间(s)
+CLOSE_TIMEOUT = 2.0
+
+
+def selector_available():
+    """
+    当前平台是否支持selector后端
+    :return:
+    """
+    return os.name == 'posix' and hasattr(os, 'readv')
+
+
+class SelectorPort(QObject):
+    """
+    由SelectorBackend驱动的串口，接口与SerialThread一致（data_received/serial_error信号、send_data、sink等）
+    以__xxx__命名的方法只在后端线程中调用
+    """
+    data_received = pyqtSignal(list)
+    serial_error = pyqtSignal(str)
+
+    def __init__(self, backend, port, baud_rate, data_bits, parity_bits, stop_bits, data_format_send,
+                 data_format_recv, auto_line, encoding='utf-8', framer=None, checksum='',
+                 send_queue_size=SEND_QUEUE_SIZE, batch_interval=BATCH_INTERVAL_MS, batch_bytes=BATCH_MAX_BYTES,
+                 max_chunk=MAX_CHUNK_SIZE):
+        """
+        初始化，参数与SerialThread相同
+        :param backend:         SelectorBackend
+        :param send_queue_size: 待发送数据的最大条数，满时拒绝发送
+        """
+        super().__init__()
+        self.backend = backend
+        self.port = port
+        self.baud_rate = baud_rate
+        self.data_bits = data_bits
+        self.parity_bits = parity_bits
+        self.stop_bits = stop_bits
+        self.data_format_send = data_format_send
+        self.data_format_recv = data_format_recv
+        self.auto_line = auto_line
+        self.max_chunk = max_chunk
+        self.running = False
+        self.serial = None
+        self.framer = framer or LineFramer(max_frame=max_chunk)
+        self.__checksum = checksum
+        self.checksum_stage = ChecksumStage(checksum) if checksum else None
+        self.read_stats = ReadStats(backend.pool)
+        self.send_stats = SendQueueStats()
+        self.send_queue_size = send_queue_size
+        self.__pending = collections.deque()
+        self.__pending_lock = threading.Lock()
+        self.__seq = 0
+        self.__batcher = DataBatcher(batch_interval, batch_bytes)
+        self.__decoder = StreamDecoder(encoding)
+        self.__sinks = []
+        self.__last_recv = 0.0
+        self.__closed = threading.Event()
+
+    @property
+    def encoding(self):
+        return self.__decoder.encoding
+
+    @encoding.setter
+    def encoding(self, value):
+        self.__decoder.encoding = value
+
+    def start(self):
+        """
+        交给后端线程打开串口，失败时发出serial_error
+        :return:
+        """
+        self.__closed.clear()
+        self.backend.add_port(self)
+
+    def stop(self):
+        """
+        关闭串口，等待后端线程处理完成
+        :return:
+        """
+        self.backend.remove_port(self)
+        self.__closed.wait(CLOSE_TIMEOUT)
+
+    def isRunning(self):
+        return self.running
+
+    def add_sink(self, sink):
+        """
+        添加原始数据输出，在后端线程中调用sink.write(direction, payload, timestamp_ns)
+        :param sink:
+        :return:
+        """
+        if sink not in self.__sinks:
+            self.__sinks = self.__sinks + [sink]
+
+    def remove_sink(self, sink):
+        self.__sinks = [item for item in self.__sinks if item is not sink]
+
+    def encode_data(self, data: str):
+        return encode_send_data(data, self.data_format_send, self.auto_line, self.__checksum)
+
+    def send_data(self, data: str):
+        """
+        发送数据
+        :return:
+        """
+        if not self.running:
+            self.serial_error.emit("请先打开串口！")
+            return
+
+        try:
+            byte_array = self.encode_data(data)
+        except ValueError as e:
+            self.serial_error.emit(str(e))
+            return
+        if not self.send_bytes(byte_array):
+            self.serial_error.emit('发送队列已满!' + str(self.send_stats))
+
+    def send_bytes(self, byte_array, echo=False):
+        """
+        放入待发送数据，由后端线程在串口可写时写入
+        :param byte_array:
+        :param echo:    不支持回显，保留参数与SerialThread一致
+        :return: 发送序号，被拒绝时为0
+        """
+        stats = self.send_stats
+        with self.__pending_lock:
+            if len(self.__pending) >= self.send_queue_size:
+                stats.rejected += 1
+                return 0
+            self.__pending.append(memoryview(bytes(byte_array)))
+            self.__seq += 1
+            seq = self.__seq
+            stats.depth = len(self.__pending)
+            stats.max_depth = max(stats.max_depth, stats.depth)
+            stats.queued_bytes += len(byte_array)
+        self.backend.request_write(self)
+        return seq
+
+    def __write_sinks__(self, direction, byte_array):
+        timestamp_ns = time.monotonic_ns()
+        for sink in self.__sinks:
+            try:
+                sink.write(direction, byte_array, timestamp_ns)
+            except Exception as e:
+                self.remove_sink(sink)
+                self.serial_error.emit("数据保存异常！" + str(e))
+
+    def __open__(self):
+        """
+        打开串口
+        :return: 文件描述符
+        """
+        self.serial = serial.Serial(
+            port=self.port,
+            baudrate=self.baud_rate,
+            parity=self.parity_bits,
+            stopbits=self.stop_bits,
+            bytesize=self.data_bits,
+            timeout=0,
+            write_timeout=0
+        )
+        self.framer.reset()
+        self.__decoder.flush()
+        self.running = True
+        return self.serial.fd
+
+    def __close__(self):
+        self.running = False
+        if self.serial is not None:
+            self.serial.close()
+        with self.__pending_lock:
+            self.__pending.clear()
+            self.send_stats.depth = 0
+        self.__closed.set()
+
+    def __on_readable__(self, view):
+        """
+        读取已到达的数据并分帧
+        :param view: 后端线程共用的读取缓冲区
+        :return:
+        """
+        try:
+            size = os.readv(self.serial.fd, [view[:self.max_chunk]])
+        except BlockingIOError:
+            return
+        if not size:
+            raise serial.SerialException('device reports readiness to read but returned no data '
+                                         '(device disconnected or multiple access on port?)')
+        data = view[:size]
+        self.__last_recv = time.monotonic()
+        self.read_stats.reads += 1
+        self.read_stats.direct_reads += 1
+        self.read_stats.bytes += size
+        self.__write_sinks__(DIRECTION_RECV, data)
+        frames = self.framer.feed(data)
+        if not self.framer.text_stream:
+            if self.checksum_stage:
+                frames = self.checksum_stage.process(frames)
+            self.__batcher.add(frames)
+            return
+        self.__batcher.add([frame for frame in map(self.__decoder.align, frames) if frame])
+
+    def __on_writable__(self):
+        """
+        写入待发送的数据，直到写完或串口输出缓冲区已满
+        :return: 是否已全部写完
+        """
+        stats = self.send_stats
+        while True:
+            with self.__pending_lock:
+                if not self.__pending:
+                    return True
+                chunk = self.__pending[0]
+            try:
+                size = os.write(self.serial.fd, chunk)
+            except BlockingIOError:
+                return False
+            self.__write_sinks__(DIRECTION_SEND, chunk[:size])
+            stats.written_bytes += size
+            stats.queued_bytes -= size
+            with self.__pending_lock:
+                if size < len(chunk):
+                    self.__pending[0] = chunk[size:]
+                    return False
+                self.__pending.popleft()
+                stats.depth = len(self.__pending)
+            stats.writes += 1
+
+    def __on_idle__(self, now):
+        """
+        串口空闲超过FRAME_IDLE_TIMEOUT后输出不完整的帧
+        :param now:
+        :return:
+        """
+        if not self.framer.text_stream or now - self.__last_recv < FRAME_IDLE_TIMEOUT:
+            return
+        if self.framer.pending:
+            self.__batcher.add([frame for frame in [self.__decoder.align(self.framer.flush())] if frame])
+        if self.__decoder.pending:
+            self.__batcher.add([self.__decoder.flush()])
+
+    def __busy__(self):
+        """
+        是否有等待输出的数据，决定后端线程的select超时
+        :return:
+        """
+        return len(self.__batcher) > 0 or (self.framer.text_stream and (self.framer.pending or self.__decoder.pending))
+
+    def __take_batch__(self, force=False):
+        if force or self.__batcher.due():
+            return self.__batcher.take()
+        return []
+
+
+class SelectorBackend(QThread):
+    """
+    selector后端线程，第一个串口打开时启动
+    """
+    # 本次时间窗口内各串口的数据，参数为[(SelectorPort, 帧列表)]，在界面线程中分发
+    batch_ready = pyqtSignal(list)
+
+    def __init__(self, max_chunk=MAX_CHUNK_SIZE, batch_interval=BATCH_INTERVAL_MS):
+        """
+        初始化
+        :param max_chunk:       单次读取的最大字节数
+        :param batch_interval:  有数据等待输出时select的超时(ms)
+        """
+        super().__init__()
+        self.running = False
+        self.max_chunk = max_chunk
+        self.batch_interval = batch_interval
+        # 所有串口共用一个读取缓冲区
+        self.pool = BufferPool(max_chunk)
+        self.__ports = {}
+        self.__commands = collections.deque()
+        self.__wake_read, self.__wake_write = os.pipe()
+        os.set_blocking(self.__wake_read, False)
+        os.set_blocking(self.__wake_write, False)
+        self.batch_ready.connect(self.__dispatch__)
+
+    @property
+    def ports(self):
+        return list(self.__ports)
+
+    def __dispatch__(self, batches):
+        """
+        在界面线程中把数据分发给各串口
+        :param batches:
+        :return:
+        """
+        for port, frames in batches:
+            port.data_received.emit(frames)
+
+    def __command__(self, command, port):
+        self.__commands.append((command, port))
+        try:
+            os.write(self.__wake_write, b'\x00')
+        except BlockingIOError:
+            # 管道已满说明线程尚未处理之前的唤醒，命令会一起处理
+            pass
+
+    def add_port(self, port):
+        if not self.isRunning():
+            self.running = True
+            self.start()
+        self.__command__('add', port)
+
+    def remove_port(self, port):
+        self.__command__('remove', port)
+
+    def request_write(self, port):
+        self.__command__('write', port)
+
+    def stop(self):
+        """
+        关闭所有串口并停止线程
+        :return:
+        """
+        self.running = False
+        self.__command__('stop', None)
+        self.wait()
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.__wake_read, selectors.EVENT_READ)
+        buffer = self.pool.acquire()
+        view = memoryview(buffer)
+        try:
+            while self.running:
+                busy = any(port.__busy__() for port in self.__ports)
+                timeout = min(self.batch_interval * 0.001, FRAME_IDLE_TIMEOUT) if busy else None
+                for key, mask in selector.select(timeout):
+                    port = key.data
+                    if port is None:
+                        self.__run_commands__(selector)
+                        continue
+                    if port not in self.__ports:
+                        continue
+                    try:
+                        if mask & selectors.EVENT_READ:
+                            port.__on_readable__(view)
+                        if mask & selectors.EVENT_WRITE and port.__on_writable__():
+                            selector.modify(key.fd, selectors.EVENT_READ, port)
+                    except Exception as e:
+                        self.__close_port__(selector, port, str(e))
+                self.__emit_batches__()
+        finally:
+            for port in list(self.__ports):
+                self.__close_port__(selector, port)
+            for command, port in self.__commands:
+                if port is not None:
+                    port.__close__()
+            self.__commands.clear()
+            selector.close()
+            view = None
+            self.pool.release(buffer)
+
+    def __emit_batches__(self):
+        now = time.monotonic()
+        batches = []
+        for port in self.__ports:
+            port.__on_idle__(now)
+            frames = port.__take_batch__()
+            if frames:
+                batches.append((port, frames))
+        if batches:
+            self.batch_ready.emit(batches)
+
+    def __run_commands__(self, selector):
+        try:
+            while os.read(self.__wake_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self.__commands:
+            command, port = self.__commands.popleft()
+            if command == 'add':
+                try:
+                    fd = port.__open__()
+                    selector.register(fd, selectors.EVENT_READ, port)
+                    self.__ports[port] = fd
+                except Exception as e:
+                    port.__close__()
+                    port.serial_error.emit(str(e))
+            elif command == 'remove':
+                self.__close_port__(selector, port)
+            elif command == 'write':
+                fd = self.__ports.get(port)
+                if fd is None:
+                    continue
+                try:
+                    if not port.__on_writable__():
+                        selector.modify(fd, selectors.EVENT_READ | selectors.EVENT_WRITE, port)
+                except Exception as e:
+                    self.__close_port__(selector, port, str(e))
+            elif command == 'stop':
+                self.running = False
+
+    def __close_port__(self, selector, port, error=''):
+        """
+        关闭串口，先发出剩余的数据再发出错误
+        :param selector:
+        :param port:
+        :param error:
+        :return:
+        """
+        fd = self.__ports.pop(port, None)
+        if fd is not None:
+            selector.unregister(fd)
+            frames = port.__take_batch__(force=True)
+            if frames:
+                self.batch_ready.emit([(port, frames)])
+        port.__close__()
+        if error:
+            port.serial_error.emit(error)
@@ -3,18 +3,110 @@
 串口线程，在打开串口时创建线程，包含串口相关的操作
 Pyqt5 QThread多线程操作参考链接：https://www.cnblogs.com/linyfeng/p/12239856.html
 """
+import threading
+import time
+
 from PyQt5.QtCore import *
 import serial
 
+from buffer_pool import BufferPool, ReadStats, read_into
+from capture_file import DIRECTION_RECV, DIRECTION_SEND
+from checksum import ChecksumStage, append_checksum
+from data_batcher import DataBatcher, BATCH_INTERVAL_MS, BATCH_MAX_BYTES
+from frame_decoder import LineFramer
+from hex_format import parse_hex
+from serial_writer import SerialWriter, SEND_QUEUE_SIZE, BLOCK
+from stream_decoder import StreamDecoder
+from timeClock import PeriodicSchedule, SKIP
+
+# 按行接收时的读超时(s)
+LINE_READ_TIMEOUT = 2
+# 按块接收时的读超时(s)，决定无数据时单次读取的最长阻塞时间
+CHUNK_READ_TIMEOUT = 0.02
+# 按块接收时单次读取的最大字节数
+MAX_CHUNK_SIZE = 4096
+# 不完整的帧在串口空闲超过该时间(s)后直接输出
+FRAME_IDLE_TIMEOUT = 0.05
+# 自动发送在截止时间前忙等的时间(us)，减小sleep唤醒误差
+AUTOSEND_SPIN_US = 500
+# 断开后重连的退避时间(s)，每次打开失败后加倍
+RECONNECT_MIN_DELAY = 0.2
+RECONNECT_MAX_DELAY = 5.0
+# 重连时检查设备是否出现的间隔(s)
+RECONNECT_POLL_INTERVAL = 0.05
+
+# 连接状态
+CONNECTED = 'connected'
+RECONNECTING = 'reconnecting'
+DISCONNECTED = 'disconnected'
+
+
+def encode_send_data(data: str, data_format_send, auto_line, checksum=''):
+    """
+    按发送格式将字符串编码为bytes
+    :param data:
+    :param data_format_send:    hex/ascii
+    :param auto_line:           是否追加换行
+    :param checksum:            十六进制数据附加的校验方式，为空时不附加
+    :return:
+    """
+    # hex发送 比如：5a 5a 02 03 5a -> b'ZZ\x02\x03Z'，格式错误时抛出HexParseError（ValueError）
+    if data_format_send == 'hex':
+        byte_array = parse_hex(data)
+        if checksum and byte_array:
+            byte_array = append_checksum(checksum, byte_array)
+        if auto_line:
+            byte_array += b'\r\n'
+    else:
+        if auto_line:
+            data += '\r\n'
+        # ascii发送 比如：'ABC' -> b'ABC'
+        byte_array = data.encode('utf-8')
+    return byte_array
+
+
+class ReconnectStats:
+    """
+    断开重连统计，重连耗时从检测到断开开始计算
+    """
+
+    def __init__(self):
+        self.disconnects = 0
+        self.reconnects = 0
+        self.attempts = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def record(self, latency):
+        self.reconnects += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    def __str__(self):
+        mean = self.total_latency / self.reconnects if self.reconnects else 0.0
+        return '断开{}次, 重连{}次(尝试打开{}次), 重连耗时 最近{:.2f}s 平均{:.2f}s 最长{:.2f}s'.format(
+            self.disconnects, self.reconnects, self.attempts, self.last_latency, mean, self.max_latency)
+
 
 class SerialThread(QThread):
     """
     创建一个继承自QThread的SerialThread类，实现串口数据的读取/发送
     """
-    data_received = pyqtSignal(str)
+    # 接收数据按时间窗口合并后发出，参数为原始帧（bytes）列表，由界面按显示格式转换
+    data_received = pyqtSignal(list)
+    # 自动发送的数据按时间窗口合并后发出，用于显示输出
+    data_sent = pyqtSignal(list)
     serial_error = pyqtSignal(str)
+    # 连接状态变化，参数为状态（CONNECTED/RECONNECTING/DISCONNECTED）及串口号或断开原因
+    connection_state = pyqtSignal(str, str)
 
-    def __init__(self, port, baud_rate, data_bits, parity_bits, stop_bits, data_format_send, data_format_recv, auto_line):
+    def __init__(self, port, baud_rate, data_bits, parity_bits, stop_bits, data_format_send, data_format_recv, auto_line,
+                 recv_mode='chunk', max_chunk=MAX_CHUNK_SIZE,
+                 batch_interval=BATCH_INTERVAL_MS, batch_bytes=BATCH_MAX_BYTES, byte_store=None, encoding='utf-8',
+                 send_queue_size=SEND_QUEUE_SIZE, send_policy=BLOCK, framer=None, checksum='', reconnect=False,
+                 resolver=None):
         """
         初始化
         :param port:            串口号
@@ -23,7 +115,20 @@ class SerialThread(QThread):
         :param parity_bits:     校验位
         :param stop_bits:       停止位
         :param data_format_send:发送数据格式
-        :param data_format_recv:接收数据格式
+        :param data_format_recv:接收数据格式（线程只发出原始数据，显示格式由界面决定）
+        :param auto_line:       开启自动追加换行
+        :param recv_mode:       接收模式，line按行读取，chunk读取缓冲区中已有的全部数据后再分帧
+        :param max_chunk:       chunk模式下单次读取的最大字节数
+        :param batch_interval:  接收数据合并时间窗口(ms)
+        :param batch_bytes:     接收数据单批最大字节数
+        :param byte_store:      原始数据存储（ByteStore），接收到的原始字节写入其中
+        :param encoding:        接收编码，多字节字符不会被拆在两帧中
+        :param send_queue_size: 发送队列长度(条)
+        :param send_policy:     发送队列满时的处理方式 block/drop_oldest/reject
+        :param framer:          chunk模式下的分帧器（frame_decoder.make_framer），默认按行分帧
+        :param checksum:        帧校验方式（checksum.CHECKSUMS），校验二进制帧并附加到十六进制发送数据末尾，为空时不校验
+        :param reconnect:       串口断开后是否自动重连，重连期间线程、sink、统计保持不变
+        :param resolver:        重连时调用resolver()获取要打开的串口号，设备不在时返回None，默认重连原串口号
         """
         super().__init__()
         self.port = port
@@ -32,8 +137,14 @@ class SerialThread(QThread):
         self.parity_bits = parity_bits
         self.stop_bits = stop_bits
 
-        # 串口运行标志位
+        # 串口运行标志位，重连期间保持为True
         self.running = False
+        # 串口是否已打开
+        self.connected = False
+        # 断开重连
+        self.reconnect = reconnect
+        self.__resolver = resolver
+        self.reconnect_stats = ReconnectStats()
         # 串口
         self.serial = None
         # 数据格式
@@ -41,6 +152,36 @@ class SerialThread(QThread):
         self.__data_format_recv = data_format_recv
         # 开启自动追加换行
         self.__auto_line = auto_line
+        # 接收模式
+        if recv_mode not in ['line', 'chunk']:
+            raise ValueError('recv_mode must be either line or chunk')
+        self.recv_mode = recv_mode
+        self.max_chunk = max_chunk
+        # chunk模式下的分帧器
+        self.__framer = framer or LineFramer(max_frame=max_chunk)
+        # 帧校验
+        self.__checksum = checksum
+        self.checksum_stage = ChecksumStage(checksum) if checksum else None
+        # chunk模式下读取用的缓冲区池
+        self.__pool = BufferPool(max_chunk)
+        self.__read_view = None
+        self.read_stats = ReadStats(self.__pool)
+        self.__last_recv = 0.0
+        # 接收数据合并
+        self.__batcher = DataBatcher(batch_interval, batch_bytes)
+        self.__sent_batcher = DataBatcher(batch_interval, batch_bytes)
+        self.byte_store = byte_store
+        # 帧边界按字符对齐
+        self.__decoder = StreamDecoder(encoding)
+        # 原始数据输出（如捕获文件），在串口线程中调用sink.write(direction, payload, timestamp_ns)
+        self.__sinks = []
+        # 发送线程，所有写串口操作都在其中进行
+        self.__writer = SerialWriter(send_queue_size, send_policy, on_written=self.__on_written__)
+        self.__writer.write_error.connect(self.__on_write_error__, Qt.DirectConnection)
+        # 自动发送
+        self.__auto_send_thread = None
+        self.__auto_send_running = False
+        self.__auto_send_schedule = None
 
     # 通过@property将data_format_send(data_format_recv)修饰为属性
     @property
@@ -76,6 +217,18 @@ class SerialThread(QThread):
             raise ValueError('data_format must be either hex or ascii')
         self.__data_format_recv = value
 
+    @property
+    def encoding(self):
+        return self.__decoder.encoding
+
+    @encoding.setter
+    def encoding(self, value):
+        self.__decoder.encoding = value
+
+    @property
+    def framer(self):
+        return self.__framer
+
     @property
     def auto_line(self):
         return self.__auto_line
@@ -92,57 +245,349 @@ class SerialThread(QThread):
             return
 
         try:
-            with serial.Serial(
-                    port=self.port,
-                    baudrate=self.baud_rate,
-                    parity=self.parity_bits,
-                    stopbits=self.stop_bits,
-                    bytesize=self.data_bits,
-                    timeout=2
-            ) as self.serial:
-                print(self.baud_rate)
-                self.running = True
-                while self.running:
-                    data = self.__read_data__()
-                    if data:
-                        self.data_received.emit(data)
+            self.__open_port__(self.port)
         except Exception as e:
             self.serial_error.emit(str(e))
+            return
+        self.connection_state.emit(CONNECTED, self.port)
+        # 读取缓冲区在线程运行期间（包括重连）一直使用，结束后放回池中
+        buffer = self.__pool.acquire()
+        self.__read_view = memoryview(buffer)
+        error = ''
+        try:
+            while self.running:
+                try:
+                    self.__serve__()
+                except Exception as e:
+                    # 串口断开，先发出已收到的数据
+                    error = str(e)
+                    self.__close_port__()
+                    self.__emit_batches__()
+                    if not self.reconnect:
+                        break
+                    self.__reconnect__(error)
+                    error = ''
+        finally:
+            self.__close_port__()
+            self.__read_view = None
+            self.__pool.release(buffer)
+            self.__emit_batches__()
+            self.running = False
+        if error:
+            self.serial_error.emit(error)
+            self.connection_state.emit(DISCONNECTED, error)
 
-    def __read_data__(self):
+    def __open_port__(self, port):
         """
-        按行接收数据
+        打开串口并启动发送线程
+        :param port: 串口号
+        :return:
+        """
+        self.serial = serial.Serial(
+            port=port,
+            baudrate=self.baud_rate,
+            parity=self.parity_bits,
+            stopbits=self.stop_bits,
+            bytesize=self.data_bits,
+            timeout=LINE_READ_TIMEOUT if self.recv_mode == 'line' else CHUNK_READ_TIMEOUT
+        )
+        self.port = port
+        self.running = True
+        self.connected = True
+        self.__framer.reset()
+        self.__decoder.flush()
+        self.__writer.open(self.serial)
+
+    def __close_port__(self):
+        """
+        停止发送线程并关闭串口，发送队列中的数据被丢弃
+        :return:
+        """
+        self.connected = False
+        self.__writer.stop()
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except Exception:
+                pass
+            self.serial = None
+
+    def __serve__(self):
+        """
+        接收数据直到线程停止，串口断开时抛出异常
+        :return:
+        """
+        while self.running:
+            self.__batcher.add(self.__read_data__())
+            if self.__batch_due__():
+                self.data_received.emit(self.__batcher.take())
+            if self.__sent_batcher.due():
+                self.data_sent.emit(self.__sent_batcher.take())
+
+    def __emit_batches__(self):
+        if len(self.__batcher):
+            self.data_received.emit(self.__batcher.take())
+        if len(self.__sent_batcher):
+            self.data_sent.emit(self.__sent_batcher.take())
+
+    def __reconnect__(self, reason):
+        """
+        断开后重新打开串口，直到成功或线程停止
+        打开失败后按指数退避等待；resolver返回None（设备不在）时不尝试打开，设备出现后立即打开
+        :param reason: 断开原因
+        :return: 是否已重新连接
+        """
+        stats = self.reconnect_stats
+        stats.disconnects += 1
+        self.connection_state.emit(RECONNECTING, reason)
+        start = time.monotonic()
+        delay = RECONNECT_MIN_DELAY
+        next_attempt = start + delay
+        while self.running:
+            time.sleep(RECONNECT_POLL_INTERVAL)
+            if time.monotonic() < next_attempt:
+                continue
+            try:
+                port = self.__resolver() if self.__resolver else self.port
+            except Exception:
+                # 查找失败按设备不在处理
+                port = None
+            if not port:
+                continue
+            stats.attempts += 1
+            try:
+                self.__open_port__(port)
+            except Exception:
+                self.__close_port__()
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                next_attempt = time.monotonic() + delay
+                continue
+            stats.record(time.monotonic() - start)
+            self.connection_state.emit(CONNECTED, port)
+            return True
+        return False
+
+    def __on_write_error__(self, error):
+        """
+        写串口失败，在发送线程中调用
+        自动重连时由接收侧检测断开并重连，不单独提示
+        :param error:
         :return:
         """
+        if not self.reconnect:
+            self.serial_error.emit(error)
+
+    def __batch_due__(self):
+        """
+        是否发出当前合并的数据
+        line模式下读取可能阻塞LINE_READ_TIMEOUT，串口缓冲区读空后立即发出，避免数据滞留
+        :return:
+        """
+        if self.__batcher.due():
+            return True
+        return self.recv_mode == 'line' and len(self.__batcher) > 0 and self.serial.in_waiting == 0
+
+    def __read_data__(self):
+        """
+        接收数据，读取线程不做解码/格式化
+        :return: 帧列表（bytes）
+        """
         if self.serial is None or not self.serial.isOpen():
-            return
+            return []
 
         try:
-            # 读取串口数据 例如：b'DDR V1.12 52218f4949 cym 23/07/0'
-            byte_array = self.serial.readline()
-            if len(byte_array) == 0:
-                return None
-            # ascii显示
-            if self.data_format_recv == 'ascii':
-                # 串口接收到的字符串为b'ABC',要转化成unicode字符串才能输出到窗口中去
-                data_str = byte_array.decode('utf-8')
+            if self.recv_mode == 'line':
+                frames = self.__read_line__()
             else:
-                # 串口接收到的字符串为b'ZZ\x02\x03Z'，要转换成16进制字符串显示
-                data_str = ' '.join(format(x, '02x') for x in byte_array)
-                if self.auto_line:
-                    data_str += '\r\n'
-            return data_str
+                frames = self.__read_chunk__()
+            if self.recv_mode == 'chunk' and not self.__framer.text_stream:
+                # 二进制帧原样输出，不按字符边界调整
+                if self.checksum_stage:
+                    frames = self.checksum_stage.process(frames)
+                return frames
+            # 帧末尾不完整的多字节字符留到下一帧，界面可以逐帧独立解码
+            frames = [frame for frame in map(self.__decoder.align, frames) if frame]
+            # 数据流暂停后输出留下的字节
+            if not frames and self.__decoder.pending and time.monotonic() - self.__last_recv >= FRAME_IDLE_TIMEOUT:
+                frames.append(self.__decoder.flush())
+            return frames
+        except (serial.SerialException, OSError):
+            # 串口断开，由run处理
+            raise
         except Exception as e:
-            self.serial_error.emit("接收数据异常！", e)
+            self.serial_error.emit("接收数据异常！" + str(e))
+            return []
+
+    def __read_line__(self):
+        """
+        按行接收数据
+        :return: 帧列表
+        """
+        # 读取串口数据 例如：b'DDR V1.12 52218f4949 cym 23/07/0'
+        byte_array = self.serial.readline()
+        if len(byte_array) == 0:
+            return []
+        self.__last_recv = time.monotonic()
+        self.__store_raw__(byte_array)
+        return [byte_array]
+
+    def __read_chunk__(self):
+        """
+        按块接收数据，一次读出缓冲区中已有的全部数据（不超过max_chunk），再交给分帧器按行分帧
+        缓冲区为空时最多阻塞CHUNK_READ_TIMEOUT，不会因等待换行符而卡住
+        有数据时直接读入缓冲区池中取出的缓冲区，原始数据以memoryview传给ByteStore、sink和分帧器，各自复制需要的部分
+        :return: 帧列表
+        """
+        waiting = min(self.serial.in_waiting, self.max_chunk)
+        if not waiting:
+            # 空闲时阻塞等待第一个字节
+            byte_array = self.serial.read(1)
+            now = time.monotonic()
+            if byte_array:
+                self.read_stats.copied_reads += 1
+                return self.__handle_raw__(byte_array, now)
+            # 没有换行符的数据（如二进制数据）在串口空闲后直接输出
+            if self.__framer.text_stream and self.__framer.pending and now - self.__last_recv >= FRAME_IDLE_TIMEOUT:
+                return [self.__framer.flush()]
+            return []
+        view = self.__read_view
+        size, direct = read_into(self.serial, view if waiting == len(view) else view[:waiting])
+        if direct:
+            self.read_stats.direct_reads += 1
+        else:
+            self.read_stats.copied_reads += 1
+        if not size:
+            raise serial.SerialException('device reports readiness to read but returned no data '
+                                         '(device disconnected or multiple access on port?)')
+        return self.__handle_raw__(view[:size], time.monotonic())
+
+    def __handle_raw__(self, data, now):
+        """
+        保存一段原始数据并分帧
+        :param data:    bytes/memoryview，只在本次调用中有效
+        :param now:     读取时的time.monotonic()
+        :return: 帧列表
+        """
+        self.__last_recv = now
+        self.read_stats.reads += 1
+        self.read_stats.bytes += len(data)
+        self.__store_raw__(data)
+        return self.__framer.feed(data)
+
+    def __store_raw__(self, byte_array):
+        """
+        将读取到的原始数据写入byte_store和各个sink
+        :param byte_array:
+        :return:
+        """
+        if self.byte_store is not None:
+            self.byte_store.append(byte_array)
+        self.__write_sinks__(DIRECTION_RECV, byte_array)
+
+    def __write_sinks__(self, direction, byte_array):
+        timestamp_ns = time.monotonic_ns()
+        for sink in self.__sinks:
+            try:
+                sink.write(direction, byte_array, timestamp_ns)
+            except Exception as e:
+                self.remove_sink(sink)
+                self.serial_error.emit("数据保存异常！" + str(e))
+
+    def add_sink(self, sink):
+        """
+        添加原始数据输出
+        接收的payload可能是串口线程缓冲区的memoryview，只在write调用期间有效，需要保留时应复制
+        :param sink: 需实现write(direction, payload, timestamp_ns)
+        :return:
+        """
+        if sink not in self.__sinks:
+            # 复制后替换，串口线程遍历时不受影响
+            self.__sinks = self.__sinks + [sink]
+
+    def remove_sink(self, sink):
+        self.__sinks = [item for item in self.__sinks if item is not sink]
 
     def stop(self):
         """
         线程停止
         :return:
         """
+        self.stop_auto_send()
         self.running = False
         self.wait()
 
+    def start_auto_send(self, payload, period_ms, spin_us=AUTOSEND_SPIN_US):
+        """
+        开始自动发送，数据预先编码为bytes，在独立线程中按周期放入发送队列，不经过界面线程
+        :param payload:     发送的数据（bytes）
+        :param period_ms:   周期(ms)，可以是小数
+        :param spin_us:     截止时间前忙等的时间(us)
+        :return:
+        """
+        self.stop_auto_send()
+        self.__auto_send_schedule = PeriodicSchedule(int(period_ms * 1000 * 1000), SKIP, spin_us * 1000)
+        self.__auto_send_running = True
+        self.__auto_send_thread = threading.Thread(
+            target=self.__auto_send_loop__, args=(bytes(payload),), name='auto-send', daemon=True
+        )
+        self.__auto_send_thread.start()
+
+    def stop_auto_send(self):
+        """
+        停止自动发送
+        :return:
+        """
+        self.__auto_send_running = False
+        if self.__auto_send_thread:
+            self.__auto_send_thread.join()
+            self.__auto_send_thread = None
+
+    @property
+    def auto_send_stats(self):
+        """
+        自动发送的周期延迟统计
+        :return: JitterStats，未开始过自动发送时为None
+        """
+        return self.__auto_send_schedule.stats if self.__auto_send_schedule else None
+
+    def __auto_send_loop__(self, payload):
+        schedule = self.__auto_send_schedule
+        schedule.reset()
+        errors = self.__writer.stats.errors
+        while schedule.wait(lambda: self.__auto_send_running and self.running):
+            # 写串口失败后停止，避免连续报错；队列满被拒绝时只计数，下个周期继续
+            # 自动重连时写失败由断开引起，重连后继续发送，重连期间的数据被拒绝
+            if self.__writer.stats.errors != errors:
+                if not self.reconnect:
+                    break
+                errors = self.__writer.stats.errors
+            self.send_bytes(payload, echo=True)
+        self.__auto_send_running = False
+
+    @property
+    def writer(self):
+        """
+        发送线程，可连接write_done信号获取写入完成通知
+        :return: SerialWriter
+        """
+        return self.__writer
+
+    @property
+    def send_stats(self):
+        """
+        发送队列统计
+        :return: SendQueueStats
+        """
+        return self.__writer.stats
+
+    def encode_data(self, data: str):
+        """
+        按发送格式将字符串编码为bytes，十六进制数据按设置附加校验值
+        :param data:
+        :return:
+        """
+        return encode_send_data(data, self.data_format_send, self.auto_line, self.__checksum)
+
     def send_data(self, data: str):
         """
         发送数据
@@ -151,32 +596,37 @@ class SerialThread(QThread):
         if not self.running:
             self.serial_error.emit("请先打开串口！")
             return
-
-        # hex发送 比如：5a 5a 02 03 5a -> b'ZZ\x02\x03Z'
-        if self.data_format_send == 'hex':
-            data_str = data.strip()
-            send_list = []
-            while data_str != '':
-                try:
-                    num = int(data_str[0:2], 16)
-                except ValueError:
-                    self.serial_error.emit('请输入十六进制数据，以空格分开!')
-                    return
-                data_str = data_str[2:].strip()
-                send_list.append(num)
-            if self.auto_line:
-                send_list.append('/r/n')
-            byte_array = bytes(send_list)
-        else:
-            if self.auto_line:
-                data += '\r\n'
-            # ascii发送 比如：'ABC' -> b'ABC'
-            byte_array = data.encode('utf-8')
+        if not self.connected:
+            self.serial_error.emit("串口已断开，正在重连！")
+            return
 
         try:
-            self.serial.write(byte_array)
-        except Exception as e:
-            self.serial_error.emit('发送失败!')
+            byte_array = self.encode_data(data)
+        except ValueError as e:
+            self.serial_error.emit(str(e))
+            return
+        if not self.send_bytes(byte_array):
+            self.serial_error.emit('发送队列已满!' + str(self.send_stats))
+
+    def send_bytes(self, byte_array, echo=False):
+        """
+        发送已编码的数据，只放入发送队列，由发送线程写入串口
+        :param byte_array:
+        :param echo:    写入完成后通过data_sent发出，用于显示输出
+        :return: 发送序号（对应writer.write_done），被拒绝时为0
+        """
+        return self.__writer.submit(byte_array, echo)
+
+    def __on_written__(self, byte_array, echo):
+        """
+        写入完成，在发送线程中调用
+        :param byte_array:
+        :param echo:
+        :return:
+        """
+        self.__write_sinks__(DIRECTION_SEND, byte_array)
+        if echo:
+            self.__sent_batcher.add([byte_array])
 
     def isRunning(self):
         return self.running
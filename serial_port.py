@@ -9,28 +9,42 @@ Date: 2025/01/26
 import json
 import os
 import sys
+import time
 import webbrowser
-from datetime import datetime
 
 import serial
-import serial.tools.list_ports
-from PyQt5.QtCore import QDateTime
-from PyQt5.QtGui import QTextCursor, QIcon
+from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import *
 
 import settings_thread
-from serialThread import SerialThread
-from timeClock import timeClock
+from autosave_writer import AutosaveWriter, AUTOSAVE_FLUSH_INTERVAL
+from log_rotation import RotationPolicy, COMPRESS_FORMATS
+from byte_store import ByteStore
+from capture_file import CaptureFormatError
+from capture_replay_view import CaptureReplayWindow
+from checksum import CHECKSUMS
+from file_sender import FileSender, ModemFileSender, FILE_CHUNK_SIZE, line_rate, read_preview
+from frame_decoder import FRAMERS, make_framer
+from hex_dump_view import HexDumpModel
+from hex_format import hex_dump
+from recv_log_view import RecvLogModel, RecvLogView
+from port_registry import insert_port_item, remove_port_item
+from selector_backend import BACKENDS
+from serialThread import SerialThread, CONNECTED, RECONNECTING, DISCONNECTED
+from session_manager import SessionManager
+from session_window import SessionWindow
+from serial_writer import BACKPRESSURE_POLICIES, SEND_QUEUE_SIZE
+from stream_decoder import ENCODINGS, ERROR_POLICIES, StreamDecoder
+from xmodem import PROTOCOLS
 from settings_thread import SettingsThread
 # 导入设计的ui界面转换成的py文件
 import displayUI as Ui_MainWindow
 from QSSLoader import QSSLoader
 
-# 最小自动发送的时间间隔
-MIN_AUTOSEND_MS = 10
+# 最小自动发送的时间间隔，自动发送在串口线程侧定时写入，不受界面刷新影响
+MIN_AUTOSEND_MS = 1
 SHORTCUT_LIST_NUM = 60
 BASE_PATH = os.path.dirname(os.path.realpath(sys.argv[0]))
-AUTO_REFRESH_INTERVAL = 800
 
 
 class SerialPort(QMainWindow):
@@ -44,11 +58,44 @@ class SerialPort(QMainWindow):
 
         # 串口接收线程
         self.serial_thread = None
-        # 串口自动发送线程
-        self.serial_autosend_thread = None
         self.settingsMenu = None
-        self.autosave_timer = None
-        self.serial_port_item = None
+        self.autosave_writer = None
+        # 接收编码及解码错误处理方式
+        self.recv_encoding = ENCODINGS[0]
+        self.recv_errors = ERROR_POLICIES[0]
+        # 发送队列
+        self.send_queue_size = SEND_QUEUE_SIZE
+        self.send_policy = BACKPRESSURE_POLICIES[0]
+        # 接收数据模型及显示区
+        self.recv_model = None
+        self.recv_view = None
+        # 接收到的原始字节及十六进制转储显示
+        self.byte_store = ByteStore()
+        self.hex_dump_model = None
+        self.hex_dump_view = None
+        self.recv_stack = None
+        # 多串口会话：串口列表、定时刷新及捕获文件由会话管理统一提供，本窗口的串口作为其中一个会话
+        self.session_manager = SessionManager(self)
+        self.main_session = None
+        self.session_window = None
+        self.traffic_label = None
+        # 文件发送
+        self.file_sender = None
+        self.file_progress = None
+        self.file_protocol = None
+        self.file_chunk_size = FILE_CHUNK_SIZE
+        self.file_chunk_delay = 0
+        # 接收分帧
+        self.framer_name = FRAMERS[0]
+        self.framer_options = ''
+        # 帧校验
+        self.checksum = ''
+        self.checksum_label = None
+        # 断开后自动重连及连接状态显示
+        self.auto_reconnect = True
+        self.connection_label = None
+        # 串口错误提示，已显示时只更新内容
+        self.error_box = None
 
         self.ui = Ui_MainWindow.Ui_MainWindow()
         # 这个函数本身需要传递一个MainWindow类，而该类本身就继承了这个，所以可以直接传入self
@@ -72,7 +119,11 @@ class SerialPort(QMainWindow):
 
     def __del__(self):
         self.__del_shortcut_autosave__()
-        self.handler_autosave()
+        self.stop_file_send()
+        self.stop_autosave()
+        if self.session_window:
+            self.session_window.close()
+        self.session_manager.stop()
 
     def closeEvent(self, event):
         self.__del__()
@@ -95,9 +146,9 @@ class SerialPort(QMainWindow):
         :return:
         """
         # 串口列表
-        ports = list(serial.tools.list_ports.comports())
-        for port in ports:
-            self.ui.comboBox.addItem(port[0])
+        self.session_manager.refresh_ports()
+        for info in self.session_manager.registry.ports:
+            insert_port_item(self.ui.comboBox, info)
 
         # 设置波特率
         for baud_rate in [1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200, 460800, 921600, 230400, 1500000]:
@@ -155,9 +206,11 @@ class SerialPort(QMainWindow):
             if settings_dict['comboBox_3'] == 0:
                 self.ui.radioButton_3.setChecked(False)
                 self.ui.radioButton_4.setChecked(True)
+                self.ckb_data_format_ascii_clicked()
             else:
                 self.ui.radioButton_3.setChecked(True)
                 self.ui.radioButton_4.setChecked(False)
+                self.ckb_data_format_hex_clicked()
             # 发送编码
             if settings_dict['comboBox_4'] == 0:
                 self.ui.radioButton.setChecked(False)
@@ -175,6 +228,25 @@ class SerialPort(QMainWindow):
             self.ui.comboBox_5.setCurrentIndex(settings_dict['comboBox_7'])
             # 停止位设置
             self.ui.comboBox_3.setCurrentIndex(settings_dict['comboBox_8'])
+            # 接收编码
+            self.recv_encoding = ENCODINGS[settings_dict.get('comboBox_10', 0)]
+            self.recv_errors = ERROR_POLICIES[settings_dict.get('comboBox_11', 0)]
+            self.handler_recv_encoding()
+            # 发送队列
+            self.send_queue_size = int(settings_dict.get('lineEdit_7') or SEND_QUEUE_SIZE)
+            self.send_policy = BACKPRESSURE_POLICIES[settings_dict.get('comboBox_13', 0)]
+            # 文件发送
+            self.file_chunk_size = int(settings_dict.get('lineEdit_8') or FILE_CHUNK_SIZE)
+            self.file_chunk_delay = int(settings_dict.get('lineEdit_9') or 0)
+            # 接收分帧
+            self.framer_name = FRAMERS[settings_dict.get('comboBox_14', 0)]
+            self.framer_options = settings_dict.get('lineEdit_10', '')
+            # 帧校验
+            self.checksum = ([''] + CHECKSUMS)[settings_dict.get('comboBox_15', 0)]
+            # 多串口会话后端
+            self.session_manager.backend = BACKENDS[settings_dict.get('comboBox_16', 0)]
+            # 断开后自动重连
+            self.auto_reconnect = settings_dict.get('checkBox_6', True)
             # 时间戳
             self.ui.checkBox_7.setChecked(settings_dict['checkBox'])
             # 输出显示
@@ -225,19 +297,80 @@ class SerialPort(QMainWindow):
         初始化串口数据接收区
         :return:
         """
-        # 设置为只读且每次自动滚动到后一行
-        self.ui.textBrowser.setReadOnly(True)
-        self.ui.textBrowser.textChanged.connect(
-            lambda: self.ui.textBrowser.moveCursor(QTextCursor.End)
-        )
+        # 用虚拟化的列表视图替换textBrowser，位于底部时自动跟随新数据
+        self.recv_model = RecvLogModel(self)
+        self.recv_view = RecvLogView(self.ui.centralwidget)
+        self.recv_view.setObjectName("recvLogView")
+        self.recv_view.setModel(self.recv_model)
+        # 十六进制转储视图，从byte_store按需生成可见的行
+        self.hex_dump_model = HexDumpModel(self.byte_store, self)
+        self.hex_dump_view = RecvLogView(self.ui.centralwidget)
+        self.hex_dump_view.setObjectName("hexDumpView")
+        self.hex_dump_view.setModel(self.hex_dump_model)
+        self.recv_stack = QStackedWidget(self.ui.centralwidget)
+        self.recv_stack.addWidget(self.recv_view)
+        self.recv_stack.addWidget(self.hex_dump_view)
+        self.ui.horizontalLayout_11.replaceWidget(self.ui.textBrowser, self.recv_stack)
+        self.ui.textBrowser.hide()
+        # 工具菜单中切换十六进制转储显示
+        self.action_hex_dump = QAction("十六进制转储", self)
+        self.action_hex_dump.setCheckable(True)
+        self.action_hex_dump.toggled.connect(self.handler_hex_dump)
+        self.ui.menu_3.addAction(self.action_hex_dump)
+        # 时间戳、显示输出选项修改后已有数据按新选项显示
+        self.ui.checkBox.toggled.connect(self.handler_display_options)
+        self.ui.checkBox_7.toggled.connect(self.handler_display_options)
+        self.handler_display_options()
+        self.recv_model.data_format = 'hex' if self.ui.radioButton_3.isChecked() else 'ascii'
+        self.handler_recv_encoding()
         self.ui.radioButton_3.clicked.connect(self.ckb_data_format_hex_clicked)
         self.ui.radioButton_4.clicked.connect(self.ckb_data_format_ascii_clicked)
+        # 帧校验统计
+        self.checksum_label = QLabel(self.ui.statusbar)
+        self.checksum_label.hide()
+        self.ui.statusbar.addPermanentWidget(self.checksum_label)
+        # 连接状态
+        self.connection_label = QLabel(self.ui.statusbar)
+        self.connection_label.hide()
+        self.ui.statusbar.addPermanentWidget(self.connection_label)
+        # 收发字节数及速率
+        self.traffic_label = QLabel(self.ui.statusbar)
+        self.ui.statusbar.addPermanentWidget(self.traffic_label)
+        self.session_manager.counters_updated.connect(self.handler_traffic)
+
+    def handler_hex_dump(self, checked):
+        """
+        切换接收区显示方式
+        :param checked: True显示十六进制转储
+        :return:
+        """
+        self.recv_stack.setCurrentWidget(self.hex_dump_view if checked else self.recv_view)
+
+    def handler_recv_encoding(self):
+        """
+        同步接收编码
+        :return:
+        """
+        if self.recv_model:
+            self.recv_model.set_encoding(self.recv_encoding, self.recv_errors)
+        if self.serial_thread:
+            self.serial_thread.encoding = self.recv_encoding
+
+    def handler_display_options(self):
+        """
+        同步接收区显示选项
+        :return:
+        """
+        self.recv_model.set_display_options(self.ui.checkBox.isChecked(), self.ui.checkBox_7.isChecked())
 
     def ckb_data_format_hex_clicked(self):
         """
 
         :return:
         """
+        # 已接收的数据按新格式重新显示
+        if self.recv_model:
+            self.recv_model.data_format = 'hex'
         if self.serial_thread:
             self.serial_thread.data_format_recv = 'hex'
 
@@ -246,6 +379,8 @@ class SerialPort(QMainWindow):
 
         :return:
         """
+        if self.recv_model:
+            self.recv_model.data_format = 'ascii'
         if self.serial_thread:
             self.serial_thread.data_format_recv = 'ascii'
 
@@ -267,27 +402,43 @@ class SerialPort(QMainWindow):
             if not self.__validata_setting__():
                 return
 
+            try:
+                framer = make_framer(self.framer_name, self.framer_options)
+            except ValueError as e:
+                QMessageBox.warning(self, '分帧参数错误', str(e))
+                return
             # 建立一个串口
             self.serial_thread = SerialThread(
-                self.ui.comboBox.currentText(),  # 端口
+                self.ui.comboBox.currentData(),  # 端口
                 self.ui.comboBox_2.currentData(),  # 波特率
                 self.ui.comboBox_4.currentData(),  # 数据位
                 self.ui.comboBox_5.currentData(),  # 校验位
                 self.ui.comboBox_3.currentData(),  # 停止位
                 'hex' if self.ui.radioButton.isChecked() else 'ascii',
                 'hex' if self.ui.radioButton_3.isChecked() else 'ascii',
-                self.ui.checkBox_2.isChecked()
+                self.ui.checkBox_2.isChecked(),
+                byte_store=self.byte_store,
+                encoding=self.recv_encoding,
+                send_queue_size=self.send_queue_size,
+                send_policy=self.send_policy,
+                framer=framer,
+                checksum=self.checksum,
+                reconnect=self.auto_reconnect,
+                resolver=self.session_manager.port_resolver(self.ui.comboBox.currentData())
             )
             # 串口线程操作
             self.serial_thread.data_received.connect(
-                lambda data_received: self.handle_data_display(
-                    data_received,
-                    "recv as " + ('hex' if self.ui.radioButton_3.isChecked() else 'asc')
-                )
+                lambda data_received: self.handle_batch_display(data_received, "recv")
             )
             self.serial_thread.serial_error.connect(self.handler_serial_error)
+            self.serial_thread.data_sent.connect(self.handler_auto_send_display)
+            self.serial_thread.connection_state.connect(self.handler_connection_state)
+            self.main_session = self.session_manager.attach(self.serial_thread, self.ui.comboBox.currentData())
+            self.checksum_label.setVisible(bool(self.checksum))
+            self.checksum_label.clear()
             self.serial_thread.start()
-            self.auto_save_timer_thread()  # 重新加载自动保存
+            if self.ui.checkBox_6.isChecked():
+                self.start_autosave()  # 重新加载自动保存
             # ui界面操作
             self.ui.comboBox.setEnabled(False)
             self.ui.comboBox_2.setEnabled(False)
@@ -301,25 +452,64 @@ class SerialPort(QMainWindow):
             self.ui.lineEdit_2.setEnabled(True)
             self.ui.pushButton_2.setText("关闭串口")
         else:
+            self.close_serial_connection()
+
+    def close_serial_connection(self):
+        """
+        关闭串口
+        :return:
+        """
+        if self.serial_thread:
             # 串口线程操作
-            if self.serial_autosend_thread:
-                self.serial_autosend_thread.stop()  # 防止在自动发送时关闭串口导致连续弹窗问题
-            if self.autosave_timer:
-                self.autosave_timer.stop()
+            self.stop_auto_send()  # 防止在自动发送时关闭串口导致连续弹窗问题
+            self.stop_file_send()
+            self.session_manager.detach(self.main_session)
+            self.main_session = None
             self.serial_thread.stop()
-            # ui界面操作
-            self.ui.checkBox_8.setChecked(False)
-            self.ui.comboBox.setEnabled(True)
-            self.ui.comboBox_2.setEnabled(True)
-            self.ui.comboBox_3.setEnabled(True)
-            self.ui.comboBox_4.setEnabled(True)
-            self.ui.comboBox_5.setEnabled(True)
-            self.ui.pushButton.setEnabled(False)
-            self.ui.pushButton_3.setEnabled(False)
-            self.ui.checkBox_8.setEnabled(False)
-            self.ui.label_8.setEnabled(False)
-            self.ui.lineEdit_2.setEnabled(False)
-            self.ui.pushButton_2.setText("打开串口")
+            self.stop_autosave()
+        # ui界面操作
+        self.ui.checkBox_8.setChecked(False)
+        self.ui.comboBox.setEnabled(True)
+        self.ui.comboBox_2.setEnabled(True)
+        self.ui.comboBox_3.setEnabled(True)
+        self.ui.comboBox_4.setEnabled(True)
+        self.ui.comboBox_5.setEnabled(True)
+        self.ui.pushButton.setEnabled(False)
+        self.ui.pushButton_3.setEnabled(False)
+        self.ui.checkBox_8.setEnabled(False)
+        self.ui.label_8.setEnabled(False)
+        self.ui.lineEdit_2.setEnabled(False)
+        self.ui.pushButton_2.setText("打开串口")
+
+    def handler_connection_state(self, state, detail):
+        """
+        串口连接状态变化，断开重连只在状态栏显示，不弹窗
+        :param state:   CONNECTED/RECONNECTING/DISCONNECTED
+        :param detail:  串口号或断开原因
+        :return:
+        """
+        stats = self.serial_thread.reconnect_stats if self.serial_thread else None
+        if state == RECONNECTING:
+            self.connection_label.setText("串口已断开，正在重连…（{}）".format(detail))
+            self.connection_label.show()
+        elif state == CONNECTED:
+            if not stats or not stats.reconnects:
+                self.connection_label.hide()
+                return
+            # 设备名可能已变化
+            index = self.ui.comboBox.findData(detail)
+            if index >= 0:
+                self.ui.comboBox.setCurrentIndex(index)
+            if self.main_session:
+                self.main_session.name = detail
+            self.connection_label.setText("已重连{}".format(detail))
+            self.connection_label.setToolTip(str(stats))
+            self.ui.statusbar.showMessage("已重连{}：{}".format(detail, stats))
+        elif state == DISCONNECTED:
+            self.close_serial_connection()
+            self.connection_label.setText("串口已断开")
+            self.connection_label.setToolTip(detail)
+            self.connection_label.show()
 
     def __validata_setting__(self):
         """
@@ -351,28 +541,36 @@ class SerialPort(QMainWindow):
         :param error:
         :return:
         """
-        QMessageBox.critical(self, '错误', error)
+        # 已有错误提示时只更新内容，不重复弹窗
+        if self.error_box is None:
+            self.error_box = QMessageBox(QMessageBox.Critical, '错误', error, QMessageBox.Ok, self)
+            self.error_box.setModal(False)
+        else:
+            self.error_box.setText(error)
+        self.error_box.show()
 
     def handle_data_display(self, data, data_from: str):
         """
-        将数据显示到textBrowser
+        将数据显示到接收区
         :param data_from: 数据来源（send/recv）
         :param data:接收到的数据
         :return:
         """
-        # 获取时间
-        current_time = QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm:ss")
-        display_str = ""
-        # 超过5000字符清空
-        if len(self.ui.textBrowser.toPlainText()) > 5000:
-            self.ui.textBrowser.clear()
-        # 更新显示区域中的数据
-        if self.ui.checkBox.isChecked():  # 输出显示
-            display_str += f"[{data_from}]"
-        if self.ui.checkBox_7.isChecked():  # 时间戳
-            display_str += f"[{current_time}]"
-        display_str += f"{data}"
-        self.ui.textBrowser.insertPlainText(display_str)
+        self.handle_batch_display([data], data_from)
+
+    def handle_batch_display(self, data_list, data_from: str):
+        """
+        将一批数据一次性显示到接收区
+        :param data_list: 数据列表，接收的原始数据为bytes，发送回显为str
+        :param data_from: 数据来源（send/recv）
+        :return:
+        """
+        # 数据来源和时间戳在显示时才格式化
+        current_time = time.time()
+        self.recv_model.append_records([(current_time, data_from, data) for data in data_list])
+        self.hex_dump_model.refresh()
+        if self.serial_thread and self.serial_thread.checksum_stage:
+            self.checksum_label.setText(str(self.serial_thread.checksum_stage))
 
         # 必须是hex格式
         if self.ui.radioButton_2.isChecked():
@@ -411,17 +609,21 @@ class SerialPort(QMainWindow):
 
     def handler_auto_send_data(self):
         """
-        创建`serial_autosend_thread`线程每隔`timelength`返回一个True信号
+        发送区的数据只编码一次，由串口线程每隔`timelength`直接写入串口
         :return:
         """
         if self.ui.checkBox_8.isChecked():
+            if not self.serial_thread or not self.serial_thread.isRunning():
+                QMessageBox.warning(self, "Warning", "请先打开串口！")
+                self.ui.checkBox_8.setChecked(False)
+                return
             timelength = self.ui.lineEdit_2.text()
             if timelength == '':
                 QMessageBox.warning(self, "warning", "设置周期时间！")
                 self.ui.checkBox_8.setChecked(False)
                 return
             try:
-                timelength = int(timelength)
+                timelength = float(timelength)
             except ValueError as e:
                 QMessageBox.warning(self, "warning", str(e))
                 self.ui.checkBox_8.setChecked(False)
@@ -430,12 +632,41 @@ class SerialPort(QMainWindow):
                 QMessageBox.warning(self, "warning", "周期时间太短！")
                 self.ui.checkBox_8.setChecked(False)
                 return
-            self.serial_autosend_thread = timeClock(timelength)
-            self.serial_autosend_thread.timeout.connect(self.send_serial_data)
-            self.serial_autosend_thread.start()
+            data = self.ui.textEdit.toPlainText()
+            try:
+                payload = self.serial_thread.encode_data(data)
+            except ValueError as e:
+                QMessageBox.warning(self, "warning", str(e))
+                self.ui.checkBox_8.setChecked(False)
+                return
+            if not payload:
+                QMessageBox.warning(self, "warning", "发送内容为空！")
+                self.ui.checkBox_8.setChecked(False)
+                return
+            self.serial_thread.start_auto_send(payload, timelength)
         else:
-            if self.serial_autosend_thread and self.serial_autosend_thread.isRunning:
-                self.serial_autosend_thread.stop()
+            self.stop_auto_send()
+
+    def stop_auto_send(self):
+        """
+        停止自动发送，在状态栏显示周期及发送队列统计
+        :return:
+        """
+        if not self.serial_thread:
+            return
+        self.serial_thread.stop_auto_send()
+        if self.serial_thread.auto_send_stats:
+            self.ui.statusbar.showMessage("定时发送：{}；发送{}".format(
+                self.serial_thread.auto_send_stats, self.serial_thread.send_stats))
+
+    def handler_auto_send_display(self, data_list):
+        """
+        显示输出自动发送的数据
+        :param data_list:
+        :return:
+        """
+        if self.ui.checkBox.isChecked():
+            self.handle_batch_display(data_list, "send")
 
     def __init_auto_line__(self):
         self.ui.checkBox_2.clicked.connect(self.handler_auto_line_data)
@@ -466,10 +697,7 @@ class SerialPort(QMainWindow):
         sent = self.sender().text()
         child_lineEdit = self.ui.scrollArea.findChild(QLineEdit, 'le_{}'.format(sent))
 
-        # 通过ascii发送
-        self.ui.radioButton_2.setChecked(True)
-        self.serial_thread.data_format_send = 'ascii'
-
+        # 按当前发送格式发送，十六进制数据按设置附加校验值
         try:
             data = child_lineEdit.text()
             self.serial_thread.send_data(data)
@@ -493,6 +721,17 @@ class SerialPort(QMainWindow):
         self.ui.action_7.triggered.connect(self.handler_shortcutCleanup)
         self.ui.actionabout_UartAssistant_v1_0.triggered.connect(self.handler_aboutUartAssistant)
         self.ui.action_8.triggered.connect(self.handler_cleanup_recv)
+        # 捕获文件
+        self.action_capture = QAction("开始捕获", self)
+        self.action_capture.setCheckable(True)
+        self.action_capture.triggered.connect(self.handler_capture)
+        self.action_replay = QAction("回放捕获文件", self)
+        self.action_replay.triggered.connect(self.handler_replay_capture)
+        self.ui.menu.insertActions(self.ui.action_5, [self.action_capture, self.action_replay])
+        # 多串口会话
+        self.action_sessions = QAction("多串口会话", self)
+        self.action_sessions.triggered.connect(self.handler_sessions)
+        self.ui.menu_3.addAction(self.action_sessions)
 
     @staticmethod
     def handler_help(self):
@@ -507,14 +746,16 @@ class SerialPort(QMainWindow):
         webbrowser.open(url)
 
     def handler_cleanup_recv(self):
-        self.ui.textBrowser.clear()
+        self.recv_model.clear()
+        self.byte_store.clear()
+        self.hex_dump_model.refresh()
 
     def handler_saveFile(self):
         """
         顶部菜单保存
         :return:
         """
-        text = self.ui.textBrowser.toPlainText()
+        text = self.recv_model.text()
         if text == '':
             QMessageBox.warning(self, 'empty file', 'nothing to save')
             return
@@ -524,6 +765,61 @@ class SerialPort(QMainWindow):
         file = open(save_path[0], 'w')
         file.write(text)
 
+    def handler_capture(self, checked):
+        """
+        开始/停止捕获，所有会话的串口线程将收发的原始数据及时间戳持续写入同一个捕获文件，按会话通道号区分
+        :param checked:
+        :return:
+        """
+        if checked:
+            save_path = QFileDialog.getSaveFileName(self, "设置路径", "./", "Capture Files (*.uacap)")
+            if save_path[0] == '':
+                self.action_capture.setChecked(False)
+                return
+            try:
+                self.session_manager.start_capture(save_path[0])
+            except OSError as e:
+                QMessageBox.warning(self, 'warning', str(e))
+                self.action_capture.setChecked(False)
+                return
+            self.action_capture.setText("停止捕获")
+        else:
+            self.session_manager.stop_capture()
+            self.action_capture.setText("开始捕获")
+
+    def handler_sessions(self):
+        """
+        打开多串口会话窗口，与本窗口共享串口列表、定时刷新和捕获文件
+        :return:
+        """
+        if not self.session_window:
+            self.session_window = SessionWindow(self.session_manager)
+        elif not self.session_window.tabs.count():
+            self.session_window.add_session()
+        self.session_window.setStyleSheet(self.styleSheet())
+        self.session_window.show()
+        self.session_window.raise_()
+
+    def handler_traffic(self):
+        if self.main_session:
+            self.traffic_label.setText(str(self.main_session))
+
+    def handler_replay_capture(self):
+        """
+        在单独的回放窗口中打开捕获文件，数据块按需从文件映射读取，不进入实时接收区
+        :return:
+        """
+        file_path = QFileDialog.getOpenFileName(self, "选择文件", "./", "Capture Files (*.uacap)")
+        if file_path[0] == '':
+            return
+        try:
+            window = CaptureReplayWindow(file_path[0], self, self.recv_encoding, self.recv_errors)
+        except (OSError, CaptureFormatError) as e:
+            QMessageBox.warning(self, '文件打开失败', str(e))
+            return
+        window.setStyleSheet(self.styleSheet())
+        window.show()
+
     def handler_exportShortcut(self):
         """
         导出快捷发送中的内容到文件（*.）中
@@ -613,6 +909,20 @@ class SerialPort(QMainWindow):
             chile_lineEdit.clear()
 
     def __init_sendFile__(self):
+        # 文件发送进度
+        self.file_progress = QProgressBar(self.ui.statusbar)
+        self.file_progress.setRange(0, 1000)
+        self.file_progress.setTextVisible(False)
+        self.file_progress.setMaximumWidth(200)
+        self.file_progress.hide()
+        self.ui.statusbar.addPermanentWidget(self.file_progress)
+        # 发送协议
+        self.file_protocol = QComboBox(self.ui.tab_3)
+        self.file_protocol.setObjectName("file_protocol")
+        self.file_protocol.addItem("直接发送", '')
+        for protocol, name in zip(PROTOCOLS, ['XMODEM', 'XMODEM-1K', 'YMODEM']):
+            self.file_protocol.addItem(name, protocol)
+        self.ui.verticalLayout.insertWidget(self.ui.verticalLayout.indexOf(self.ui.pushButton_5), self.file_protocol)
         self.ui.toolButton.clicked.connect(self.handler_selectFile)
         self.ui.pushButton_4.clicked.connect(self.handler_confirmSelect)
         self.ui.pushButton_5.clicked.connect(self.handler_send_file)
@@ -624,92 +934,179 @@ class SerialPort(QMainWindow):
         self.ui.lineEdit.setText(file_path[0])
 
     def handler_confirmSelect(self):
+        """
+        预览文件开头的一部分，文件内容在发送时按块读取，不加载到控件中
+        :return:
+        """
         file_path = self.ui.lineEdit.text()
         if file_path == '':
             QMessageBox.warning(self, '未选择文件', '请先选择文件')
             return
         try:
-            with open(file_path, 'r') as file:
-                exportStr = file.read()
-                self.ui.textBrowser_2.setText(exportStr)
+            size, head = read_preview(file_path)
         except Exception as e:
             QMessageBox.warning(self, '文件打开失败', str(e))
             self.ui.textBrowser_2.clear()
+            return
+        # 文本文件显示文本，二进制文件显示十六进制转储
+        preview = None
+        if b'\x00' not in head:
+            try:
+                # 末尾可能截断了多字节字符
+                preview = StreamDecoder('utf-8').align(head).decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+        if preview is None:
+            preview = '\n'.join(hex_dump(head))
+        if size > len(head):
+            preview += '\n...（仅显示前{}字节）'.format(len(head))
+        self.ui.textBrowser_2.setPlainText('文件大小：{}字节\n\n{}'.format(size, preview))
 
     def handler_send_file(self):
+        """
+        发送文件，发送中再次点击取消发送
+        :return:
+        """
+        if self.file_sender and self.file_sender.isRunning():
+            self.file_sender.cancel()
+            return
         if not self.serial_thread or not self.serial_thread.isRunning():
             QMessageBox.warning(self, "Warning", "请先打开串口！")
             return
-        self.ui.radioButton_2.setChecked(True)
-        self.serial_thread.data_format_send = 'ascii'
-        self.ui.checkBox_2.setChecked(True)
-        data = self.ui.textBrowser_2.toPlainText()
-        if data == '':
+        file_path = self.ui.lineEdit.text()
+        if file_path == '':
+            QMessageBox.warning(self, '未选择文件', '请先选择文件')
             return
-        self.serial_thread.send_data(data)
-        if self.ui.checkBox.isChecked():  # 打开显示输出
-            self.handle_data_display(data + "\r\n",
-                                     "send as " + ('hex' if self.ui.radioButton.isChecked() else 'asc'))
+        protocol = self.file_protocol.currentData()
+        if protocol:
+            # XMODEM/YMODEM由接收端的应答控制速度
+            self.file_sender = ModemFileSender(file_path, self.serial_thread, protocol)
+        else:
+            # 未设置块间隔时按波特率控制发送速度
+            bytes_per_sec = 0.0
+            if not self.file_chunk_delay:
+                bytes_per_sec = line_rate(self.serial_thread.baud_rate, self.serial_thread.data_bits,
+                                          self.serial_thread.parity_bits, self.serial_thread.stop_bits)
+            self.file_sender = FileSender(file_path, self.serial_thread, self.file_chunk_size,
+                                          bytes_per_sec, self.file_chunk_delay / 1000)
+        self.file_sender.progress.connect(self.handler_file_progress)
+        self.file_sender.send_done.connect(self.handler_file_done)
+        self.file_sender.send_error.connect(lambda error: QMessageBox.warning(self, '文件发送失败', error))
+        self.file_progress.setValue(0)
+        self.file_progress.show()
+        self.ui.pushButton_5.setText("取消发送")
+        self.file_protocol.setEnabled(False)
+        self.file_sender.start()
+
+    def handler_file_progress(self, written, total, rate, eta):
+        """
+        在状态栏显示文件发送进度
+        :return:
+        """
+        self.file_progress.setValue(int(written * 1000 / total) if total else 1000)
+        message = '文件发送：{}/{}字节，{:.0f}字节/秒'.format(written, total, rate)
+        if eta >= 0:
+            message += '，剩余{:.1f}秒'.format(eta)
+        self.ui.statusbar.showMessage(message)
+
+    def handler_file_done(self, complete, written, elapsed):
+        self.file_progress.hide()
+        self.ui.pushButton_5.setText("发送内容")
+        self.file_protocol.setEnabled(True)
+        message = '文件发送{}：{}字节，用时{:.1f}秒，{:.0f}字节/秒'.format(
+            '完成' if complete else '未完成', written, elapsed, written / elapsed if elapsed > 0 else 0)
+        if isinstance(self.file_sender, ModemFileSender):
+            message += '，重发{}次'.format(self.file_sender.retransmits)
+        self.ui.statusbar.showMessage(message)
+
+    def stop_file_send(self):
+        """
+        取消正在进行的文件发送并等待线程结束
+        :return:
+        """
+        if self.file_sender and self.file_sender.isRunning():
+            self.file_sender.cancel()
+            self.file_sender.wait()
 
     def __init_autosave__(self):
-        self.ui.checkBox_6.clicked.connect(self.auto_save_timer_thread)
+        self.ui.checkBox_6.clicked.connect(self.handler_autosave)
 
     def handler_autosave(self):
         """
-        自动保存
+        自动保存选项
         :return:
         """
-        if self.ui.checkBox_6.isChecked():
-            date = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
-            data = self.ui.textBrowser.toPlainText()
-            with open(os.path.join(BASE_PATH, 'settings.json'), 'r') as file:
-                jsonDir = file.read()
-                jsonDir = json.loads(jsonDir)
-                file_path = jsonDir['lineEdit']
-                print(file_path)
-                if file_path == '':
-                    file_path = BASE_PATH
-            try:
-                with open(os.path.join(file_path, f'{date}_autosave.txt'), 'w') as file:
-                    file.write(data)
-            except Exception as e:
-                QMessageBox.warning(self, 'warning', str(e))
+        if not self.ui.checkBox_6.isChecked():
+            self.stop_autosave()
+        elif self.serial_thread and self.serial_thread.isRunning():
+            self.start_autosave()
 
-    def auto_save_timer_thread(self):
-        if not self.serial_thread or not self.serial_thread.isRunning():
+    def start_autosave(self):
+        """
+        创建自动保存线程，串口线程收发的数据持续写入文件
+        保存目录为设置中的路径，勾选定时保存时按设置的间隔写入磁盘，超过分割大小/时间后新建文件
+        :return:
+        """
+        if self.autosave_writer or not self.serial_thread:
             return
-        if self.ui.checkBox_6.isChecked():
+        file_path = ''
+        flush_interval = AUTOSAVE_FLUSH_INTERVAL
+        policy = RotationPolicy()
+        try:
             with open(os.path.join(BASE_PATH, 'settings.json'), 'r') as file:
-                jsonDir = file.read()
-                jsonDir = json.loads(jsonDir)
-                if jsonDir['checkBox_5'] and (not self.autosave_timer or not self.autosave_timer.isRunning):
-                    self.autosave_timer = timeClock(1000 * int(jsonDir['lineEdit_2']))
-                    self.autosave_timer.start()
-                    self.autosave_timer.timeout.connect(self.handler_autosave)
-                else:
-                    if self.autosave_timer and self.autosave_timer.isRunning:
-                        self.autosave_timer.stop()
-        else:
-            if self.autosave_timer and self.autosave_timer.isRunning:
-                self.autosave_timer.stop()
+                jsonDir = json.loads(file.read())
+            file_path = jsonDir['lineEdit']
+            if jsonDir['checkBox_5']:
+                flush_interval = int(jsonDir['lineEdit_2'])
+            policy = RotationPolicy(
+                max_bytes=int(jsonDir.get('lineEdit_4', 0)) * 1024 * 1024,
+                max_age=int(jsonDir.get('lineEdit_5', 0)) * 3600,
+                max_files=int(jsonDir.get('lineEdit_6', 0)),
+                compress=COMPRESS_FORMATS[jsonDir.get('comboBox_12', 0)]
+            )
+        except (OSError, KeyError, ValueError, IndexError):
+            pass
+        if file_path == '':
+            file_path = BASE_PATH
+        self.autosave_writer = AutosaveWriter(
+            file_path,
+            flush_interval,
+            data_format='hex' if self.ui.radioButton_3.isChecked() else 'ascii',
+            encoding=self.recv_encoding,
+            policy=policy
+        )
+        self.autosave_writer.autosave_error.connect(self.handler_autosave_error)
+        self.autosave_writer.compress_error.connect(lambda error: QMessageBox.warning(self, 'warning', error))
+        self.autosave_writer.start()
+        self.serial_thread.add_sink(self.autosave_writer)
+
+    def stop_autosave(self):
+        """
+        停止自动保存，剩余数据写入文件后关闭
+        :return:
+        """
+        if not self.autosave_writer:
+            return
+        if self.serial_thread:
+            self.serial_thread.remove_sink(self.autosave_writer)
+        self.autosave_writer.stop()
+        self.autosave_writer = None
+
+    def handler_autosave_error(self, error):
+        if self.autosave_writer:
+            if self.serial_thread:
+                self.serial_thread.remove_sink(self.autosave_writer)
+            # 出错后写入线程仍在等待压缩任务结束，线程退出后才能释放
+            self.autosave_writer.wait()
+        self.autosave_writer = None
+        QMessageBox.warning(self, 'warning', error)
 
     def __init_autoRefresh__(self, ):
         """
         自动刷新串口列表
-        AUTO_REFRESH_INTERVAL:刷新间隔时间
+        由会话管理的热插拔检测线程在设备变化时枚举串口，串口注册表按增减逐项更新下拉框，当前选择不受影响
         :return:
         """
-        self.autoRefresh_timer = timeClock(AUTO_REFRESH_INTERVAL)
-        self.autoRefresh_timer.start()
-        self.autoRefresh_timer.timeout.connect(self.handler_autoRefresh)
-
-    def handler_autoRefresh(self):
-        if self.serial_thread and self.autoRefresh_timer.isRunning:
-            return
-        ports = list(serial.tools.list_ports.comports())
-        if ports == self.serial_port_item:
-            return
-        self.serial_port_item = ports
-        self.ui.comboBox.clear()
-        for port in ports:
-            self.ui.comboBox.addItem(port[0])
+        registry = self.session_manager.registry
+        registry.port_added.connect(lambda info: insert_port_item(self.ui.comboBox, info))
+        registry.port_removed.connect(lambda info: remove_port_item(self.ui.comboBox, info))
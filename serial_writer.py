@@ -0,0 +1,173 @@
+"""
+serial_writer.py
+串口发送线程
+界面线程、自动发送线程只把数据放入有界的发送队列，由本线程依次写入串口
+串口输出缓冲区满时只阻塞本线程，界面不会卡住，串口对象的写操作也只在一个线程中进行
+"""
+import collections
+import threading
+
+from PyQt5.QtCore import *
+
+# 队列满时的处理方式：阻塞等待、丢弃最早的数据、拒绝新数据
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+REJECT = 'reject'
+BACKPRESSURE_POLICIES = [BLOCK, DROP_OLDEST, REJECT]
+# 默认队列长度(条)
+SEND_QUEUE_SIZE = 256
+# BLOCK方式的最长等待时间(s)，超时后按拒绝处理，避免调用线程长时间卡住
+SEND_BLOCK_TIMEOUT = 1.0
+
+
+class SendQueueStats:
+    """
+    发送队列统计
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.max_depth = 0
+        self.queued_bytes = 0
+        self.writes = 0
+        self.written_bytes = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def __str__(self):
+        return '队列{}条(最多{}条), 已发送{}次{}字节, 丢弃{}次, 拒绝{}次'.format(
+            self.depth, self.max_depth, self.writes, self.written_bytes, self.dropped, self.rejected)
+
+
+class SerialWriter(QThread):
+    """
+    发送线程
+    """
+    # 一条数据写入完成，参数为submit返回的序号、字节数
+    write_done = pyqtSignal(int, int)
+    # 一条数据未写入（队列满时被丢弃、写入失败或停止时仍在队列中），参数为submit返回的序号
+    write_dropped = pyqtSignal(int)
+    write_error = pyqtSignal(str)
+
+    def __init__(self, maxsize=SEND_QUEUE_SIZE, policy=BLOCK, block_timeout=SEND_BLOCK_TIMEOUT, on_written=None):
+        """
+        初始化
+        :param maxsize:         队列长度(条)
+        :param policy:          队列满时的处理方式 BLOCK/DROP_OLDEST/REJECT
+        :param block_timeout:   BLOCK方式的最长等待时间(s)
+        :param on_written:      写入完成后在发送线程中调用on_written(payload, tag)
+        """
+        super().__init__()
+        if maxsize <= 0:
+            raise ValueError('maxsize must be positive')
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError('policy must be one of {}'.format(BACKPRESSURE_POLICIES))
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.on_written = on_written
+        self.port = None
+        self.stats = SendQueueStats()
+        self.__queue = collections.deque()
+        self.__cond = threading.Condition()
+        self.__seq = 0
+        self.__running = False
+
+    def __len__(self):
+        return len(self.__queue)
+
+    def open(self, port):
+        """
+        开始向串口写入
+        :param port: 已打开的串口，需实现write()
+        :return:
+        """
+        with self.__cond:
+            self.port = port
+            self.__queue.clear()
+            self.stats.depth = 0
+            self.stats.queued_bytes = 0
+            self.__running = True
+        self.start()
+
+    def submit(self, payload, tag=None):
+        """
+        数据放入发送队列，可在任意线程中调用
+        :param payload: 数据
+        :param tag:     原样传给on_written
+        :return: 序号，被拒绝时为0
+        """
+        payload = bytes(payload)
+        stats = self.stats
+        with self.__cond:
+            if not self.__running:
+                return 0
+            if len(self.__queue) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    dropped_seq, dropped, _ = self.__queue.popleft()
+                    stats.queued_bytes -= len(dropped)
+                    stats.dropped += 1
+                    self.write_dropped.emit(dropped_seq)
+                elif self.policy == BLOCK:
+                    self.__cond.wait_for(lambda: len(self.__queue) < self.maxsize or not self.__running,
+                                         self.block_timeout)
+                if len(self.__queue) >= self.maxsize or not self.__running:
+                    stats.rejected += 1
+                    return 0
+            self.__seq += 1
+            self.__queue.append((self.__seq, payload, tag))
+            stats.depth = len(self.__queue)
+            stats.max_depth = max(stats.max_depth, stats.depth)
+            stats.queued_bytes += len(payload)
+            self.__cond.notify_all()
+            return self.__seq
+
+    def run(self):
+        stats = self.stats
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__queue or not self.__running)
+                if not self.__running:
+                    return
+                seq, payload, tag = self.__queue.popleft()
+                stats.depth = len(self.__queue)
+                stats.queued_bytes -= len(payload)
+                # 唤醒等待队列空位的调用线程
+                self.__cond.notify_all()
+            try:
+                self.port.write(payload)
+            except Exception as e:
+                stats.errors += 1
+                self.write_dropped.emit(seq)
+                self.write_error.emit('发送失败!' + str(e))
+                continue
+            stats.writes += 1
+            stats.written_bytes += len(payload)
+            if self.on_written:
+                self.on_written(payload, tag)
+            self.write_done.emit(seq, len(payload))
+
+    def stop(self):
+        """
+        停止线程，队列中未写入的数据被丢弃
+        :return:
+        """
+        with self.__cond:
+            self.__running = False
+            dropped = [seq for seq, _, _ in self.__queue]
+            self.stats.dropped += len(dropped)
+            self.__queue.clear()
+            self.stats.depth = 0
+            self.stats.queued_bytes = 0
+            self.__cond.notify_all()
+        for seq in dropped:
+            self.write_dropped.emit(seq)
+        # 正在阻塞的写操作立即返回
+        cancel_write = getattr(self.port, 'cancel_write', None)
+        if cancel_write:
+            try:
+                cancel_write()
+            except Exception:
+                pass
+        self.wait()
@@ -0,0 +1,253 @@
+"""
+session_manager.py
+多串口会话管理
+一个进程中同时打开多个串口，每个串口一个SerialThread，共享：
+    一个定时调度器（界面线程中的单个QTimer，统计刷新等定时任务都挂在上面）
+    一个捕获文件（各串口写入不同的通道号）
+    一个串口注册表，由热插拔检测线程在设备变化时更新（见port_watcher.py、port_registry.py）
+每个会话统计收发字节数及速率
+会话的串口可以是独立的SerialThread，也可以由共用一个线程的SelectorBackend驱动（见selector_backend.py）
+"""
+import time
+
+from PyQt5.QtCore import *
+
+from capture_file import CaptureWriter, DIRECTION_RECV
+from port_registry import PortRegistry
+from port_watcher import PortWatcher, scan_ports
+from selector_backend import SelectorBackend, SelectorPort, THREAD, SELECTOR, selector_available
+from serialThread import SerialThread
+
+# 调度器的最小时间间隔(ms)
+SCHEDULER_TICK_MS = 100
+# 收发速率统计间隔(ms)
+COUNTER_INTERVAL = 1000
+
+
+def format_rate(rate):
+    """
+    格式化速率
+    :param rate: 字节/秒
+    :return:
+    """
+    if rate >= 1024 * 1024:
+        return '{:.1f}MB/s'.format(rate / 1024 / 1024)
+    if rate >= 1024:
+        return '{:.1f}KB/s'.format(rate / 1024)
+    return '{:.0f}B/s'.format(rate)
+
+
+class Session:
+    """
+    一个串口会话，作为sink加入SerialThread，统计收发字节数并写入共享的捕获文件
+    """
+
+    def __init__(self, channel, name, serial_thread):
+        """
+        初始化
+        :param channel:         通道号，捕获文件中区分串口
+        :param name:            会话名（串口号）
+        :param serial_thread:   SerialThread
+        """
+        self.channel = channel
+        self.name = name
+        self.serial_thread = serial_thread
+        # 打开时的串口信息（PortRegistry），用于设备名变化后找到同一个适配器
+        self.port_info = None
+        # 共享的捕获文件，由SessionManager设置
+        self.capture = None
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+        self.rx_rate = 0.0
+        self.tx_rate = 0.0
+        self.__last = (time.monotonic(), 0, 0)
+
+    def write(self, direction, payload, timestamp_ns=None):
+        """
+        sink接口，在串口线程/发送线程中调用
+        :param direction:
+        :param payload:
+        :param timestamp_ns:
+        :return:
+        """
+        if direction == DIRECTION_RECV:
+            self.rx_bytes += len(payload)
+        else:
+            self.tx_bytes += len(payload)
+        capture = self.capture
+        if capture is not None:
+            capture.write(direction, payload, timestamp_ns, self.channel)
+
+    def update_rates(self):
+        """
+        按上次调用以来的字节数计算速率
+        :return:
+        """
+        now = time.monotonic()
+        last_time, last_rx, last_tx = self.__last
+        elapsed = now - last_time
+        if elapsed <= 0:
+            return
+        rx_bytes, tx_bytes = self.rx_bytes, self.tx_bytes
+        self.rx_rate = (rx_bytes - last_rx) / elapsed
+        self.tx_rate = (tx_bytes - last_tx) / elapsed
+        self.__last = (now, rx_bytes, tx_bytes)
+
+    def __str__(self):
+        return '接收{}字节({}) 发送{}字节({})'.format(
+            self.rx_bytes, format_rate(self.rx_rate), self.tx_bytes, format_rate(self.tx_rate))
+
+
+class SessionManager(QObject):
+    """
+    会话管理，在界面线程中创建
+    """
+    # 各会话的速率已更新
+    counters_updated = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.sessions = []
+        self.registry = PortRegistry(self)
+        self.capture_writer = None
+        # 新会话使用的后端，THREAD/SELECTOR
+        self.backend = THREAD
+        self.__selector_backend = None
+        # 定时任务：[间隔(s), 下次执行的time.monotonic(), 回调]
+        self.__jobs = []
+        self.__timer = QTimer(self)
+        self.__timer.setInterval(SCHEDULER_TICK_MS)
+        self.__timer.timeout.connect(self.__on_tick__)
+        self.schedule(COUNTER_INTERVAL, self.update_counters)
+        self.__timer.start()
+        # 热插拔检测
+        self.port_watcher = PortWatcher()
+        self.port_watcher.ports_changed.connect(self.__on_ports_changed__)
+        self.port_watcher.start()
+
+    def schedule(self, interval_ms, callback):
+        """
+        添加定时任务，在界面线程中执行
+        :param interval_ms: 间隔(ms)，实际精度为SCHEDULER_TICK_MS
+        :param callback:    无参数的回调
+        :return:
+        """
+        self.__jobs.append([interval_ms / 1000, time.monotonic(), callback])
+
+    def unschedule(self, callback):
+        self.__jobs = [job for job in self.__jobs if job[2] != callback]
+
+    def __on_tick__(self):
+        now = time.monotonic()
+        for job in list(self.__jobs):
+            if now >= job[1]:
+                # 按固定间隔推进，处理耗时不会累积
+                job[1] = max(job[1] + job[0], now)
+                job[2]()
+
+    def refresh_ports(self):
+        """
+        立即枚举串口并更新注册表
+        :return:
+        """
+        self.registry.update(scan_ports())
+
+    def __on_ports_changed__(self, ports):
+        self.registry.update(ports)
+
+    def update_counters(self):
+        for session in self.sessions:
+            session.update_rates()
+        self.counters_updated.emit()
+
+    def create_port(self, port, baud_rate, data_bits, parity_bits, stop_bits, data_format_send, data_format_recv,
+                    auto_line, **kwargs):
+        """
+        按当前后端创建串口对象，参数与SerialThread相同，平台不支持selector时使用SerialThread
+        selector后端不支持断开重连，忽略reconnect/resolver参数，断开后发出serial_error
+        :return: SerialThread/SelectorPort，调用start()打开串口
+        """
+        args = (port, baud_rate, data_bits, parity_bits, stop_bits, data_format_send, data_format_recv, auto_line)
+        if self.backend == SELECTOR and selector_available():
+            if self.__selector_backend is None:
+                self.__selector_backend = SelectorBackend()
+            kwargs.pop('reconnect', None)
+            kwargs.pop('resolver', None)
+            return SelectorPort(self.__selector_backend, *args, **kwargs)
+        return SerialThread(*args, **kwargs)
+
+    def port_resolver(self, device):
+        """
+        生成重连时查找串口号的函数，按打开时的适配器（序列号/USB位置）查找，设备名变化后仍能重连
+        :param device:  打开的串口号
+        :return: 串口不在注册表中时为None，按原串口号重连
+        """
+        registry = self.registry
+        info = registry.get(device)
+        if info is None:
+            return None
+
+        def resolve():
+            current = registry.resolve(info)
+            return current.device if current else None
+        return resolve
+
+    def attach(self, serial_thread, name):
+        """
+        加入一个串口线程
+        :param serial_thread:
+        :param name:
+        :return: Session
+        """
+        used = {session.channel for session in self.sessions}
+        channel = next(channel for channel in range(len(used) + 1) if channel not in used)
+        session = Session(channel, name, serial_thread)
+        session.port_info = self.registry.get(name)
+        session.capture = self.capture_writer
+        self.sessions.append(session)
+        serial_thread.add_sink(session)
+        return session
+
+    def detach(self, session):
+        """
+        移除会话，串口线程由调用者停止
+        :param session:
+        :return:
+        """
+        if session not in self.sessions:
+            return
+        session.serial_thread.remove_sink(session)
+        session.capture = None
+        self.sessions.remove(session)
+
+    def start_capture(self, path):
+        """
+        开始捕获所有会话的数据
+        :param path:
+        :return:
+        :raises OSError:
+        """
+        self.stop_capture()
+        self.capture_writer = CaptureWriter(path)
+        for session in self.sessions:
+            session.capture = self.capture_writer
+
+    def stop_capture(self):
+        if not self.capture_writer:
+            return
+        for session in self.sessions:
+            session.capture = None
+        self.capture_writer.close()
+        self.capture_writer = None
+
+    def stop(self):
+        """
+        停止调度器、热插拔检测、selector后端并关闭捕获文件，串口线程由各自的所有者停止
+        :return:
+        """
+        self.__timer.stop()
+        self.port_watcher.stop()
+        if self.__selector_backend and self.__selector_backend.isRunning():
+            self.__selector_backend.stop()
+        self.stop_capture()
+
@@ -0,0 +1,258 @@
+"""
+session_window.py
+多串口会话窗口
+每个标签页一个串口会话，串口列表、定时刷新和捕获文件由SessionManager统一提供
+"""
+import time
+
+import serial
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+
+from port_registry import insert_port_item, remove_port_item
+from recv_log_view import RecvLogModel, RecvLogView
+from serialThread import CONNECTED, RECONNECTING, DISCONNECTED
+
+BAUD_RATES = [1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600, 1500000]
+DEFAULT_BAUD_RATE = 115200
+
+
+class SessionPanel(QWidget):
+    """
+    单个串口会话，固定8N1，串口对象由SessionManager按设置的后端创建
+    断开重连和错误只在面板的状态标签中显示，不弹窗；重连期间会话及捕获保持不变
+    """
+    # 串口打开/关闭后发出，参数为标签页标题
+    title_changed = pyqtSignal(str)
+
+    def __init__(self, manager, parent=None):
+        """
+        初始化
+        :param manager: SessionManager
+        :param parent:
+        """
+        super().__init__(parent)
+        self.manager = manager
+        self.serial_thread = None
+        self.session = None
+
+        self.port_combo = QComboBox(self)
+        self.baud_combo = QComboBox(self)
+        for baud_rate in BAUD_RATES:
+            self.baud_combo.addItem(str(baud_rate), baud_rate)
+        self.baud_combo.setCurrentIndex(BAUD_RATES.index(DEFAULT_BAUD_RATE))
+        self.open_button = QPushButton("打开串口", self)
+        self.recv_hex = QCheckBox("HEX显示", self)
+        self.counter_label = QLabel(self)
+        # 连接状态及错误提示
+        self.status_label = QLabel(self)
+        self.status_label.hide()
+        top = QHBoxLayout()
+        top.addWidget(self.port_combo)
+        top.addWidget(self.baud_combo)
+        top.addWidget(self.open_button)
+        top.addWidget(self.recv_hex)
+        top.addStretch(1)
+        top.addWidget(self.status_label)
+        top.addWidget(self.counter_label)
+
+        self.recv_model = RecvLogModel(self)
+        self.recv_model.set_display_options(True, True)
+        self.recv_view = RecvLogView(self)
+        self.recv_view.setModel(self.recv_model)
+
+        self.send_edit = QLineEdit(self)
+        self.send_hex = QCheckBox("HEX发送", self)
+        self.send_button = QPushButton("发送", self)
+        self.send_button.setEnabled(False)
+        bottom = QHBoxLayout()
+        bottom.addWidget(self.send_edit, 1)
+        bottom.addWidget(self.send_hex)
+        bottom.addWidget(self.send_button)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addWidget(self.recv_view, 1)
+        layout.addLayout(bottom)
+
+        self.open_button.clicked.connect(self.handler_open)
+        self.send_button.clicked.connect(self.handler_send)
+        self.send_edit.returnPressed.connect(self.handler_send)
+        self.recv_hex.toggled.connect(self.handler_recv_format)
+        self.manager.counters_updated.connect(self.handler_counters)
+        # 串口列表按注册表的增减逐项更新
+        for info in self.manager.registry.ports:
+            insert_port_item(self.port_combo, info)
+        self.manager.registry.port_added.connect(self.handler_port_added)
+        self.manager.registry.port_removed.connect(self.handler_port_removed)
+
+    def handler_port_added(self, info):
+        insert_port_item(self.port_combo, info)
+
+    def handler_port_removed(self, info):
+        remove_port_item(self.port_combo, info)
+
+    def disconnect_manager(self):
+        """
+        断开与会话管理的信号连接，标签页关闭后注册表和计数更新不再调用本面板
+        :return:
+        """
+        self.manager.registry.port_added.disconnect(self.handler_port_added)
+        self.manager.registry.port_removed.disconnect(self.handler_port_removed)
+        self.manager.counters_updated.disconnect(self.handler_counters)
+
+    def handler_counters(self):
+        if self.session:
+            self.counter_label.setText(str(self.session))
+
+    def handler_recv_format(self, checked):
+        self.recv_model.data_format = 'hex' if checked else 'ascii'
+
+    def handler_open(self):
+        if self.serial_thread and self.serial_thread.isRunning():
+            self.close_session()
+            return
+        port = self.port_combo.currentData()
+        if not port:
+            QMessageBox.warning(self, "Warning", "没有可用的串口！")
+            return
+        self.serial_thread = self.manager.create_port(
+            port,
+            self.baud_combo.currentData(),
+            serial.EIGHTBITS,
+            serial.PARITY_NONE,
+            serial.STOPBITS_ONE,
+            'hex' if self.send_hex.isChecked() else 'ascii',
+            'hex' if self.recv_hex.isChecked() else 'ascii',
+            False,
+            reconnect=True,
+            resolver=self.manager.port_resolver(port)
+        )
+        self.serial_thread.data_received.connect(
+            lambda data_received: self.handle_batch_display(data_received, "recv")
+        )
+        self.serial_thread.serial_error.connect(self.handler_serial_error)
+        # selector后端没有重连，断开时只发出serial_error
+        if hasattr(self.serial_thread, 'connection_state'):
+            self.serial_thread.connection_state.connect(self.handler_connection_state)
+        self.status_label.hide()
+        self.session = self.manager.attach(self.serial_thread, port)
+        self.serial_thread.start()
+        self.port_combo.setEnabled(False)
+        self.baud_combo.setEnabled(False)
+        self.send_button.setEnabled(True)
+        self.open_button.setText("关闭串口")
+        self.title_changed.emit('{} [{}]'.format(port, self.session.channel))
+
+    def close_session(self):
+        """
+        关闭串口并移出会话管理
+        :return:
+        """
+        if self.session:
+            self.manager.detach(self.session)
+            self.session = None
+        if self.serial_thread:
+            self.serial_thread.stop()
+        self.port_combo.setEnabled(True)
+        self.baud_combo.setEnabled(True)
+        self.send_button.setEnabled(False)
+        self.open_button.setText("打开串口")
+        self.counter_label.clear()
+        self.status_label.hide()
+        self.title_changed.emit('未连接')
+
+    def handle_batch_display(self, data_list, data_from):
+        current_time = time.time()
+        self.recv_model.append_records([(current_time, data_from, data) for data in data_list])
+
+    def handler_send(self):
+        data = self.send_edit.text()
+        if not data or not self.serial_thread or not self.serial_thread.isRunning():
+            return
+        # 发送格式可在打开后切换
+        self.serial_thread.data_format_send = 'hex' if self.send_hex.isChecked() else 'ascii'
+        self.serial_thread.send_data(data)
+
+    def show_status(self, text, tooltip=''):
+        """
+        在状态标签中显示提示，不弹窗
+        :param text:
+        :param tooltip:
+        :return:
+        """
+        self.status_label.setText(text)
+        self.status_label.setToolTip(tooltip or text)
+        self.status_label.show()
+
+    def handler_serial_error(self, error):
+        # 串口已关闭（打开失败、selector后端断开、未开启重连时断开）时关闭会话
+        # running在发出错误之前已置为False，不依赖线程是否已经结束
+        if self.session and self.serial_thread and not self.serial_thread.running:
+            self.close_session()
+        self.show_status(error)
+
+    def handler_connection_state(self, state, detail):
+        """
+        串口连接状态变化
+        :param state:   CONNECTED/RECONNECTING/DISCONNECTED
+        :param detail:  串口号或断开原因
+        :return:
+        """
+        if not self.serial_thread:
+            return
+        if state == RECONNECTING:
+            self.show_status("串口已断开，正在重连…", detail)
+        elif state == CONNECTED:
+            stats = self.serial_thread.reconnect_stats
+            if not stats.reconnects:
+                self.status_label.hide()
+                return
+            # 设备名可能已变化
+            if self.session:
+                self.session.name = detail
+                self.title_changed.emit('{} [{}]'.format(detail, self.session.channel))
+            self.show_status("已重连{}".format(detail), str(stats))
+        elif state == DISCONNECTED:
+            if self.session:
+                self.close_session()
+            self.show_status("串口已断开", detail)
+
+
+class SessionWindow(QMainWindow):
+    """
+    多串口会话窗口
+    """
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.setWindowTitle("多串口会话")
+        self.resize(900, 600)
+        self.tabs = QTabWidget(self)
+        self.tabs.setTabsClosable(True)
+        self.tabs.tabCloseRequested.connect(self.handler_close_tab)
+        add_button = QToolButton(self.tabs)
+        add_button.setText("+")
+        add_button.clicked.connect(self.add_session)
+        self.tabs.setCornerWidget(add_button, Qt.TopRightCorner)
+        self.setCentralWidget(self.tabs)
+        self.add_session()
+
+    def add_session(self):
+        panel = SessionPanel(self.manager, self.tabs)
+        index = self.tabs.addTab(panel, '未连接')
+        panel.title_changed.connect(lambda title: self.tabs.setTabText(self.tabs.indexOf(panel), title))
+        self.tabs.setCurrentIndex(index)
+
+    def handler_close_tab(self, index):
+        panel = self.tabs.widget(index)
+        panel.close_session()
+        panel.disconnect_manager()
+        self.tabs.removeTab(index)
+        panel.deleteLater()
+
+    def closeEvent(self, event):
+        while self.tabs.count():
+            self.handler_close_tab(0)
+        event.accept()
@@ -9,6 +9,13 @@ from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 import Settings
 import json
+from stream_decoder import ENCODINGS, ERROR_POLICIES
+from log_rotation import COMPRESS_FORMATS
+from serial_writer import BACKPRESSURE_POLICIES, SEND_QUEUE_SIZE
+from file_sender import FILE_CHUNK_SIZE
+from frame_decoder import FRAMERS, make_framer
+from checksum import CHECKSUMS
+from selector_backend import BACKENDS
 
 FONT_LIST = ["Arial Unicode MS", "Fixedsys", "SimSun-ExtB", "System", "Terminal", "仿宋", "华文中宋", "华文仿宋",
              "华文宋体", "华文彩云", "华文新魏", "华文楷体", "华文琥珀", "华文细黑", "华文行楷", "华文隶书", "宋体",
@@ -70,8 +77,98 @@ class SettingsThread(QMainWindow):
         self.ui.comboBox_8.setInsertPolicy(QComboBox.InsertAfterCurrent)  # 设置插入方式
         for data_bit in [1, 1.5, 2]:
             self.ui.comboBox_8.addItem(str(data_bit), data_bit)
+        # 接收编码、解码错误处理
+        self.ui.comboBox_10 = QComboBox(self.ui.scrollAreaWidgetContents)
+        self.ui.comboBox_10.setObjectName("comboBox_10")
+        for encoding, name in zip(ENCODINGS, ['UTF-8', 'GBK', 'Latin-1']):
+            self.ui.comboBox_10.addItem(name, encoding)
+        self.__add_row__("接收编码", self.ui.comboBox_10)
+        self.ui.comboBox_11 = QComboBox(self.ui.scrollAreaWidgetContents)
+        self.ui.comboBox_11.setObjectName("comboBox_11")
+        for errors, name in zip(ERROR_POLICIES, ['替换为�', '反斜杠转义(\\xff)', '十六进制转义(<FF>)']):
+            self.ui.comboBox_11.addItem(name, errors)
+        self.__add_row__("解码错误", self.ui.comboBox_11)
+        # 自动保存日志分割，0表示不限制
+        self.ui.lineEdit_4 = QLineEdit(self.ui.scrollAreaWidgetContents)
+        self.ui.lineEdit_4.setObjectName("lineEdit_4")
+        self.__add_row__("日志分割大小(MB)", self.ui.lineEdit_4)
+        self.ui.lineEdit_5 = QLineEdit(self.ui.scrollAreaWidgetContents)
+        self.ui.lineEdit_5.setObjectName("lineEdit_5")
+        self.__add_row__("日志分割时间(h)", self.ui.lineEdit_5)
+        self.ui.lineEdit_6 = QLineEdit(self.ui.scrollAreaWidgetContents)
+        self.ui.lineEdit_6.setObjectName("lineEdit_6")
+        self.__add_row__("最多保留文件数", self.ui.lineEdit_6)
+        self.ui.comboBox_12 = QComboBox(self.ui.scrollAreaWidgetContents)
+        self.ui.comboBox_12.setObjectName("comboBox_12")
+        for compress, name in zip(COMPRESS_FORMATS, ['不压缩', 'gzip', 'bz2', 'xz']):
+            self.ui.comboBox_12.addItem(name, compress)
+        self.__add_row__("分割文件压缩", self.ui.comboBox_12)
+        # 发送队列
+        self.ui.lineEdit_7 = QLineEdit(self.ui.scrollAreaWidgetContents)
+        self.ui.lineEdit_7.setObjectName("lineEdit_7")
+        self.__add_row__("发送队列长度", self.ui.lineEdit_7)
+        self.ui.comboBox_13 = QComboBox(self.ui.scrollAreaWidgetContents)
+        self.ui.comboBox_13.setObjectName("comboBox_13")
+        for policy, name in zip(BACKPRESSURE_POLICIES, ['等待', '丢弃最早的数据', '拒绝发送']):
+            self.ui.comboBox_13.addItem(name, policy)
+        self.__add_row__("发送队列满时", self.ui.comboBox_13)
+        # 文件发送，块间隔为0时按波特率控制速度
+        self.ui.lineEdit_8 = QLineEdit(self.ui.scrollAreaWidgetContents)
+        self.ui.lineEdit_8.setObjectName("lineEdit_8")
+        self.__add_row__("文件发送块大小(字节)", self.ui.lineEdit_8)
+        self.ui.lineEdit_9 = QLineEdit(self.ui.scrollAreaWidgetContents)
+        self.ui.lineEdit_9.setObjectName("lineEdit_9")
+        self.__add_row__("文件发送块间隔(ms)", self.ui.lineEdit_9)
+        # 接收分帧
+        self.ui.comboBox_14 = QComboBox(self.ui.scrollAreaWidgetContents)
+        self.ui.comboBox_14.setObjectName("comboBox_14")
+        for framer, name in zip(FRAMERS, ['分隔符', '定长', '长度前缀', 'COBS', 'SLIP']):
+            self.ui.comboBox_14.addItem(name, framer)
+        self.__add_row__("接收分帧", self.ui.comboBox_14)
+        self.ui.lineEdit_10 = QLineEdit(self.ui.scrollAreaWidgetContents)
+        self.ui.lineEdit_10.setObjectName("lineEdit_10")
+        self.ui.lineEdit_10.setToolTip("分隔符：十六进制分隔符，默认0a\n定长：帧长度\n"
+                                       "长度前缀：长度字段偏移,字节数,字节序(big/little),长度修正，如0,2,big,0")
+        self.__add_row__("分帧参数", self.ui.lineEdit_10)
+        # 帧校验，校验二进制分帧的接收帧，并附加到十六进制发送数据末尾
+        self.ui.comboBox_15 = QComboBox(self.ui.scrollAreaWidgetContents)
+        self.ui.comboBox_15.setObjectName("comboBox_15")
+        for checksum, name in zip([''] + CHECKSUMS, ['不校验', 'CRC8', 'CRC16-CCITT', 'CRC32', 'Modbus CRC']):
+            self.ui.comboBox_15.addItem(name, checksum)
+        self.ui.comboBox_15.setToolTip("校验值位于帧末尾；接收时只校验定长/长度前缀/COBS/SLIP分帧，错误帧被丢弃并计数")
+        self.__add_row__("帧校验", self.ui.comboBox_15)
+        # 多串口会话后端
+        self.ui.comboBox_16 = QComboBox(self.ui.scrollAreaWidgetContents)
+        self.ui.comboBox_16.setObjectName("comboBox_16")
+        for backend, name in zip(BACKENDS, ['每个串口一个线程', '单线程(selector)']):
+            self.ui.comboBox_16.addItem(name, backend)
+        self.ui.comboBox_16.setToolTip("单线程方式所有会话串口共用一个线程，仅支持Linux/macOS，对新打开的串口生效")
+        self.__add_row__("多串口会话后端", self.ui.comboBox_16)
+        # 断开后自动重连
+        self.ui.checkBox_6 = QCheckBox(self.ui.scrollAreaWidgetContents)
+        self.ui.checkBox_6.setObjectName("checkBox_6")
+        self.ui.checkBox_6.setToolTip("USB串口断开后保持会话和捕获，设备重新出现时按退避时间自动重新打开")
+        self.__add_row__("断开后自动重连", self.ui.checkBox_6)
         self.handler_setDefault()
 
+    def __add_row__(self, text, widget):
+        """
+        在设置列表末尾追加一行选项，底部的弹簧始终保持在最后
+        :param text:    选项名
+        :param widget:  选项控件
+        :return:
+        """
+        layout = self.ui.gridLayout
+        row = layout.rowCount()
+        spacer = layout.itemAtPosition(row - 1, 2)
+        if spacer is not None and spacer.spacerItem() is not None:
+            layout.removeItem(spacer)
+            layout.addItem(spacer, row, 2, 1, 1)
+            row -= 1
+        label = QLabel(text, self.ui.scrollAreaWidgetContents)
+        layout.addWidget(label, row, 0, 1, 1)
+        layout.addWidget(widget, row, 2, 1, 1)
+
     def export_settings(self):
         # comboBox
         json_dict = {}
@@ -137,6 +234,21 @@ class SettingsThread(QMainWindow):
         self.ui.comboBox_7.setCurrentIndex(0)
         self.ui.comboBox_6.setCurrentIndex(3)
         self.ui.comboBox_8.setCurrentIndex(0)
+        self.ui.comboBox_10.setCurrentIndex(0)
+        self.ui.comboBox_11.setCurrentIndex(0)
+        self.ui.comboBox_12.setCurrentIndex(0)
+        self.ui.comboBox_13.setCurrentIndex(0)
+        self.ui.comboBox_14.setCurrentIndex(0)
+        self.ui.comboBox_15.setCurrentIndex(0)
+        self.ui.comboBox_16.setCurrentIndex(0)
+        self.ui.checkBox_6.setChecked(True)
+        self.ui.lineEdit_4.setText('0')
+        self.ui.lineEdit_5.setText('0')
+        self.ui.lineEdit_6.setText('0')
+        self.ui.lineEdit_7.setText(str(SEND_QUEUE_SIZE))
+        self.ui.lineEdit_8.setText(str(FILE_CHUNK_SIZE))
+        self.ui.lineEdit_9.setText('0')
+        self.ui.lineEdit_10.clear()
         self.ui.lineEdit_3.setText('1000')
         self.ui.checkBox.setChecked(True)
         self.ui.checkBox_4.setChecked(True)
@@ -159,6 +271,29 @@ class SettingsThread(QMainWindow):
                 QMessageBox.warning(self, 'not a number', str(e))
                 self.ui.lineEdit_2.clear()
                 return
+        # 日志分割选项、文件发送块间隔必须为非负整数
+        for line_edit in [self.ui.lineEdit_4, self.ui.lineEdit_5, self.ui.lineEdit_6, self.ui.lineEdit_9]:
+            try:
+                if int(line_edit.text()) < 0:
+                    raise ValueError('不能小于0')
+            except ValueError as e:
+                QMessageBox.warning(self, 'not a number', str(e))
+                line_edit.setText('0')
+                return
+        # 发送队列长度、文件发送块大小必须为正整数
+        for line_edit, default in [(self.ui.lineEdit_7, SEND_QUEUE_SIZE), (self.ui.lineEdit_8, FILE_CHUNK_SIZE)]:
+            try:
+                if int(line_edit.text()) <= 0:
+                    raise ValueError('必须大于0')
+            except ValueError as e:
+                QMessageBox.warning(self, 'not a number', str(e))
+                line_edit.setText(str(default))
+                return
+        try:
+            make_framer(self.ui.comboBox_14.currentData(), self.ui.lineEdit_10.text())
+        except ValueError as e:
+            QMessageBox.warning(self, '分帧参数错误', str(e))
+            return
         self.export_settings()
         self.setting_data.emit(True)
 
@@ -0,0 +1,136 @@
+"""
+stream_decoder.py
+接收数据流解码
+串口数据被分成若干帧读取，多字节字符（UTF-8/GBK）可能被拆在两帧之间
+使用增量解码器找到帧末尾不完整的字符，留到下一帧开头，保证每一帧都能独立解码
+"""
+import codecs
+
+# 可选的接收编码
+ENCODINGS = ['utf-8', 'gbk', 'latin-1']
+# 解码错误处理方式：替换为U+FFFD、反斜杠转义(\xff)、十六进制转义(<FF>)
+HEX_ESCAPE = 'hexescape'
+ERROR_POLICIES = ['replace', 'backslashreplace', HEX_ESCAPE]
+
+
+def _hex_escape(error):
+    """
+    将无法解码的字节显示为<FF>
+    :param error: UnicodeDecodeError
+    :return:
+    """
+    if not isinstance(error, UnicodeDecodeError):
+        raise error
+    bad = error.object[error.start:error.end]
+    return ''.join('<{:02X}>'.format(b) for b in bad), error.end
+
+
+codecs.register_error(HEX_ESCAPE, _hex_escape)
+
+
+def decode(data, encoding='utf-8', errors='replace'):
+    """
+    解码一帧数据，不会抛出异常
+    :param data:
+    :param encoding:
+    :param errors:
+    :return:
+    """
+    return bytes(data).decode(encoding, errors)
+
+
+class StreamDecoder:
+    """
+    帧边界对齐
+    """
+
+    def __init__(self, encoding='utf-8'):
+        """
+        初始化
+        :param encoding: 编码，必须是codecs支持的编码
+        """
+        self.__encoding = None
+        self.__decoder = None
+        self.__single_byte = False
+        self.__utf8 = False
+        self.__pending = b''
+        self.encoding = encoding
+
+    @property
+    def encoding(self):
+        return self.__encoding
+
+    @encoding.setter
+    def encoding(self, value):
+        info = codecs.lookup(value)
+        self.__encoding = info.name
+        self.__utf8 = info.name == 'utf-8'
+        self.__single_byte = info.name in ['latin-1', 'iso8859-1', 'ascii', 'cp1252']
+        self.__decoder = info.incrementaldecoder('replace')
+        self.__pending = b''
+
+    @property
+    def pending(self):
+        """
+        留到下一帧的字节数
+        :return:
+        """
+        return len(self.__pending)
+
+    def align(self, frame):
+        """
+        对齐帧边界：上一帧留下的字节放在本帧开头，本帧末尾不完整的字符留到下一帧
+        :param frame: bytes
+        :return: 以完整字符结尾的数据，可能为b''
+        """
+        data = self.__pending + frame if self.__pending else frame
+        if self.__single_byte or not data:
+            self.__pending = b''
+            return data
+        cut = self.__utf8_cut(data) if self.__utf8 else self.__decoder_cut(data)
+        self.__pending = bytes(data[cut:])
+        return data[:cut]
+
+    def flush(self):
+        """
+        取出留下的字节（数据流暂停时使用）
+        :return:
+        """
+        data = self.__pending
+        self.__pending = b''
+        return data
+
+    @staticmethod
+    def __utf8_cut(data):
+        """
+        UTF-8只需检查末尾最多3个字节
+        :param data:
+        :return: 完整字符的结束位置
+        """
+        size = len(data)
+        for i in range(size - 1, max(size - 4, -1), -1):
+            byte = data[i]
+            if byte & 0xc0 != 0x80:
+                # 找到最后一个字符的首字节
+                if byte >= 0xf0:
+                    need = 4
+                elif byte >= 0xe0:
+                    need = 3
+                elif byte >= 0xc0:
+                    need = 2
+                else:
+                    need = 1
+                return i if size - i < need else size
+        return size
+
+    def __decoder_cut(self, data):
+        """
+        其他多字节编码由增量解码器判断末尾缓存的字节
+        :param data:
+        :return: 完整字符的结束位置
+        """
+        self.__decoder.reset()
+        self.__decoder.decode(data)
+        buffered = self.__decoder.getstate()[0]
+        self.__decoder.reset()
+        return len(data) - len(buffered)
@@ -1,38 +1,125 @@
 """
-AutoSend.py
-定时发送线程，于勾选周期发送选项时创建该线程
+timeClock.py
+无漂移的周期调度，串口线程的自动发送使用
+按绝对时间(time.monotonic_ns)计算每个周期的截止时间，周期不会因为发送/处理耗时而累积漂移
 """
 
-from PyQt5.QtCore import *
+import math
 import time
 
+# 错过周期的处理方式：skip跳过错过的周期，catch_up逐个补发
+SKIP = 'skip'
+CATCH_UP = 'catch_up'
+# catch_up最多连续补发的周期数，超过后重新对齐
+MAX_CATCH_UP = 10
+# 单次sleep的最长时间(ns)，保证stop()能及时返回
+MAX_SLEEP_NS = 100 * 1000 * 1000
 
-class timeClock(QThread):
-    timeout = pyqtSignal(bool)
 
-    def __init__(self, timelength):
-        super().__init__()
-        self.__timelength = timelength
-        self.__running = False
+class JitterStats:
+    """
+    触发时间相对截止时间的延迟统计
+    """
 
-    def run(self):
-        if self.__running:
-            return
-        self.__running = True
-        while self.__running:
-            time.sleep(self.__timelength * 0.001)  # 毫秒(ms)
-            self.timeout.emit(True)
+    def __init__(self):
+        self.count = 0
+        self.missed = 0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+        self.max_ns = 0
+
+    def add(self, lateness_ns):
+        """
+        记录一次延迟（Welford算法计算均值和方差）
+        :param lateness_ns:
+        :return:
+        """
+        self.count += 1
+        delta = lateness_ns - self.__mean
+        self.__mean += delta / self.count
+        self.__m2 += delta * (lateness_ns - self.__mean)
+        self.max_ns = max(self.max_ns, lateness_ns)
+
+    @property
+    def mean_us(self):
+        return self.__mean / 1000
 
     @property
-    def isRunning(self):
-        return self.__running
-
-    @isRunning.setter
-    def isRunning(self, value):
-        if type(value) is not bool:
-            raise TypeError
-        self.__running = value
-
-    def stop(self):
-        self.__running = False
-        self.wait()
+    def stdev_us(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.__m2 / (self.count - 1)) / 1000
+
+    @property
+    def max_us(self):
+        return self.max_ns / 1000
+
+    def __str__(self):
+        return '{}次, 跳过{}次, 平均延迟{:.0f}us, 标准差{:.0f}us, 最大延迟{:.0f}us'.format(
+            self.count, self.missed, self.mean_us, self.stdev_us, self.max_us)
+
+
+class PeriodicSchedule:
+    """
+    无漂移的周期调度
+    """
+
+    def __init__(self, period_ns, policy=SKIP, spin_ns=0):
+        """
+        初始化
+        :param period_ns:   周期(ns)
+        :param policy:      错过周期的处理方式 SKIP/CATCH_UP
+        :param spin_ns:     截止时间前最后spin_ns改为忙等，提高精度（占用CPU）
+        """
+        if period_ns <= 0:
+            raise ValueError('period must be positive')
+        if policy not in [SKIP, CATCH_UP]:
+            raise ValueError('policy must be either skip or catch_up')
+        self.period_ns = period_ns
+        self.policy = policy
+        self.spin_ns = spin_ns
+        self.stats = JitterStats()
+        self.__deadline = 0
+        self.reset()
+
+    def reset(self):
+        """
+        从当前时间重新开始计时
+        :return:
+        """
+        self.__deadline = time.monotonic_ns() + self.period_ns
+
+    def wait(self, running=lambda: True):
+        """
+        等待到下一个截止时间
+        :param running: 返回False时立即停止等待
+        :return: 到达截止时间返回True，被停止返回False
+        """
+        while True:
+            remaining = self.__deadline - time.monotonic_ns()
+            if remaining <= self.spin_ns:
+                break
+            if not running():
+                return False
+            time.sleep(min(remaining - self.spin_ns, MAX_SLEEP_NS) / 1e9)
+        while time.monotonic_ns() < self.__deadline:
+            pass
+        lateness = time.monotonic_ns() - self.__deadline
+        self.stats.add(lateness)
+        self.__advance__(lateness)
+        return running()
+
+    def __advance__(self, lateness):
+        """
+        计算下一个截止时间
+        :return:
+        """
+        missed = lateness // self.period_ns
+        if self.policy == CATCH_UP and missed < MAX_CATCH_UP:
+            # 下一个截止时间可能已经过去，随后的wait立即返回
+            self.__deadline += self.period_ns
+            return
+        # 跳过错过的周期，仍按原来的时间网格对齐
+        self.stats.missed += missed
+        self.__deadline += (missed + 1) * self.period_ns
+
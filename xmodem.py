@@ -0,0 +1,203 @@
+"""
+xmodem.py
+XMODEM/XMODEM-1K/YMODEM文件发送
+只实现发送端协议逻辑，不依赖串口和界面：通过write(bytes)发送，read(timeout)读取一个字节
+协议本身为停等方式，每个数据块整块一次写入，收到ACK后立即发送下一块，NAK或超时后重发
+校验使用CRC16（binascii.crc_hqx，XMODEM多项式0x1021），接收端以NAK启动时使用累加和
+"""
+import binascii
+
+SOH = 0x01
+STX = 0x02
+EOT = 0x04
+ACK = 0x06
+NAK = 0x15
+CAN = 0x18
+CRC_START = ord('C')
+# 数据块末尾的填充字节
+CPMEOF = 0x1a
+
+XMODEM = 'xmodem'
+XMODEM_1K = 'xmodem-1k'
+YMODEM = 'ymodem'
+PROTOCOLS = [XMODEM, XMODEM_1K, YMODEM]
+
+# 等待接收端启动的最长时间(s)
+START_TIMEOUT = 60
+# 等待ACK的时间(s)
+ACK_TIMEOUT = 10
+# 单个数据块最多重发次数
+MAX_RETRIES = 10
+# 单次读取的超时(s)，决定取消操作的响应时间
+POLL_TIMEOUT = 0.5
+
+
+class ModemError(Exception):
+    """
+    传输失败
+    """
+
+
+def crc16(data):
+    """
+    XMODEM CRC16
+    :param data:
+    :return:
+    """
+    return binascii.crc_hqx(data, 0)
+
+
+def make_block(seq, data, size, crc=True, pad=CPMEOF):
+    """
+    生成一个数据块
+    :param seq:     块序号，取低8位
+    :param data:    数据，不超过size
+    :param size:    块大小 128/1024
+    :param crc:     True使用CRC16，False使用累加和
+    :param pad:     填充字节
+    :return:
+    """
+    seq &= 0xff
+    data = bytes(data).ljust(size, bytes([pad]))
+    if crc:
+        check = crc16(data).to_bytes(2, 'big')
+    else:
+        check = bytes([sum(data) & 0xff])
+    return bytes([SOH if size == 128 else STX, seq, 0xff - seq]) + data + check
+
+
+class ModemSender:
+    """
+    XMODEM/XMODEM-1K/YMODEM发送端
+    """
+
+    def __init__(self, write, read, protocol=XMODEM_1K, timeout=ACK_TIMEOUT, retries=MAX_RETRIES,
+                 cancelled=None, progress=None):
+        """
+        初始化
+        :param write:       write(bytes)，发送数据
+        :param read:        read(timeout)，返回一个字节(int)，超时返回None
+        :param protocol:    xmodem/xmodem-1k/ymodem
+        :param timeout:     等待ACK的时间(s)
+        :param retries:     单个数据块最多重发次数
+        :param cancelled:   返回True时取消传输
+        :param progress:    progress(已确认的字节数)，每个数据块确认后调用
+        """
+        if protocol not in PROTOCOLS:
+            raise ValueError('protocol must be one of {}'.format(PROTOCOLS))
+        self.protocol = protocol
+        self.timeout = timeout
+        self.retries = retries
+        self.retransmits = 0
+        self.__write = write
+        self.__read = read
+        self.__cancelled = cancelled or (lambda: False)
+        self.__progress = progress
+        self.__crc = True
+
+    def send(self, stream, name='', size=0):
+        """
+        发送文件
+        :param stream:  已打开的二进制文件
+        :param name:    文件名（YMODEM）
+        :param size:    文件大小（YMODEM）
+        :return: 发送的字节数
+        """
+        header = b''
+        if self.protocol == YMODEM:
+            header = name.encode('utf-8') + b'\x00' + str(size).encode('ascii') + b'\x00'
+            # 块0最大1024字节
+            if len(header) > 1024:
+                raise ModemError('文件名过长')
+        try:
+            self.__crc = self.__wait_start__()
+            if self.protocol == YMODEM:
+                self.__send_block__(make_block(0, header, 128 if len(header) <= 128 else 1024, pad=0))
+                self.__wait_start__()
+            sent = self.__send_data__(stream)
+            self.__send_eot__()
+            if self.protocol == YMODEM:
+                # 空文件名的块表示批量传输结束
+                self.__wait_start__()
+                self.__send_block__(make_block(0, b'', 128, pad=0))
+            return sent
+        except ModemError:
+            try:
+                self.__write(bytes([CAN, CAN]))
+            except Exception:
+                # 串口已关闭或发送队列已满时无法通知接收端，保留原来的错误
+                pass
+            raise
+
+    def __send_data__(self, stream):
+        block_size = 128 if self.protocol == XMODEM else 1024
+        seq = 1
+        sent = 0
+        while True:
+            data = stream.read(block_size)
+            if not data:
+                return sent
+            # 最后不足128字节的数据用128字节的块发送，减少填充
+            size = 128 if len(data) <= 128 else block_size
+            self.__send_block__(make_block(seq, data, size, self.__crc))
+            seq += 1
+            sent += len(data)
+            if self.__progress:
+                self.__progress(sent)
+
+    def __check_cancelled__(self):
+        if self.__cancelled():
+            raise ModemError('传输已取消')
+
+    def __wait_start__(self):
+        """
+        等待接收端发出'C'（CRC16）或NAK（累加和）
+        :return: 是否使用CRC16
+        """
+        waited = 0.0
+        while waited < START_TIMEOUT:
+            self.__check_cancelled__()
+            byte = self.__read(POLL_TIMEOUT)
+            waited += POLL_TIMEOUT
+            if byte == CRC_START:
+                return True
+            if byte == NAK and self.protocol != YMODEM:
+                return False
+            if byte == CAN and self.__read(POLL_TIMEOUT) == CAN:
+                raise ModemError('接收端取消传输')
+        raise ModemError('等待接收端超时')
+
+    def __wait_response__(self):
+        """
+        等待ACK/NAK，忽略其他字节
+        :return: ACK/NAK，超时返回None
+        """
+        waited = 0.0
+        while waited < self.timeout:
+            self.__check_cancelled__()
+            byte = self.__read(POLL_TIMEOUT)
+            if byte is None:
+                waited += POLL_TIMEOUT
+                continue
+            if byte in (ACK, NAK):
+                return byte
+            if byte == CAN and self.__read(POLL_TIMEOUT) == CAN:
+                raise ModemError('接收端取消传输')
+        return None
+
+    def __send_block__(self, block):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retransmits += 1
+            self.__write(block)
+            if self.__wait_response__() == ACK:
+                return
+        raise ModemError('数据块{}重发{}次后仍未确认'.format(block[1], self.retries))
+
+    def __send_eot__(self):
+        # 部分接收端对第一个EOT回复NAK，需再发一次
+        for _ in range(self.retries + 1):
+            self.__write(bytes([EOT]))
+            if self.__wait_response__() == ACK:
+                return
+        raise ModemError('结束传输未被确认')